@@ -1,10 +1,14 @@
 import customtkinter as ctk
+import itertools
 import logging
 
+from PCMS.exceptions.google_exceptions import GoogleAuthenticationError
+from PCMS.exceptions.invoice_exceptions import InvoiceGenerationError
 from PCMS.models.invoice_data import CustomerInfo, InvoiceData
 from PCMS.services.cc_service import CcService
 from PCMS.services.jobber_service import JobberService
 from PCMS.services.invoice_service import InvoiceService
+from PCMS.services.spending_service import SpendingService
 from PCMS.util.config import Config, ConfigKeys
 from PCMS.util.file_util import FileUtil
 
@@ -12,13 +16,14 @@ logger = logging.getLogger("pcms")
 
 
 class HomePage(ctk.CTkFrame):
-    def __init__(self, parent, controller, jobber_service: JobberService, invoice_service: InvoiceService, cc_service: CcService):
+    def __init__(self, parent, controller, jobber_service: JobberService, invoice_service: InvoiceService, cc_service: CcService, spending_service: SpendingService):
         super().__init__(parent)
         file_util = FileUtil()
         self.config = Config(file_util)
         self.jobber_service = jobber_service
         self.invoice_service = invoice_service
         self.cc_service = cc_service
+        self.spending_service = spending_service
 
         label = ctk.CTkLabel(self, text="Home Page", font=("Helvetica", 24))
         label.pack(pady=20)
@@ -30,6 +35,9 @@ class HomePage(ctk.CTkFrame):
         cc_button = ctk.CTkButton(self, text="Process CC Statements", command=self.start_processing_cc_statements)
         cc_button.pack(pady=10)
 
+        spending_button = ctk.CTkButton(self, text="Create Spending Report", command=self.start_creating_spending_report)
+        spending_button.pack(pady=10)
+
         invoice_button = ctk.CTkButton(self, text="Generate Invoice",command=self.start_generating_invoice)
         invoice_button.pack(pady=10)
 
@@ -39,30 +47,49 @@ class HomePage(ctk.CTkFrame):
     def start_processing_cc_statements(self):
         self.info_label.configure(text="Processing CC Statements...")
         try:
-            statements_processed = self.cc_service.process_credit_card_statements()
-            if statements_processed is None:
+            result = self.cc_service.process_credit_card_statements()
+            if len(result.statements) == 0:
                 self.info_label.configure(text="No CC statements to be processed")
+            elif result.processed_count < len(result.statements):
+                self.info_label.configure(
+                    text=f"Processed {result.processed_count} of {len(result.statements)} CC Statements",
+                    text_color="red")
             else:
                 self.info_label.configure(text="CC Statements Processed Successfully")
         except Exception as e:
             logger.error(f"Error: {str(e)}")
             self.info_label.configure(text="Error", text_color="red")
 
+    def start_creating_spending_report(self):
+        self.info_label.configure(text="Creating Spending Report...")
+        try:
+            transaction_count = self.spending_service.create_spending_report()
+            if transaction_count == 0:
+                self.info_label.configure(text="No processed CC statements to report on")
+            else:
+                self.info_label.configure(text="Spending Report Created Successfully")
+        except Exception as e:
+            logger.error(f"Error: {str(e)}")
+            self.info_label.configure(text="Error", text_color="red")
+
     def start_generating_invoice(self):
         self.info_label.configure(text="Generating Invoice...")
         try:
-            job_data_generated = self.generate_invoice()
-            if job_data_generated is None:
+            invoice_results = self.generate_invoice()
+            if invoice_results is None:
                 self.info_label.configure(text="No Jobs to be processed")
             else:
                 self.info_label.configure(text="Invoice Generated Successfully")
         except Exception as e:
             logger.error(f"Error: {str(e)}")
-            self.info_label.configure(text="Error", text_color="red")
+            if is_authentication_error(e):
+                self.info_label.configure(text="Google sign-in expired, generate the invoice again to sign in",
+                                          text_color="red")
+            else:
+                self.info_label.configure(text="Error", text_color="red")
 
     def generate_invoice(self):
-        job_data = self.jobber_service.process_jobber_pdfs()
-        if job_data is None:
+        if not self.jobber_service.has_jobs_to_process():
             return None
         if self.config.get_value(ConfigKeys.BILLED_COMPANY_ATTENTION) == '':
             customer_info = CustomerInfo(
@@ -87,9 +114,19 @@ class HomePage(ctk.CTkFrame):
             invoice_number = "00069",
             invoice_date = "10/14/2024",
             invoice_due_date = "10/20/2024",
-            customer_info = customer_info,
-            job_data = job_data
+            customer_info = customer_info
         )
-        self.invoice_service.create_new_invoice(invoice_data)
+        # Invoices are generated while the Jobber PDFs are parsed, and none are started once a PDF fails to parse
+        job_data = itertools.chain.from_iterable(self.jobber_service.iter_job_data(stop_on_failure=True))
+        invoice_results = self.invoice_service.create_chunked_invoices_from_stream(invoice_data, job_data)
         self.jobber_service.move_processed_jobs()
-        return job_data
+        return invoice_results
+
+
+def is_authentication_error(error: Exception) -> bool:
+    """
+    Check whether an error, or any of the invoice failures it groups, is a failure to authenticate with Google.
+    """
+    if isinstance(error, InvoiceGenerationError):
+        return any(isinstance(failure, GoogleAuthenticationError) for failure in error.failures.values())
+    return isinstance(error, GoogleAuthenticationError)
@@ -14,13 +14,13 @@ logger = logging.getLogger("pcms")
 
 
 class PcmsGUI(ctk.CTk):
-    def __init__(self, jobber_service, invoice_service, version_manager: VersionManager, cc_service):
+    def __init__(self, jobber_service, invoice_service, version_manager: VersionManager, cc_service, spending_service):
         super().__init__()
         self.version_manager = version_manager
 
         self.title("Pacheco Contracting Management System")
         width = 400
-        height = 300
+        height = 350
         self.geometry(f"{width}x{height}")
 
         x = (self.winfo_screenwidth() // 2) - (width // 2)
@@ -39,7 +39,7 @@ class PcmsGUI(ctk.CTk):
         for Page in (HomePage, DataEntryPage, PageOne):
             page_name = Page.__name__
             if page_name == HomePage.__name__:
-                frame = Page(parent=self.container, controller=self, jobber_service=jobber_service, invoice_service=invoice_service, cc_service=cc_service)
+                frame = Page(parent=self.container, controller=self, jobber_service=jobber_service, invoice_service=invoice_service, cc_service=cc_service, spending_service=spending_service)
             else:
                 frame = Page(parent=self.container, controller=self)
             self.pages[page_name] = frame
@@ -0,0 +1,5 @@
+class GoogleAuthenticationError(Exception):
+    """
+    Raised when PCMS could not get or refresh the OAuth credentials its Google API requests are authorized with, such
+    as when the saved refresh token was revoked or Google could not be reached.
+    """
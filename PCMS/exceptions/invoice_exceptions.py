@@ -0,0 +1,10 @@
+class InvoiceGenerationError(Exception):
+    """
+    Raised once every invoice in a batch has been attempted and at least one of them could not be generated.
+
+    :param failures: A mapping of each failed invoice name to the error raised while generating it.
+    """
+    def __init__(self, failures: dict[str, Exception]):
+        self.failures = failures
+        failed_invoices = ", ".join(f"{name} ({str(error)})" for name, error in failures.items())
+        super().__init__(f"Failed to generate {len(failures)} invoice(s): {failed_invoices}")
@@ -0,0 +1,10 @@
+class JobberPdfProcessingError(Exception):
+    """
+    Raised once every Jobber PDF has been attempted and at least one of them could not be parsed.
+
+    :param failures: A mapping of each failed PDF path to the error raised while parsing it.
+    """
+    def __init__(self, failures: dict[str, Exception]):
+        self.failures = failures
+        failed_files = ", ".join(f"{path} ({str(error)})" for path, error in failures.items())
+        super().__init__(f"Failed to process {len(failures)} Jobber PDF(s): {failed_files}")
@@ -1,7 +1,118 @@
+import datetime
+from array import array
+from typing import Iterable, Iterator, Optional
+
 from pydantic import BaseModel
 
+# (date, description, amount in cents, category, cost code) as produced by the statement parser
+TransactionRow = tuple[str, str, int, Optional[str], Optional[str]]
+
 
 class Transaction(BaseModel):
     date: str
     description: str
     amount: float
+    # Optional rather than 'or None' since pydantic validates these and they are set to None when untagged
+    category: Optional[str] = None
+    cost_code: Optional[str] = None
+
+
+class TransactionBatch:
+    """
+    Transactions stored column by column in typed arrays, for parsing and processing many transactions without a
+    validated model object per row.
+
+    Dates, descriptions, categories and cost codes are stored as codes into a string table shared by all the columns,
+    so each distinct value is stored once however many transactions repeat it. Amounts are stored in cents. The
+    batch is converted to Transaction models only where they are handed out, with to_transactions.
+
+    Statement dates have no year, so the batch also keeps the closing date of the statement period they fall in.
+    """
+    NO_VALUE = -1
+
+    def __init__(self, rows: Iterable[TransactionRow] = ()):
+        """
+        :param rows: The rows to fill the batch with.
+        """
+        self.strings: list[str] = []
+        self.dates = array('l')
+        self.descriptions = array('l')
+        self.amount_cents = array('q')
+        self.categories = array('l')
+        self.cost_codes = array('l')
+        self.__string_codes: dict[str, int] = {}
+        # Set by the statement parser when it finds the statement period
+        self.closing_date: datetime.date or None = None
+        self.extend(rows)
+
+    def __len__(self) -> int:
+        return len(self.amount_cents)
+
+    def __getstate__(self) -> dict:
+        # The string codes are rebuilt from the string table rather than pickled alongside it
+        state = self.__dict__.copy()
+        del state['_TransactionBatch__string_codes']
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.__string_codes = {string: code for code, string in enumerate(self.strings)}
+
+    def append(self, row: TransactionRow) -> None:
+        date, description, amount_cents, category, cost_code = row
+        self.dates.append(self.get_string_code(date))
+        self.descriptions.append(self.get_string_code(description))
+        self.amount_cents.append(amount_cents)
+        self.categories.append(self.get_string_code(category) if category is not None else self.NO_VALUE)
+        self.cost_codes.append(self.get_string_code(cost_code) if cost_code is not None else self.NO_VALUE)
+
+    def extend(self, rows: Iterable[TransactionRow]) -> None:
+        for row in rows:
+            self.append(row)
+
+    def get_string_code(self, string: str) -> int:
+        """
+        Get the code of a string in the string table, adding it if it is not already in it.
+        """
+        code = self.__string_codes.get(string)
+        if code is None:
+            code = self.__string_codes[string] = len(self.strings)
+            self.strings.append(string)
+        return code
+
+    def get_string(self, code: int) -> str or None:
+        return self.strings[code] if code != self.NO_VALUE else None
+
+    def rows(self) -> Iterator[TransactionRow]:
+        get_string = self.get_string
+        for date, description, amount_cents, category, cost_code in zip(
+                self.dates, self.descriptions, self.amount_cents, self.categories, self.cost_codes):
+            yield (self.strings[date], self.strings[description], amount_cents, get_string(category),
+                   get_string(cost_code))
+
+    def to_transactions(self) -> list[Transaction]:
+        return [to_transaction(row) for row in self.rows()]
+
+
+def to_transaction(row: TransactionRow) -> Transaction:
+    date, description, amount_cents, category, cost_code = row
+    return Transaction(date=date, description=description, amount=amount_cents / 100, category=category,
+                       cost_code=cost_code)
+
+
+class StatementResult(BaseModel):
+    file_path: str
+    processed: bool = False
+    transaction_count: int = 0
+    parse_seconds: float = 0.0
+    write_seconds: float = 0.0
+    error: str or None = None
+
+
+class CcProcessingResult(BaseModel):
+    statements: list[StatementResult] = []
+    total_seconds: float = 0.0
+
+    @property
+    def processed_count(self) -> int:
+        return sum(1 for statement in self.statements if statement.processed)
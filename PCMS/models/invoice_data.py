@@ -22,4 +22,14 @@ class InvoiceData(BaseModel):
     invoice_date: str
     invoice_due_date: str
     customer_info: CustomerInfo
-    job_data: list[JobData]
+    job_data: list[JobData] = []
+
+
+class InvoiceResult(BaseModel):
+    name: str
+    invoice_number: str
+    generated: bool = False
+    spreadsheet_id: str or None = None
+    job_item_count: int = 0
+    seconds: float = 0.0
+    error: str or None = None
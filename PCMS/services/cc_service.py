@@ -1,125 +1,359 @@
 import re
 import os
+import datetime
 import csv
+import time
 import logging
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterable, Iterator
 from pypdf import PdfReader
 
-from PCMS.models.cc_data import Transaction
+from PCMS.models.cc_data import (CcProcessingResult, StatementResult, Transaction, TransactionBatch, TransactionRow,
+                                 to_transaction)
+from PCMS.services.ledger_service import MONTHS, LedgerService
 from PCMS.util.file_util import FileUtil
 from PCMS.util.folder_names import FolderNames
+from PCMS.util.transaction_rules import DEFAULT_RULES, TransactionRules
 
 logger = logging.getLogger("pcms")
 
+DEFAULT_TRANSACTION_RULES = TransactionRules(DEFAULT_RULES)
+TRANSACTION_PATTERN = re.compile(r'(?P<date>\w{3} \d{2})\s+\w{3} \d{2}\s+(?P<name>.+?)\s+\|\|\|.*?(\$[\d,]+\.\d{2})')
+# The end of the statement period, e.g. 'STATEMENT FROM DEC 15, 2023 TO JAN 14, 2024' or 'STATEMENT FROM JAN 15 TO
+# FEB 14, 2024'
+STATEMENT_PERIOD_PATTERN = re.compile(
+    r'STATEMENT\s+FROM\s+.+?\s+TO\s+(?P<month>[A-Z]{3})[A-Z]*\.?\s+(?P<day>\d{1,2}),?\s+(?P<year>\d{4})', re.IGNORECASE
+)
+
+
+class CcOutputFormats:
+    PADDED_CSV = 'padded_csv'  # CSV with every column centred for reading, written in a second pass
+    CSV = 'csv'
+    JSON_LINES = 'jsonl'
+
 
 class CcService:
-    __EXCLUDE_KEYWORDS = ['PAYMENT', 'CREDIT', 'REFUND', 'RETURN', 'INTEREST']
+    def __init__(
+            self,
+            file_util: FileUtil,
+            max_workers: int = 1,
+            ledger_service: LedgerService or None = None,
+            output_format: str = CcOutputFormats.PADDED_CSV,
+            rules: TransactionRules = DEFAULT_TRANSACTION_RULES
+    ):
+        """
+        :param max_workers: The number of processes used to parse statements. 1 parses them one at a time in this
+                            process and 0 uses one process per CPU.
+        :param ledger_service: The ledger every processed statement's transactions are added to, or None.
+        :param output_format: The CcOutputFormats format the transactions of each statement are written in. An
+                              unknown format falls back to the padded CSV.
+        :param rules: The rules excluding transactions and tagging them with categories and cost codes.
+        """
+        if output_format not in (CcOutputFormats.PADDED_CSV, CcOutputFormats.CSV, CcOutputFormats.JSON_LINES):
+            logger.warning(f"Unknown credit card output format {output_format}, using default "
+                           f"{CcOutputFormats.PADDED_CSV}")
+            output_format = CcOutputFormats.PADDED_CSV
 
-    def __init__(self, file_util: FileUtil):
         self.__file_util = file_util
+        self.__ledger_service = ledger_service
+        self.__output_format = output_format
+        self.__rules = rules
+        self.__max_workers = max_workers if max_workers > 0 else os.cpu_count() or 1
 
+    def process_credit_card_statements(self) -> CcProcessingResult:
+        """
+        Write the transactions of every unprocessed credit card statement to a CSV and move the statement to the
+        processed folder.
 
-    def process_credit_card_statements(self):
+        Statements are parsed across a pool of processes when more than one worker is configured, while the CSVs are
+        written and the statements moved one at a time in folder listing order. A statement that fails is recorded
+        in the result and left in the unprocessed folder without stopping the others.
+        """
+        start_time = time.perf_counter()
+        result = CcProcessingResult()
         unprocessed_cc_statement_paths = self.__file_util.get_file_paths(FolderNames.UNPROCESSED_CC_STATEMENTS_FOLDER_NAME)
 
         if len(unprocessed_cc_statement_paths) == 0:
             logger.info(f"No credit card statements found in {FolderNames.UNPROCESSED_CC_STATEMENTS_FOLDER_NAME} "
                         f"to be processed")
-            return None
-
-        for unprocessed_cc_statement_path in unprocessed_cc_statement_paths:
-            transactions = self.__get_transactions(unprocessed_cc_statement_path)
-
-            if len(transactions) == 0:
-                logger.warning(f"No transactions found inside of {unprocessed_cc_statement_path}")
-                continue
-
-            file_name = self.__file_util.get_file_name(unprocessed_cc_statement_path)
-            self.__write_transactions_to_csv(FolderNames.GENERATED_CSV_FOLDER_NAME, file_name, transactions)
-            self.__file_util.move_file(unprocessed_cc_statement_path, FolderNames.PROCESSED_CC_STATEMENTS_FOLDER_NAME)
-
-    def __get_transactions(self, file_path: str) -> list[Transaction]:
-        transaction_lines = self.__read_transactions_from_file(file_path)
-        return self.__extract_data_from_transactions(transaction_lines)
-
-    @staticmethod
-    def __read_transactions_from_file(file_path: str) -> list[str]:
-        reader = PdfReader(file_path)
-        combined_lines = []
+            return result
 
-        for page in reader.pages:
-            text = page.extract_text()
-            lines = text.split("\n")
-            start_index = next((i for i, line in enumerate(lines) if
-                                "TRANSACTION POSTINGACTIVITY DESCRIPTION AMOUNT ($)DATE DATE" in line), None)
-
-            if start_index is None:
-                continue
-
-            transaction_lines = lines[start_index + 1:]
-
-            combined_line = ""
-            for i in range(0, len(transaction_lines) - 1):
-                if combined_line == "":
-                    combined_line += transaction_lines[i]
-                else:
-                    combined_line = combined_line + " ||| " + transaction_lines[i]
-                if "$" in combined_line:
-                    combined_lines.append(combined_line)
-                    combined_line = ""
+        worker_count = min(self.__max_workers, len(unprocessed_cc_statement_paths))
+        executor = None
+        if worker_count > 1:
+            logger.info(f"Processing {len(unprocessed_cc_statement_paths)} credit card statements with "
+                        f"{worker_count} worker processes")
+            executor = ProcessPoolExecutor(max_workers=worker_count)
 
-        return combined_lines
-
-    def __extract_data_from_transactions(self, transaction_lines: list[str]) -> list[Transaction]:
-        pattern = re.compile(r'(?P<date>\w{3} \d{2})\s+\w{3} \d{2}\s+(?P<name>.+?)\s+\|\|\|.*?(\$[\d,]+\.\d{2})')
-
-        transactions: list[Transaction] = []
-
-        for line in transaction_lines:
-            match = pattern.search(line)
-
-            if match:
-                date: str = match.group("date")
-                description: str = match.group("name").strip()
-                amount_str: str = match.group(3)
+        try:
+            if executor is not None:
+                parsing = [executor.submit(get_timed_transactions, path, self.__rules)
+                           for path in unprocessed_cc_statement_paths]
+            else:
+                parsing = unprocessed_cc_statement_paths
+
+            for unprocessed_cc_statement_path, parse in zip(unprocessed_cc_statement_paths, parsing):
+                result.statements.append(self.__process_statement(unprocessed_cc_statement_path, parse))
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        result.total_seconds = time.perf_counter() - start_time
+        logger.info(f"Processed {result.processed_count} of {len(result.statements)} credit card statements in "
+                    f"{result.total_seconds:.2f}s")
+        return result
+
+    def __process_statement(self, unprocessed_cc_statement_path: str, parse: Future or str) -> StatementResult:
+        """
+        Write a statement's transactions to the output folder and move it to the processed folder.
 
-                amount: float = float(amount_str.replace('$', '').replace(',', ''))
+        Statements parsed in this process are streamed straight from the PDF into the output file. When the ledger
+        is enabled the streamed transactions are also collected into a batch to be added to it.
 
-                if not any(keyword in description for keyword in self.__EXCLUDE_KEYWORDS):
-                    transactions.append(Transaction(
-                        date=date,
-                        description=description,
-                        amount=amount
-                    ))
+        :param unprocessed_cc_statement_path: The path of the statement.
+        :param parse: The future parsing the statement in the process pool, or the path to parse in this process.
+        """
+        statement_result = StatementResult(file_path=unprocessed_cc_statement_path)
+        try:
+            start_time = time.perf_counter()
+            if isinstance(parse, Future):
+                batch, statement_result.parse_seconds = parse.result()
+                rows = batch.rows()
+            else:
+                batch = TransactionBatch()
+                rows = iter_transaction_rows(parse, self.__rules, batch)
+                if self.__ledger_service is not None:
+                    rows = record_rows(rows, batch)
+
+            write_start_time = time.perf_counter()
+            file_name = self.__file_util.get_file_name(unprocessed_cc_statement_path)
+            statement_result.transaction_count = self.__write_transactions(
+                FolderNames.GENERATED_CSV_FOLDER_NAME, file_name, rows
+            )
+            if not isinstance(parse, Future):
+                # Parsing and writing overlap when streaming, the parse time includes writing the rows
+                statement_result.parse_seconds = time.perf_counter() - start_time
+                write_start_time = time.perf_counter()
+
+            if statement_result.transaction_count == 0:
+                logger.warning(f"No transactions found inside of {unprocessed_cc_statement_path}")
+                return statement_result
+
+            if self.__ledger_service is not None:
+                self.__ledger_service.add_transactions(file_name, batch)
+            if not self.__file_util.move_file(unprocessed_cc_statement_path,
+                                              FolderNames.PROCESSED_CC_STATEMENTS_FOLDER_NAME):
+                raise Exception(f"Could not move {unprocessed_cc_statement_path} to the processed folder")
+            statement_result.write_seconds = time.perf_counter() - write_start_time
+            statement_result.processed = True
+        except Exception as e:
+            logger.error(f"Error processing credit card statement {unprocessed_cc_statement_path}: {str(e)}")
+            statement_result.error = str(e)
 
-        return transactions
+        return statement_result
 
-    def __write_transactions_to_csv(self, folder_name: str, filename: str, transactions: list[Transaction]) -> None:
+    def __write_transactions(self, folder_name: str, filename: str, rows: Iterable[TransactionRow]) -> int:
         """
-        Write credit card transactions to a CSV file in a specified folder.
+        Write credit card transactions to a file in a specified folder, one row at a time as they are iterated.
 
-        :param folder_name: The name of the folder to save the CSV file in.
-        :param filename: The name of the CSV file (without extension).
-        :param transactions: A list of transactions, where each transaction is a tuple (date, description, amount).
+        The file is written to a temporary file first and renamed into place, so it is never left half written. The
+        padded CSV format pads the columns in a second pass over the written file. No file is written when there
+        are no transactions.
+
+        :param folder_name: The name of the folder to save the file in.
+        :param filename: The name of the file (without extension).
+        :param rows: The transaction rows to write.
+        :return: The number of transactions written.
         """
+        temp_file_path = None
         try:
             folder_path = self.__file_util.get_path(folder_name)
-            csv_file_path: str = os.path.join(folder_path, f"{filename}.csv")
-
-            max_date_length = max(len(transaction.date) for transaction in transactions)
-            max_description_length = max(len(transaction.description) for transaction in transactions)
-            max_amount_length = max(len(f"${transaction.amount}") for transaction in transactions)
-
-            with open(csv_file_path, mode='w', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(["Date", "Transaction", "Amount"])
+            extension = "jsonl" if self.__output_format == CcOutputFormats.JSON_LINES else "csv"
+            file_path: str = os.path.join(folder_path, f"{filename}.{extension}")
+            temp_file_path = f"{file_path}.tmp"
+
+            transaction_count = 0
+            with open(temp_file_path, mode='w', newline='') as file:
+                if self.__output_format == CcOutputFormats.JSON_LINES:
+                    for row in rows:
+                        file.write(to_transaction(row).model_dump_json() + "\n")
+                        transaction_count += 1
+                else:
+                    writer = csv.writer(file)
+                    # Only add the tag columns when there are rules that could fill them
+                    include_tags = self.__rules.has_tag_rules
+                    header = ["Date", "Transaction", "Amount"]
+                    writer.writerow(header + ["Category", "Cost Code"] if include_tags else header)
+                    for date, description, amount_cents, category, cost_code in rows:
+                        values = [date, description, self.__format_amount(amount_cents)]
+                        if include_tags:
+                            values.extend([category or "", cost_code or ""])
+                        writer.writerow(values)
+                        transaction_count += 1
+
+            if transaction_count == 0:
+                os.remove(temp_file_path)
+                return 0
+
+            if self.__output_format == CcOutputFormats.PADDED_CSV:
+                pad_csv_file(temp_file_path)
+
+            os.replace(temp_file_path, file_path)
+            logger.info(f"Transactions written to {file_path}")
+            return transaction_count
 
-                for transaction in transactions:
-                    centered_date = transaction.date.center(max_date_length)
-                    centered_description = transaction.description.center(max_description_length)
-                    centered_amount = f"${transaction.amount}".center(max_amount_length)
-                    writer.writerow([centered_date, centered_description, centered_amount])
+        except Exception as e:
+            logger.error(f"Error occurred while writing to the transactions file: {e}")
+            if temp_file_path is not None and os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+            raise e
+
+    def __format_amount(self, amount_cents: int) -> str:
+        amount = amount_cents / 100
+        if self.__output_format == CcOutputFormats.PADDED_CSV:
+            return f"${amount}"
+        # Plain two decimal amounts for spreadsheets and scripts reading the compact CSV
+        return f"{amount:.2f}"
+
+
+def pad_csv_file(csv_file_path: str) -> None:
+    """
+    Centre every column of a CSV's data rows on the width of its widest value, streaming the file twice.
+
+    :param csv_file_path: The path of the CSV with a header row to pad in place.
+    """
+    column_widths = []
+    with open(csv_file_path, mode='r', newline='') as file:
+        reader = csv.reader(file)
+        next(reader)
+        for row in reader:
+            if len(column_widths) < len(row):
+                column_widths.extend([0] * (len(row) - len(column_widths)))
+            for index, value in enumerate(row):
+                column_widths[index] = max(column_widths[index], len(value))
+
+    padded_csv_file_path = f"{csv_file_path}.padded"
+    with open(csv_file_path, mode='r', newline='') as file, open(padded_csv_file_path, mode='w', newline='') as out:
+        reader = csv.reader(file)
+        writer = csv.writer(out)
+        writer.writerow(next(reader))
+        for row in reader:
+            writer.writerow([value.center(column_widths[index]) for index, value in enumerate(row)])
+
+    os.replace(padded_csv_file_path, csv_file_path)
+
+
+def record_rows(rows: Iterable[TransactionRow], recorded: TransactionBatch) -> Iterator[TransactionRow]:
+    for row in rows:
+        recorded.append(row)
+        yield row
+
+
+def get_timed_transactions(
+        file_path: str,
+        rules: TransactionRules = DEFAULT_TRANSACTION_RULES
+) -> tuple[TransactionBatch, float]:
+    """
+    Get the transactions of a credit card statement along with how long parsing it took in seconds. The batch is
+    much cheaper to send back from a worker process than a list of models.
+
+    :param file_path: The path of the credit card statement PDF.
+    :param rules: The rules excluding and tagging the transactions.
+    """
+    start_time = time.perf_counter()
+    batch = get_transaction_batch(file_path, rules)
+    return batch, time.perf_counter() - start_time
+
+
+def get_transactions(file_path: str, rules: TransactionRules = DEFAULT_TRANSACTION_RULES) -> list[Transaction]:
+    return get_transaction_batch(file_path, rules).to_transactions()
+
+
+def get_transaction_batch(file_path: str, rules: TransactionRules = DEFAULT_TRANSACTION_RULES) -> TransactionBatch:
+    batch = TransactionBatch()
+    batch.extend(iter_transaction_rows(file_path, rules, batch))
+    return batch
+
+
+def iter_transaction_rows(
+        file_path: str,
+        rules: TransactionRules = DEFAULT_TRANSACTION_RULES,
+        statement: TransactionBatch or None = None
+) -> Iterator[TransactionRow]:
+    return extract_transaction_rows(read_transactions_from_file(file_path, statement), rules)
+
+
+def read_transactions_from_file(file_path: str, statement: TransactionBatch or None = None) -> Iterator[str]:
+    """
+    Yield the transaction records of a credit card statement, page by page.
+
+    :param file_path: The path of the credit card statement PDF.
+    :param statement: The batch whose closing_date is set to the end of the statement period once it is found.
+    """
+    reader = PdfReader(file_path)
+
+    for page in reader.pages:
+        text = page.extract_text()
+        if statement is not None and statement.closing_date is None:
+            statement.closing_date = find_closing_date(text)
+        lines = text.split("\n")
+        start_index = next((i for i, line in enumerate(lines) if
+                            "TRANSACTION POSTINGACTIVITY DESCRIPTION AMOUNT ($)DATE DATE" in line), None)
+
+        if start_index is None:
+            continue
+
+        yield from assemble_transaction_records(lines[start_index + 1:])
+
+
+def find_closing_date(text: str) -> datetime.date or None:
+    """
+    Find the last day of the statement period in the text of a statement page.
+    e.g. '... STATEMENT FROM DEC 15, 2023 TO JAN 14, 2024 ...' -> date(2024, 1, 14)
+
+    :param text: The text of a page of the statement.
+    :return: The closing date, or None if the page does not have the statement period.
+    """
+    match = STATEMENT_PERIOD_PATTERN.search(text)
+    if match is None:
+        return None
+    try:
+        return datetime.date(int(match.group("year")), MONTHS[match.group("month").upper()], int(match.group("day")))
+    except (KeyError, ValueError):
+        return None
+
+
+def assemble_transaction_records(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Join the lines of a transaction, from its dates and description up to the line with its amount, into a single
+    record separated by ' ||| '. Lines after the last amount do not form a record.
+    e.g. ['Jan 03 Jan 05 HOME DEPOT', 'USD 12.00', '$16.20'] -> 'Jan 03 Jan 05 HOME DEPOT ||| USD 12.00 ||| $16.20'
+
+    :param lines: The lines following the transaction table header.
+    """
+    fragments = []
+    for line in lines:
+        fragments.append(line)
+        # Only the new line can hold the amount, earlier fragments were checked when they were added
+        if "$" in line:
+            yield " ||| ".join(fragments)
+            fragments = []
 
-            logger.info(f"Transactions written to {csv_file_path}")
 
-        except Exception as e:
-            logger.error(f"Error occurred while writing to the CSV file: {e}")
\ No newline at end of file
+def extract_transaction_rows(
+        transaction_lines: Iterable[str],
+        rules: TransactionRules = DEFAULT_TRANSACTION_RULES
+) -> Iterator[TransactionRow]:
+    for line in transaction_lines:
+        match = TRANSACTION_PATTERN.search(line)
+
+        if match:
+            date: str = match.group("date")
+            description: str = match.group("name").strip()
+            amount_str: str = match.group(3)
+
+            amount_cents: int = int(amount_str.replace('$', '').replace(',', '').replace('.', ''))
+
+            excluded, category, cost_code = rules.classify(description)
+            if not excluded:
+                yield date, description, amount_cents, category, cost_code
@@ -1,175 +1,408 @@
 import logging
 import os
-import requests
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+import re
+import threading
+import time
+import uuid
+from typing import Callable, TypeVar
+from googleapiclient.errors import HttpError
+from google.auth.transport.requests import AuthorizedSession
+from PCMS.util.credential_manager import CredentialManager
 from PCMS.util.file_util import FileUtil
-
-SCOPES = ['https://www.googleapis.com/auth/drive', 'https://www.googleapis.com/auth/spreadsheets']
+from PCMS.util.http_transport import (CONNECT_TIMEOUT_SECONDS, DEFAULT_READ_TIMEOUT_SECONDS, SessionHttp,
+                                      create_authorized_session)
+from PCMS.util.request_scheduler import RequestQuotas, RequestScheduler
+
+T = TypeVar("T")
+
+# Only the sheet properties needed to find a sheet and its size, instead of the whole spreadsheet resource
+SHEET_METADATA_FIELDS = "sheets.properties(sheetId,title,gridProperties(rowCount,columnCount))"
+# Batch update requests that change a sheet's size, which is adjusted in the cached metadata
+DIMENSION_REQUESTS = ('insertDimension', 'deleteDimension', 'appendDimension')
+# Batch update requests that add, remove or rename sheets, which drop the spreadsheet's cached metadata
+SHEET_STRUCTURE_REQUESTS = ('addSheet', 'deleteSheet', 'duplicateSheet', 'updateSheetProperties')
+# Drive app property tagging a copy with the request that made it, so a retried copy can find it instead of copying
+# the spreadsheet again
+COPY_REQUEST_ID_PROPERTY = 'pcmsCopyRequestId'
+# Size of the chunks an exported PDF is written to disk in, so only one chunk is held in memory at a time
+EXPORT_CHUNK_SIZE_BYTES = 64 * 1024
+# A1 notation, e.g. 'G3', 'AA10:AB12', 'A:A', '3:5' or "'Job Data'!B2:E"
+A1_RANGE_PATTERN = re.compile(
+    r"^(?:(?P<sheet>'(?:[^']|'')+'|[^'!]+)!)?"
+    r"(?P<start_col>[A-Za-z]*)(?P<start_row>\d*)"
+    r"(?::(?P<end_col>[A-Za-z]*)(?P<end_row>\d*))?$"
+)
 
 logger = logging.getLogger("pcms")
 
 
 class GoogleService:
-    def __init__(self, file_util: FileUtil, credentials_file_name: str):
+    def __init__(
+            self,
+            file_util: FileUtil,
+            credentials_file_name: str,
+            metadata_ttl_seconds: float = 300,
+            pool_size: int = 10,
+            timeout_seconds: float = DEFAULT_READ_TIMEOUT_SECONDS,
+            sheets_requests_per_minute: int = 60,
+            max_retries: int = 5,
+            max_in_flight_requests: int = 0,
+            session: AuthorizedSession or None = None,
+            credential_manager: CredentialManager or None = None
+    ):
+        """
+        :param metadata_ttl_seconds: How long the sheet properties of a spreadsheet are cached before being fetched
+                                     again. 0 fetches them every time they are needed.
+        :param pool_size: The number of kept alive connections to each Google host, shared by every thread.
+        :param timeout_seconds: How long to wait for a response to a request before giving up.
+        :param sheets_requests_per_minute: The Sheets API read and write requests allowed per minute each, matching
+                                           the per user quotas. 0 does not limit them.
+        :param max_retries: How many times a request failing with a rate limit, server or connection error is retried.
+        :param max_in_flight_requests: The most requests sent at the same time across all threads, or 0 for no limit.
+        :param session: The session to send every request with, authorized with its own credentials, in place of one
+                        authorized through OAuth. e.g. a session mounted on a local stand-in for Google's APIs.
+        :param credential_manager: Keeps the OAuth credentials requests are authorized with fresh, by default one
+                                   using the saved token or the credentials file. Not used with a session of its own
+                                   unless given.
+        """
         self.__file_util = file_util
-        self.__creds = self.__authenticate_with_oauth(credentials_file_name)
-        self.__drive_service = build('drive', 'v3', credentials=self.__creds)
-        self.__sheet_service = build('sheets', 'v4', credentials=self.__creds)
+        self.__scheduler = RequestScheduler({
+            RequestQuotas.SHEETS_READ: sheets_requests_per_minute,
+            RequestQuotas.SHEETS_WRITE: sheets_requests_per_minute
+        }, max_retries, max_in_flight=max_in_flight_requests)
+        self.__metadata_ttl_seconds = metadata_ttl_seconds
+        # Spreadsheet ID -> (time fetched, sheet title -> sheet properties), shared by the invoice threads
+        self.__sheet_metadata: dict[str, tuple[float, dict[str, dict]]] = {}
+        self.__sheet_metadata_lock = threading.Lock()
+        self.__thread_local = threading.local()
+        # Authenticating and building the Drive and Sheets clients is left until the first request, so starting PCMS
+        # to do something else does not wait on OAuth or pay for the clients
+        if credential_manager is None and session is None:
+            credential_manager = CredentialManager(file_util, credentials_file_name)
+        self.__credential_manager = credential_manager
+        self.__pool_size = pool_size
+        self.__timeout = (CONNECT_TIMEOUT_SECONDS, timeout_seconds)
+        self.__client_lock = threading.Lock()
+        self.__session: AuthorizedSession or None = session
+        self.__drive_files = None
+        self.__spreadsheets = None
+
+    def __execute(self, send: Callable[[], T], quota: str or None, description: str, idempotent: bool = True) -> T:
+        """
+        Send a request through the scheduler, counting every attempt.
 
-    def __authenticate_with_oauth(self, credentials_file_name: str):
-        try:
-            creds = None
-            # The file token.json stores the user's access and refresh tokens, and is
-            # created automatically when the authorization flow completes for the first time.
-            if self.__file_util.file_exists("token.json"):
-                token_file_path = self.__file_util.get_path("token.json")
-                creds = Credentials.from_authorized_user_file(token_file_path, SCOPES)
-
-            if not creds or not creds.valid:
-                if creds and creds.expired and creds.refresh_token:
-                    creds.refresh(Request())
-                else:
-                    creds_file_path = self.__file_util.get_path(credentials_file_name)
-                    flow = InstalledAppFlow.from_client_secrets_file(creds_file_path, SCOPES)
-                    creds = flow.run_local_server(port=0)
-                # Save the credentials for the next run
-                with open(f"{self.__file_util.get_root()}/token.json", 'w') as token:
-                    token.write(creds.to_json())
-
-            return creds
-        except Exception as e:
-            logger.error(f"Error while authenticating with OAuth: {str(e)}")
+        :param send: Sends the request, e.g. an HttpRequest's execute.
+        :param quota: The RequestQuotas kind of the request.
+        :param description: What the request does, for the logs.
+        :param idempotent: If sending the request twice has the same effect as sending it once.
+        """
+        def send_counted() -> T:
+            self.__check_credentials()
+            self.__count_api_call()
+            return send()
+
+        return self.__scheduler.execute(send_counted, quota, description, idempotent)
+
+    def __check_credentials(self) -> None:
+        """
+        Make sure the credentials are valid before a request is sent, so an authentication failure is raised as a
+        GoogleAuthenticationError rather than surfacing as a failed request.
+        """
+        if self.__credential_manager is not None:
+            credentials = self.__credential_manager.get_credentials()
+            session = self.__session
+            if session is not None and session.credentials is not credentials:
+                # PCMS was authorized again after the refresh token was revoked
+                session.credentials = credentials
+
+    def __count_api_call(self) -> None:
+        self.__thread_local.api_call_count = self.get_api_call_count() + 1
+
+    def get_api_call_count(self) -> int:
+        """
+        Get the number of Google API requests made by the current thread, so the cost of work done on one thread
+        (such as generating an invoice) is the difference between the counts before and after it.
+        """
+        return getattr(self.__thread_local, 'api_call_count', 0)
+
+    def __get_session(self) -> AuthorizedSession:
+        """
+        Get the session every request is sent with, authenticating with OAuth the first time it is needed.
+        """
+        if self.__session is None:
+            with self.__client_lock:
+                if self.__session is None:
+                    self.__session = create_authorized_session(self.__credential_manager.get_credentials(),
+                                                               self.__pool_size)
+        return self.__session
+
+    def __get_drive_files(self):
+        """
+        Get the Drive files collection, building the Drive client the first time it is needed.
+        """
+        if self.__drive_files is None:
+            http = SessionHttp(self.__get_session(), self.__timeout)
+            with self.__client_lock:
+                if self.__drive_files is None:
+                    self.__drive_files = build_service('drive', 'v3', http).files()
+        return self.__drive_files
+
+    def __get_spreadsheets(self):
+        """
+        Get the Sheets spreadsheets collection, building the Sheets client the first time it is needed.
 
-    def make_copy_of_sheet(self, spreadsheet_id: str, new_name: str):
+        The collection is kept and shared by every thread, as creating it generates the documentation of all of
+        its methods, which costs more time than most requests take.
+        """
+        if self.__spreadsheets is None:
+            http = SessionHttp(self.__get_session(), self.__timeout)
+            with self.__client_lock:
+                if self.__spreadsheets is None:
+                    self.__spreadsheets = build_service('sheets', 'v4', http).spreadsheets()
+        return self.__spreadsheets
+
+    def make_copy_of_sheet(self, spreadsheet_id: str, new_name: str, app_properties: dict or None = None):
         """
         Creates a copy of an existing spreadsheet.
 
         :param spreadsheet_id: The ID of the spreadsheet to create a copy of.
         :param new_name: The name of the newly created spreadsheet.
+        :param app_properties: Drive app properties to tag the copy with, so it can be found again with
+                               find_files_with_app_property.
         """
         try:
             logger.info(f"Creating a copy of spreadsheet with ID {spreadsheet_id} with new name {new_name}")
+            copy_request_id = uuid.uuid4().hex
             body = {
                 'name': new_name,
-                'mimeType': 'application/vnd.google-apps.spreadsheet'
+                'mimeType': 'application/vnd.google-apps.spreadsheet',
+                'appProperties': {**(app_properties or {}), COPY_REQUEST_ID_PROPERTY: copy_request_id}
             }
-            response = self.__drive_service.files().copy(fileId=spreadsheet_id, body=body).execute()
-            new_sheet_id = response['id']
+            attempted = False
+
+            def copy() -> str:
+                nonlocal attempted
+                # A failed attempt may still have made the copy, which is used rather than making a second one
+                if attempted:
+                    existing_copy_id = self.__find_copy(copy_request_id)
+                    if existing_copy_id is not None:
+                        logger.info(f"Found the copy {existing_copy_id} made by an earlier attempt")
+                        return existing_copy_id
+                attempted = True
+                self.__check_credentials()
+                self.__count_api_call()
+                return self.__get_drive_files().copy(fileId=spreadsheet_id, body=body, fields='id').execute()['id']
+
+            # Not sent through __execute, as an attempt can be one or two requests which are counted separately
+            new_sheet_id = self.__scheduler.execute(copy, RequestQuotas.DRIVE, f"copy spreadsheet {spreadsheet_id}")
             logger.info(f"Copied File ID: {new_sheet_id}")
             return new_sheet_id
         except Exception as e:
             logger.error(f"Error when making copy of spreadsheet with ID {spreadsheet_id} with name {new_name}: {str(e)}")
             raise e
 
-    @staticmethod
-    def create_write_request(sheet_id: str, range_name: str, value: str) -> dict:
+    def __find_copy(self, copy_request_id: str) -> str or None:
         """
-        Create an update request to be used in a batch update request call.
+        Find the spreadsheet copied by a make_copy_of_sheet request.
 
-        :param sheet_id: The ID of the sheet inside the spreadsheet to target.
-        :param range_name: The range of cells to be updated.
-        :param value: The value to update the cells with.
+        :param copy_request_id: The ID the copy was tagged with.
         """
-        return {
-            'updateCells': {
-                'range': {
-                    'sheetId': sheet_id,
-                    'startRowIndex': get_row_from_range(range_name),
-                    'endRowIndex': get_row_from_range(range_name) + 1,
-                    'startColumnIndex': get_col_from_range(range_name),
-                    'endColumnIndex': get_col_from_range(range_name) + 1
-                },
-                'rows': [{'values': [{'userEnteredValue': {'stringValue': value}}]}],
-                'fields': 'userEnteredValue'
-            }
-        }
+        self.__check_credentials()
+        self.__count_api_call()
+        files = self.__list_files_with_app_property(COPY_REQUEST_ID_PROPERTY, copy_request_id)
+        return files[0] if len(files) > 0 else None
 
-    def export_sheet_as_pdf(self, spreadsheet_id: str, sheet_name: str) -> bytes:
+    def find_files_with_app_property(self, key: str, value: str) -> list[str]:
         """
-        Returns the spreadsheet exported as a pdf in bytes
+        Find the files in Drive tagged with an app property, such as copies tagged by make_copy_of_sheet.
 
-        :param spreadsheet_id: The ID of the spreadsheet to be turned into a PDF.
-        :param sheet_name: The name of the sheet inside the spreadsheet to be exported.
+        :param key: The name of the app property.
+        :param value: The value the app property must have.
+        :return: The IDs of the files.
         """
         try:
-            gid = self.get_sheet_gid(spreadsheet_id, sheet_name)
-            pdf_export_url = f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/export?format=pdf&gid={gid}"
+            return self.__execute(lambda: self.__list_files_with_app_property(key, value), RequestQuotas.DRIVE,
+                                  f"find files with {key} {value}")
+        except Exception as e:
+            logger.error(f"Error when finding files with app property {key} set to {value}: {str(e)}")
+            raise e
 
-            headers = {
-                'Authorization': f'Bearer {self.__creds.token}',
-            }
-            response = requests.get(pdf_export_url, headers=headers)
+    def __list_files_with_app_property(self, key: str, value: str) -> list[str]:
+        files = []
+        page_token = None
+        while True:
+            response = self.__get_drive_files().list(
+                q=f"appProperties has {{ key='{key}' and value='{value}' }} and trashed = false",
+                fields='nextPageToken, files(id)',
+                spaces='drive',
+                pageToken=page_token
+            ).execute()
+            files.extend(file['id'] for file in response.get('files', []))
+            page_token = response.get('nextPageToken')
+            if page_token is None:
+                return files
 
-            if response.status_code == 200:
-                return response.content
-            else:
-                logger.error(
-                    f"None 200 code while exporting the sheet {sheet_name} from spreadsheet with ID {spreadsheet_id} "
-                    f"as a PDF: {response.content}")
+    def get_file_modified_time(self, file_id: str) -> str:
+        """
+        Get when a file in Drive was last modified, as an RFC 3339 timestamp.
+
+        :param file_id: The ID of the file.
+        """
+        try:
+            return self.__execute(
+                self.__get_drive_files().get(fileId=file_id, fields='modifiedTime').execute,
+                RequestQuotas.DRIVE,
+                f"get the modified time of {file_id}"
+            )['modifiedTime']
         except Exception as e:
-            logger.error(
-                f"Error when export as PDF spreadsheet with ID {spreadsheet_id} with "
-                f"sheet name {sheet_name}: {str(e)}")
+            logger.error(f"Error when getting the modified time of file with ID {file_id}: {str(e)}")
             raise e
 
-    def get_last_row_with_data(self, spreadsheet_id: str, data_range: str) -> int:
+    def rename_file(self, file_id: str, new_name: str, app_properties: dict or None = None) -> None:
         """
-        Get the last row number that has data within a range.
+        Rename a file in Drive, optionally changing its app properties in the same request.
 
-        :param spreadsheet_id: The ID of the Google Sheet.
-        :param data_range: The range to look for data.
+        :param file_id: The ID of the file.
+        :param new_name: The new name of the file.
+        :param app_properties: App properties to set on the file. A property set to None is removed.
         """
+        body = {'name': new_name}
+        if app_properties is not None:
+            body['appProperties'] = app_properties
         try:
-            result = self.__sheet_service.spreadsheets().values().get(
-                spreadsheetId=spreadsheet_id,
-                range=data_range
-            ).execute()
-            return len(result.get('values', []))
+            self.__execute(
+                self.__get_drive_files().update(fileId=file_id, body=body, fields='id').execute,
+                RequestQuotas.DRIVE,
+                f"rename file {file_id}"
+            )
+            logger.info(f"Renamed file with ID {file_id} to {new_name}")
         except Exception as e:
-            logger.error(
-                f"Error when getting last row with data spreadsheet with ID {spreadsheet_id} "
-                f"with data range {data_range}: {str(e)}")
+            logger.error(f"Error when renaming file with ID {file_id} to {new_name}: {str(e)}")
             raise e
 
-    def delete_rows_in_range(self, spreadsheet_id: str, sheet_name: str, start_row: int, end_row: int) -> None:
+    def delete_file(self, file_id: str) -> None:
         """
-        Deletes rows in the specified range from the Google Sheet.
+        Delete a file from Drive, such as a spreadsheet copy left half built by a failed invoice.
 
-        :param spreadsheet_id: The ID of the Google Sheet.
-        :param sheet_name: The name of the sheet inside the spreadsheet to have its rows deleted.
-        :param start_row: The starting row (inclusive) for deletion.
-        :param end_row: The ending row (inclusive) for deletion.
+        :param file_id: The ID of the file to delete.
+        """
+        def delete() -> None:
+            try:
+                self.__get_drive_files().delete(fileId=file_id).execute()
+            except HttpError as e:
+                # Already deleted, possibly by an earlier attempt whose response was lost
+                if e.resp.status != 404:
+                    raise e
+
+        try:
+            self.__execute(delete, RequestQuotas.DRIVE, f"delete file {file_id}")
+            self.invalidate_sheet_metadata(file_id)
+            logger.info(f"Deleted file with ID {file_id}")
+        except Exception as e:
+            logger.error(f"Error when deleting file with ID {file_id}: {str(e)}")
+            raise e
+
+    @staticmethod
+    def create_block_write_request(sheet_id: str, start_cell: str, values: list[list[str]]) -> dict:
         """
-        total_rows = self.__get_sheets_total_rows(spreadsheet_id, sheet_name)
+        Create an update request writing a block of values, row by row, starting at a cell. Used in a batch update
+        request call.
 
-        if end_row > total_rows:
-            logger.info(f"End row {end_row} exceeds the total number of rows ({total_rows}).")
-            return
+        Only the cells given are written, so rows can have different lengths and an empty row leaves that row
+        untouched. e.g. [['A'], [], ['B']] from 'A14' writes A14 and A16 and keeps whatever is in A15.
 
-        if start_row > total_rows:
-            logger.info(f"No rows to delete. Starting row {start_row} exceeds the total number of rows ({total_rows}).")
-            return
+        :param sheet_id: The ID of the sheet inside the spreadsheet to target.
+        :param start_cell: The top left cell of the block in A1 notation without a sheet name, e.g. 'A14' or 'AB3'.
+        :param values: The rows of values to write.
+        :raises ValueError: If start_cell is not a single cell, or names a sheet as the sheet is given by sheet_id.
+        """
+        sheet_name, grid_range = parse_a1_range(start_cell)
+        if sheet_name is not None:
+            raise ValueError(f"Start cell {start_cell} names a sheet, the sheet written to is given by its ID")
+        row_index, column_index = grid_range.get('startRowIndex'), grid_range.get('startColumnIndex')
+        if row_index is None or column_index is None or grid_range != {
+            'startRowIndex': row_index, 'endRowIndex': row_index + 1,
+            'startColumnIndex': column_index, 'endColumnIndex': column_index + 1
+        }:
+            raise ValueError(f"Start cell {start_cell} is not a single cell")
 
+        return {
+            'updateCells': {
+                'start': {
+                    'sheetId': sheet_id,
+                    'rowIndex': row_index,
+                    'columnIndex': column_index
+                },
+                'rows': [{'values': [{'userEnteredValue': {'stringValue': value}} for value in row]} if row else {}
+                         for row in values],
+                'fields': 'userEnteredValue'
+            }
+        }
+
+    def download_sheet_as_pdf(self, spreadsheet_id: str, sheet_name: str, pdf_path: str) -> int:
+        """
+        Export a sheet as a PDF straight to a file, writing it in chunks as it is downloaded so memory use does not
+        grow with the size of the PDF.
+
+        The PDF is written to a temporary file that replaces pdf_path once the whole PDF is downloaded, so a failed
+        export never leaves a partial or empty file behind.
+
+        :param spreadsheet_id: The ID of the spreadsheet to be turned into a PDF.
+        :param sheet_name: The name of the sheet inside the spreadsheet to be exported.
+        :param pdf_path: The path the PDF is saved to.
+        :return: The size of the PDF in bytes.
+        """
+        temp_file_path = f"{pdf_path}.tmp"
+        try:
+            pdf_export_url = self.__get_pdf_export_url(spreadsheet_id, sheet_name)
+
+            def download() -> int:
+                with self.__get_session().get(pdf_export_url, timeout=self.__timeout, stream=True) as response:
+                    response.raise_for_status()
+                    size = 0
+                    # Every attempt starts the file over
+                    with open(temp_file_path, 'wb') as file:
+                        for chunk in response.iter_content(chunk_size=EXPORT_CHUNK_SIZE_BYTES):
+                            file.write(chunk)
+                            size += len(chunk)
+                if size == 0:
+                    raise ValueError("The exported PDF is empty")
+                return size
+
+            pdf_size = self.__execute(download, None, f"export sheet {sheet_name} of {spreadsheet_id} as a PDF")
+            os.replace(temp_file_path, pdf_path)
+            return pdf_size
+        except Exception as e:
+            logger.error(
+                f"Error when downloading as PDF spreadsheet with ID {spreadsheet_id} with "
+                f"sheet name {sheet_name} to {pdf_path}: {str(e)}")
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+            raise e
+
+    def __get_pdf_export_url(self, spreadsheet_id: str, sheet_name: str) -> str:
         gid = self.get_sheet_gid(spreadsheet_id, sheet_name)
+        return f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/export?format=pdf&gid={gid}"
+
+    @staticmethod
+    def create_delete_rows_request(sheet_id: str, start_row: int, end_row: int) -> dict:
+        """
+        Create a request deleting rows, to be used in a batch update request call.
 
-        delete_requests = [
-            {
-                'deleteDimension': {
-                    'range': {
-                        'sheetId': gid,
-                        'dimension': 'ROWS',
-                        'startIndex': start_row,
-                        'endIndex': end_row
-                    }
+        :param sheet_id: The ID of the sheet inside the spreadsheet to target.
+        :param start_row: The zero based index of the first row to delete.
+        :param end_row: The zero based index after the last row to delete.
+        """
+        return {
+            'deleteDimension': {
+                'range': {
+                    'sheetId': sheet_id,
+                    'dimension': 'ROWS',
+                    'startIndex': start_row,
+                    'endIndex': end_row
                 }
             }
-        ]
-
-        logger.info(f"Sending request to deleted rows from {start_row} to {end_row}.")
-        self.send_batch_requests(spreadsheet_id, delete_requests)
+        }
 
     def send_batch_requests(self, spreadsheet_id: str, update_requests: list) -> None:
         """
@@ -184,15 +417,168 @@ class GoogleService:
             body = {
                 'requests': update_requests
             }
-            self.__sheet_service.spreadsheets().batchUpdate(
-                spreadsheetId=spreadsheet_id,
-                body=body
-            ).execute()
+            # Cell writes can be applied twice, but a repeated row deletion or new sheet would not be the same. A
+            # batch update is applied in full or not at all, so one whose only other changes are row deletions is
+            # only sent again if its sheets still have the rows it deletes
+            row_counts = self.__get_row_counts_after_update(spreadsheet_id, update_requests)
+            idempotent = row_counts is not None
+            attempted = False
+
+            def update() -> dict or None:
+                nonlocal attempted
+                if attempted and row_counts and self.__is_update_applied(spreadsheet_id, row_counts):
+                    logger.info(f"Found the batch update of {spreadsheet_id} applied by an earlier attempt")
+                    return None
+                attempted = True
+                self.__check_credentials()
+                self.__count_api_call()
+                return self.__get_spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body=body).execute()
+
+            # Not sent through __execute, as an attempt can be one or two requests which are counted separately
+            self.__scheduler.execute(update, RequestQuotas.SHEETS_WRITE, f"batch update {spreadsheet_id}", idempotent)
             logger.debug(f"Batch update successful. Requests sent: {len(update_requests)}")
+            self.__update_cached_sheet_metadata(spreadsheet_id, update_requests)
         except Exception as e:
             logger.error(f"Error when sending batch update to spreadsheet with ID {spreadsheet_id}: {str(e)}")
+            # Whether any of the requests were applied is unknown, so the metadata is fetched again
+            self.invalidate_sheet_metadata(spreadsheet_id)
             raise e
 
+    def __get_row_counts_after_update(
+            self,
+            spreadsheet_id: str,
+            update_requests: list
+    ) -> dict[int, tuple[int, int]] or None:
+        """
+        Get the row count of each sheet a batch update deletes rows from, before and after the update, from the
+        cached sheet properties.
+
+        :param spreadsheet_id: The ID of the Google Sheet.
+        :param update_requests: The batch update requests.
+        :return: The row counts before and after by sheet ID, empty if no rows are deleted, or None if the update
+                 changes the sheets in any other way, so cannot be safely sent again.
+        """
+        row_counts = {}
+        for request in update_requests:
+            if any(request_type in request for request_type in DIMENSION_REQUESTS + SHEET_STRUCTURE_REQUESTS
+                   if request_type != 'deleteDimension'):
+                return None
+            if 'deleteDimension' not in request:
+                continue
+
+            dimension_range = request['deleteDimension']['range']
+            if dimension_range['dimension'] != 'ROWS':
+                return None
+            sheet_id = dimension_range.get('sheetId', 0)
+            if sheet_id not in row_counts:
+                properties = next((properties for properties in self.__get_sheet_metadata(spreadsheet_id).values()
+                                   if properties.get('sheetId', 0) == sheet_id), {})
+                row_count = properties.get('gridProperties', {}).get('rowCount', 0)
+                row_counts[sheet_id] = (row_count, row_count)
+            before, after = row_counts[sheet_id]
+            row_counts[sheet_id] = (before, after - (dimension_range['endIndex'] - dimension_range['startIndex']))
+        return row_counts
+
+    def __is_update_applied(self, spreadsheet_id: str, row_counts: dict[int, tuple[int, int]]) -> bool:
+        """
+        Check if a batch update that deletes rows was applied by an attempt whose response was lost, from the current
+        row counts of its sheets.
+
+        :param spreadsheet_id: The ID of the Google Sheet.
+        :param row_counts: The row counts before and after the update by sheet ID.
+        :raises Exception: If the row counts are neither those before nor after the update.
+        """
+        self.__check_credentials()
+        self.__count_api_call()
+        spreadsheet = self.__get_spreadsheets().get(spreadsheetId=spreadsheet_id,
+                                                    fields=SHEET_METADATA_FIELDS).execute()
+        current_row_counts = {sheet['properties'].get('sheetId', 0):
+                              sheet['properties'].get('gridProperties', {}).get('rowCount', 0)
+                              for sheet in spreadsheet.get('sheets', [])}
+        if all(current_row_counts.get(sheet_id) == after for sheet_id, (_, after) in row_counts.items()):
+            return True
+        if all(current_row_counts.get(sheet_id) == before for sheet_id, (before, _) in row_counts.items()):
+            return False
+        raise Exception(f"Could not tell if the batch update of {spreadsheet_id} was applied, its row counts "
+                        f"changed unexpectedly")
+
+    def invalidate_sheet_metadata(self, spreadsheet_id: str or None = None) -> None:
+        """
+        Drop the cached sheet properties of a spreadsheet, so they are fetched again the next time they are needed.
+
+        :param spreadsheet_id: The ID of the spreadsheet, or None to drop the cached properties of every spreadsheet.
+        """
+        with self.__sheet_metadata_lock:
+            if spreadsheet_id is None:
+                self.__sheet_metadata.clear()
+            else:
+                self.__sheet_metadata.pop(spreadsheet_id, None)
+
+    def __get_sheet_metadata(self, spreadsheet_id: str) -> dict[str, dict]:
+        """
+        Get the properties of every sheet in a spreadsheet by title, fetching them if they are not cached or have
+        expired.
+
+        :param spreadsheet_id: The ID of the Google Sheet.
+        """
+        with self.__sheet_metadata_lock:
+            cached = self.__sheet_metadata.get(spreadsheet_id)
+        if cached is not None and time.monotonic() - cached[0] < self.__metadata_ttl_seconds:
+            return cached[1]
+
+        fetched_at = time.monotonic()
+        spreadsheet = self.__execute(
+            self.__get_spreadsheets().get(spreadsheetId=spreadsheet_id, fields=SHEET_METADATA_FIELDS).execute,
+            RequestQuotas.SHEETS_READ,
+            f"get the sheets of {spreadsheet_id}"
+        )
+        sheets = {sheet['properties']['title']: sheet['properties'] for sheet in spreadsheet.get('sheets', [])}
+        with self.__sheet_metadata_lock:
+            self.__sheet_metadata[spreadsheet_id] = (fetched_at, sheets)
+        return sheets
+
+    def __update_cached_sheet_metadata(self, spreadsheet_id: str, update_requests: list) -> None:
+        """
+        Keep the cached sheet properties of a spreadsheet in line with a batch update that has been applied. Row and
+        column insertions and deletions adjust the cached grid size, while changes to the sheets themselves drop the
+        spreadsheet's cached properties.
+
+        :param spreadsheet_id: The ID of the Google Sheet.
+        :param update_requests: The batch update requests that were applied.
+        """
+        with self.__sheet_metadata_lock:
+            cached = self.__sheet_metadata.get(spreadsheet_id)
+            if cached is None:
+                return
+
+            sheets_by_id = {properties.get('sheetId', 0): properties for properties in cached[1].values()}
+            for request in update_requests:
+                if any(request_type in request for request_type in SHEET_STRUCTURE_REQUESTS):
+                    del self.__sheet_metadata[spreadsheet_id]
+                    return
+
+                request_type = next((request_type for request_type in DIMENSION_REQUESTS if request_type in request),
+                                    None)
+                if request_type is None:
+                    continue
+
+                dimension_request = request[request_type]
+                dimension_range = dimension_request if request_type == 'appendDimension' else dimension_request['range']
+                properties = sheets_by_id.get(dimension_range.get('sheetId', 0))
+                if properties is None:
+                    del self.__sheet_metadata[spreadsheet_id]
+                    return
+
+                if request_type == 'appendDimension':
+                    change = dimension_request['length']
+                else:
+                    change = dimension_range['endIndex'] - dimension_range['startIndex']
+                    if request_type == 'deleteDimension':
+                        change = -change
+                count_key = 'rowCount' if dimension_range['dimension'] == 'ROWS' else 'columnCount'
+                grid_properties = properties.setdefault('gridProperties', {})
+                grid_properties[count_key] = grid_properties.get(count_key, 0) + change
+
     def get_sheet_gid(self, spreadsheet_id: str, sheet_name: str):
         """
         Get the GID of a sheet within a spreadsheet
@@ -201,16 +587,15 @@ class GoogleService:
         :param sheet_name: The name of the sheet inside the spreadsheet
         """
         try:
-            spreadsheet = self.__sheet_service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-            for sheet in spreadsheet['sheets']:
-                if sheet['properties']['title'] == sheet_name:
-                    return sheet['properties']['sheetId']
-            raise ValueError(f"Sheet with name '{sheet_name}' not found.")
+            sheet_properties = self.__get_sheet_metadata(spreadsheet_id).get(sheet_name)
+            if sheet_properties is None:
+                raise ValueError(f"Sheet with name '{sheet_name}' not found.")
+            return sheet_properties['sheetId']
         except Exception as e:
             logger.error(f"Error getting sheet gid (spreadsheet_id: {spreadsheet_id}, sheet_name: {sheet_name}): {str(e)}")
             raise e
 
-    def __get_sheets_total_rows(self, spreadsheet_id: str, sheet_name: str) -> int:
+    def get_sheet_total_rows(self, spreadsheet_id: str, sheet_name: str) -> int:
         """
         Get the total number of rows within a sheet
 
@@ -218,15 +603,10 @@ class GoogleService:
         :param sheet_name: The name of the sheet inside the spreadsheet
         """
         try:
-            sheet_metadata = self.__sheet_service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-            sheet_properties = next(
-                (sheet for sheet in sheet_metadata.get('sheets', []) if
-                 sheet.get('properties', {}).get('title') == sheet_name),
-                None
-            )
+            sheet_properties = self.__get_sheet_metadata(spreadsheet_id).get(sheet_name)
 
             if sheet_properties:
-                total_rows = sheet_properties.get('properties', {}).get('gridProperties', {}).get('rowCount', 0)
+                total_rows = sheet_properties.get('gridProperties', {}).get('rowCount', 0)
                 return total_rows
             else:
                 logger.info(f'Sheet "{sheet_name}" not found.')
@@ -235,21 +615,60 @@ class GoogleService:
             logger.error(f"Error while getting total sheet rows (spreadsheet_id: {spreadsheet_id}, sheet_name: {sheet_name} {str(e)}")
             raise e
 
-def get_row_from_range(range_name: str):
+def build_service(service_name: str, version: str, http: SessionHttp):
     """
-    Helper function to parse the row from the range string
-    e.g. 'G3' -> 3
+    Helper function to build a Google API client from the discovery document bundled with the client library, rather
+    than one fetched from Google.
 
-    :param range_name: The range to get the row index of
+    :param service_name: The name of the API, e.g. 'drive'.
+    :param version: The version of the API, e.g. 'v3'.
+    :param http: The transport the client sends its requests through.
     """
-    return int(''.join([char for char in range_name if char.isdigit()])) - 1
+    # Imported here as it is only needed once a request is made, and takes a noticeable part of startup
+    from googleapiclient.discovery import build
+
+    return build(service_name, version, http=http, static_discovery=True, cache_discovery=False)
 
-def get_col_from_range(range_name: str):
+def parse_a1_range(range_name: str) -> tuple[str or None, dict]:
+    """
+    Helper function to parse a range in A1 notation into its sheet name and the zero based, end exclusive indexes
+    of a GridRange. Indexes the range leaves open, such as the rows of 'A:B', are left out.
+    e.g. "'Job Data'!B2:AA" -> ('Job Data', {'startRowIndex': 1, 'startColumnIndex': 1, 'endColumnIndex': 27})
+
+    :param range_name: The range to parse
+    """
+    match = A1_RANGE_PATTERN.match(range_name.strip())
+    if match is None or not any(match.group(part) for part in ('start_col', 'start_row', 'end_col', 'end_row')):
+        raise ValueError(f"Invalid A1 range {range_name}")
+
+    sheet_name = match.group('sheet')
+    if sheet_name is not None and sheet_name.startswith("'"):
+        sheet_name = sheet_name[1:-1].replace("''", "'")
+
+    start_col, start_row = match.group('start_col'), match.group('start_row')
+    single_cell = match.group('end_col') is None and match.group('end_row') is None
+    end_col = start_col if single_cell else match.group('end_col')
+    end_row = start_row if single_cell else match.group('end_row')
+
+    grid_range = {}
+    if start_row:
+        grid_range['startRowIndex'] = int(start_row) - 1
+    if end_row:
+        grid_range['endRowIndex'] = int(end_row)
+    if start_col:
+        grid_range['startColumnIndex'] = get_column_index(start_col)
+    if end_col:
+        grid_range['endColumnIndex'] = get_column_index(end_col) + 1
+    return sheet_name, grid_range
+
+def get_column_index(column_letters: str) -> int:
     """
-    Helper function to parse the column from the range string
-    e.g. 'G3' -> G -> 6
+    Helper function to convert column letters to a zero based column index
+    e.g. 'G' -> 6, 'AA' -> 26
 
-    :param range_name: The range to get the col index of
+    :param column_letters: The letters of the column
     """
-    col_letter = ''.join([char for char in range_name if char.isalpha()]).upper()
-    return ord(col_letter) - ord('A')
+    index = 0
+    for letter in column_letters.upper():
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
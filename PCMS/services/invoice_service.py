@@ -1,12 +1,21 @@
 import os
 import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
 
-from PCMS.models.invoice_data import InvoiceData
+from PCMS.exceptions.invoice_exceptions import InvoiceGenerationError
+from PCMS.models.invoice_data import InvoiceData, InvoiceResult, JobData
 from PCMS.services.google_service import GoogleService
+from PCMS.services.template_copy_pool import TemplateCopyPool
 from PCMS.util.file_util import FileUtil
 
 logger = logging.getLogger("pcms")
+FIRST_JOB_DATA_ROW = 14
 LAST_JOB_DATA_ROW = 113
+ROWS_PER_JOB_ITEM = 2
+MAX_JOB_ITEMS_PER_INVOICE = (LAST_JOB_DATA_ROW - FIRST_JOB_DATA_ROW + 1) // ROWS_PER_JOB_ITEM
 
 class InvoiceService:
     def __init__(
@@ -14,56 +23,331 @@ class InvoiceService:
             file_util: FileUtil,
             google_service: GoogleService,
             template_id: str,
-            invoices_dir: str
+            invoices_dir: str,
+            max_workers: int = 4,
+            template_pool: TemplateCopyPool or None = None
 ) -> None:
+        """
+        :param max_workers: The maximum number of invoices generated at the same time. The number of their requests
+                            to Google in flight at once is capped by the GoogleService.
+        :param template_pool: Ready copies of the template invoices start from, or None to copy the template for
+                              every invoice.
+        """
         self.__file_util = file_util
         self.__gs = google_service
         self.__template_id = template_id
         self.__invoices_dir = invoices_dir
+        self.__max_workers = max(max_workers, 1)
+        self.__template_pool = template_pool
 
-    def create_new_invoice(self, invoice_data: InvoiceData):
-        spreadsheet_id = self.__gs.make_copy_of_sheet(self.__template_id, invoice_data.name)
+    def create_new_invoice(self, invoice_data: InvoiceData) -> int:
+        return self.create_new_invoice_from_stream(invoice_data, invoice_data.job_data)
+
+    def create_new_invoices(self, invoices: list[InvoiceData]) -> list[InvoiceResult]:
+        """
+        Create several invoices at the same time, such as one for each customer being billed, so creating them takes
+        about as long as creating the slowest one while their waits on Google overlap.
+
+        Every invoice is attempted even if others fail.
+
+        :param invoices: The invoices to create, each fitting in the invoice template.
+        :return: The result of each invoice, in the same order.
+        """
+        return [result for result, _ in self.__generate_invoices(invoices)]
+
+    def create_chunked_invoices(self, invoice_data: InvoiceData) -> list[InvoiceResult]:
+        """
+        Create as many invoices as needed to fit all the job data into the invoice template, see
+        create_chunked_invoices_from_stream.
+
+        :param invoice_data: The invoice to create. Each additional invoice gets the next invoice number.
+        :return: The result of each invoice, in order.
+        :raises InvoiceGenerationError: If any of the invoices could not be generated.
+        """
+        return self.create_chunked_invoices_from_stream(invoice_data, invoice_data.job_data)
+
+    def create_chunked_invoices_from_stream(
+            self,
+            invoice_data: InvoiceData,
+            job_data: Iterable[JobData]
+    ) -> list[InvoiceResult]:
+        """
+        Create as many invoices as needed to fit the job data into the invoice template while it is consumed from an
+        iterable, e.g. itertools.chain.from_iterable(jobber_service.iter_job_data(stop_on_failure=True)).
+
+        Each invoice is generated on a pool of threads as soon as its MAX_JOB_ITEMS_PER_INVOICE items and the first
+        item of the next invoice have arrived, so invoices are generated while later Jobber PDFs are still being
+        parsed. No more than max_workers full invoices wait to be generated, so memory use does not grow with the
+        number of job items. Job data that fits in one invoice keeps the invoice's name. Otherwise each invoice is
+        numbered in sequence, as the number of invoices is not known until the last item has arrived.
+        e.g. invoice 00069 with 120 job items -> 00069 "Name (1)", 00070 "Name (2)", 00071 "Name (3)"
+
+        If the iterable raises, e.g. because a Jobber PDF could not be parsed, the invoice being filled is never
+        copied from the template. The invoices already started are finished and the error is raised.
+
+        The job data is billed by all of the invoices or none of them. If any invoice could not be generated or the
+        iterable raises, the invoices that were generated are deleted from Drive along with their PDFs before the
+        error is raised, so running again does not create them a second time under the same invoice numbers. An
+        invoice that could not be deleted is logged with its spreadsheet ID so it can be deleted by hand.
+
+        :param invoice_data: The invoice details. Its job_data is ignored in favour of the job_data parameter.
+        :param job_data: The job items to bill.
+        :return: The result of each invoice, in order.
+        :raises InvoiceGenerationError: If any of the invoices could not be generated.
+        """
+        outcomes = []
+        try:
+            self.__generate_chunked_invoices(invoice_data, job_data, outcomes)
+        except Exception as e:
+            self.__delete_generated_invoices([result for result, _ in outcomes])
+            raise e
+
+        if len(outcomes) > 1:
+            job_item_count = sum(result.job_item_count for result, _ in outcomes)
+            logger.info(f"Split {job_item_count} job items into {len(outcomes)} invoices")
+
+        failures = {result.name: error for result, error in outcomes if error is not None}
+        if len(failures) > 0:
+            self.__delete_generated_invoices([result for result, _ in outcomes])
+            raise InvoiceGenerationError(failures)
+
+        return [result for result, _ in outcomes]
+
+    def __generate_chunked_invoices(
+            self,
+            invoice_data: InvoiceData,
+            job_data: Iterable[JobData],
+            outcomes: list[tuple[InvoiceResult, Exception or None]]
+    ) -> None:
+        """
+        Generate the invoices of create_chunked_invoices_from_stream, adding each one's result and the error it
+        failed with to outcomes as it finishes, so the generated invoices are known even if the job data raises.
+        """
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.__max_workers) as executor:
+            try:
+                chunk_job_data = []
+                for data in job_data:
+                    if len(chunk_job_data) == MAX_JOB_ITEMS_PER_INVOICE:
+                        chunk_index = len(outcomes) + len(pending)
+                        invoice_chunk = get_invoice_chunk(invoice_data, chunk_index, chunk_job_data)
+                        pending.append(executor.submit(self.__generate_invoice, invoice_chunk))
+                        chunk_job_data = []
+                        if len(pending) > self.__max_workers:
+                            outcomes.append(pending.popleft().result())
+                    chunk_job_data.append(data)
+
+                chunk_index = len(outcomes) + len(pending)
+                if chunk_index == 0:
+                    invoice_chunk = invoice_data.model_copy(update={'job_data': chunk_job_data})
+                else:
+                    invoice_chunk = get_invoice_chunk(invoice_data, chunk_index, chunk_job_data)
+                pending.append(executor.submit(self.__generate_invoice, invoice_chunk))
+            finally:
+                # Finish the invoices already started, even if the job data could not all be read
+                outcomes.extend(future.result() for future in pending)
+
+    def __delete_generated_invoices(self, results: list[InvoiceResult]) -> None:
+        """
+        Delete the spreadsheets and PDFs of the generated invoices among results, logging any that could not be
+        deleted.
+        """
+        for result in results:
+            if not result.generated:
+                continue
+            logger.warning(f"Deleting invoice {result.name}, as its job data could not all be invoiced")
+            try:
+                self.__gs.delete_file(result.spreadsheet_id)
+            except Exception as e:
+                logger.error(f"Could not delete the spreadsheet {result.spreadsheet_id} of invoice {result.name}, "
+                             f"delete it by hand before running again: {str(e)}")
+            try:
+                os.remove(self.__get_pdf_path(result.name))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"Could not delete the PDF of invoice {result.name}: {str(e)}")
+
+    def __generate_invoices(self, invoices: list[InvoiceData]) -> list[tuple[InvoiceResult, Exception or None]]:
+        """
+        Create invoices on a pool of threads, recording each one's result and the error it failed with.
+
+        :param invoices: The invoices to create.
+        """
+        if len(invoices) == 0:
+            return []
+
+        worker_count = min(self.__max_workers, len(invoices))
+        with ThreadPoolExecutor(max_workers=worker_count) as executor:
+            return list(executor.map(self.__generate_invoice, invoices))
+
+    def __generate_invoice(self, invoice_data: InvoiceData) -> tuple[InvoiceResult, Exception or None]:
+        result = InvoiceResult(name=invoice_data.name, invoice_number=invoice_data.invoice_number)
+        start_time = time.perf_counter()
+        try:
+            result.spreadsheet_id, result.job_item_count = self.__create_invoice(invoice_data, invoice_data.job_data)
+            result.generated = True
+            return result, None
+        except Exception as e:
+            logger.error(f"Error generating invoice {invoice_data.name}: {str(e)}")
+            result.error = str(e)
+            return result, e
+        finally:
+            result.seconds = time.perf_counter() - start_time
+
+    def create_new_invoice_from_stream(self, invoice_data: InvoiceData, job_data: Iterable[JobData]) -> int:
+        """
+        Create an invoice whose job data is consumed from an iterable,
+        e.g. itertools.chain.from_iterable(jobber_service.iter_job_data()).
+
+        The job data is consumed before the template is copied, so a Jobber PDF that fails to parse raises before
+        anything is created in Drive. Each job item's values are added to the column blocks as soon as it arrives,
+        and no more than MAX_JOB_ITEMS_PER_INVOICE items are held. The blocks are written and the unused job data
+        rows deleted in a single batch update, so an invoice costs four API requests: the copy, the sheet lookup,
+        the batch update and the PDF export.
+
+        :param invoice_data: The invoice details. Its job_data is ignored in favour of the job_data parameter.
+        :param job_data: The job items to bill on the invoice.
+        :return: The number of job items written to the invoice.
+        """
+        _, job_item_count = self.__create_invoice(invoice_data, job_data)
+        return job_item_count
+
+    def __create_invoice(self, invoice_data: InvoiceData, job_data: Iterable[JobData]) -> tuple[str, int]:
+        """
+        Create an invoice, see create_new_invoice_from_stream.
+
+        :return: The ID of the invoice's spreadsheet and the number of job items written to it.
+        """
+        job_data_columns = get_job_data_columns(invoice_data.name, job_data)
+        api_call_count = self.__gs.get_api_call_count()
+        spreadsheet_id = self.__template_pool.claim(invoice_data.name) if self.__template_pool is not None else None
+        if spreadsheet_id is None:
+            spreadsheet_id = self.__gs.make_copy_of_sheet(self.__template_id, invoice_data.name)
+        try:
+            job_item_count = self.__fill_invoice(spreadsheet_id, invoice_data, job_data_columns)
+        except Exception as e:
+            # Remove the copy rather than leave a half built invoice in Drive
+            logger.error(f"Error generating invoice {invoice_data.name}, deleting its spreadsheet {spreadsheet_id}: "
+                         f"{str(e)}")
+            try:
+                self.__gs.delete_file(spreadsheet_id)
+            except Exception:
+                logger.warning(f"Could not delete the spreadsheet {spreadsheet_id} of the failed invoice "
+                               f"{invoice_data.name}")
+            raise e
+
+        logger.info(f"Invoice {invoice_data.name} generated with {self.__gs.get_api_call_count() - api_call_count} "
+                    f"Google API requests")
+        return spreadsheet_id, job_item_count
+
+    def __fill_invoice(
+            self,
+            spreadsheet_id: str,
+            invoice_data: InvoiceData,
+            job_data_columns: tuple[list[list], list[list], list[list]]
+    ) -> int:
+        """
+        Write the invoice details and job items into a copy of the template and save it as a PDF.
+
+        :param spreadsheet_id: The ID of the template copy.
+        :param invoice_data: The invoice details.
+        :param job_data_columns: The item ID, address and quantity column blocks from get_job_data_columns.
+        :return: The number of job items written to the invoice.
+        """
         sheet_id = self.__gs.get_sheet_gid(spreadsheet_id, "Invoice")
-        update_requests = [self.__gs.create_write_request(sheet_id, 'G3', invoice_data.invoice_number),
-                           self.__gs.create_write_request(sheet_id, 'G4', invoice_data.invoice_date),
-                           self.__gs.create_write_request(sheet_id, 'G5', invoice_data.invoice_due_date)]
+        update_requests = [self.__gs.create_block_write_request(sheet_id, 'G3', [[invoice_data.invoice_number],
+                                                                                 [invoice_data.invoice_date],
+                                                                                 [invoice_data.invoice_due_date]])]
 
-        # Customer data update requests
+        # Customer data update request
         customer_info = invoice_data.customer_info
-        update_requests.append(self.__gs.create_write_request(sheet_id, 'A7', customer_info.company_name))
-        update_requests.append(self.__gs.create_write_request(sheet_id, 'A8', customer_info.address))
-
         city_province_postal = f"{customer_info.city}, {customer_info.province}, {customer_info.postal_code}"
-        update_requests.append(self.__gs.create_write_request(sheet_id, 'A9', city_province_postal))
+        attention = f"Attention: {customer_info.attention}" if customer_info.attention is not None else ""
+        update_requests.append(self.__gs.create_block_write_request(
+            sheet_id, 'A7', [[customer_info.company_name], [customer_info.address], [city_province_postal], [attention]]
+        ))
 
-        if customer_info.attention is not None:
-            update_requests.append(
-                self.__gs.create_write_request(sheet_id, 'A10', f"Attention: {customer_info.attention}"))
-        else:
-            update_requests.append(
-                self.__gs.create_write_request(sheet_id, 'A10', ""))
+        # Job data update requests, one block per column starting from A14
+        item_ids, addresses, quantities = job_data_columns
+        job_item_count = len(item_ids) // ROWS_PER_JOB_ITEM
+        if job_item_count > 0:
+            update_requests.extend([
+                self.__gs.create_block_write_request(sheet_id, f'A{FIRST_JOB_DATA_ROW}', item_ids),
+                self.__gs.create_block_write_request(sheet_id, f'B{FIRST_JOB_DATA_ROW + 1}', addresses),
+                self.__gs.create_block_write_request(sheet_id, f'E{FIRST_JOB_DATA_ROW}', quantities)
+            ])
 
-        # Job data update requests
-        for index, data in enumerate(invoice_data.job_data):
-            row = 14 + (index * 2)  # Starting from A14 and using 2 rows for each item
-            update_requests.append(self.__gs.create_write_request(sheet_id, f'A{row}', data.item_id))
-            update_requests.append(self.__gs.create_write_request(sheet_id, f'B{row + 1}', data.address))
-            update_requests.append(self.__gs.create_write_request(sheet_id, f'E{row}', data.quantity))
+        # Delete the job data rows after the last item's rows, which are known without reading the sheet back
+        first_empty_row_index = FIRST_JOB_DATA_ROW - 1 + job_item_count * ROWS_PER_JOB_ITEM
+        if first_empty_row_index < LAST_JOB_DATA_ROW <= self.__gs.get_sheet_total_rows(spreadsheet_id, "Invoice"):
+            update_requests.append(
+                self.__gs.create_delete_rows_request(sheet_id, first_empty_row_index, LAST_JOB_DATA_ROW)
+            )
 
         self.__gs.send_batch_requests(spreadsheet_id, update_requests)
-        self.__delete_empty_job_data_rows(spreadsheet_id)
         self.__download_invoice_as_pdf(spreadsheet_id, invoice_data.name)
-
-    def __delete_empty_job_data_rows(self, invoice_sheet_id: str):
-        last_job_data_row_with_data = self.__gs.get_last_row_with_data(invoice_sheet_id, 'Invoice!A:A')
-        self.__gs.delete_rows_in_range(invoice_sheet_id, "Invoice", last_job_data_row_with_data + 1, LAST_JOB_DATA_ROW)
+        return job_item_count
 
     def __download_invoice_as_pdf(self, invoice_sheet_id: str, invoice_name: str):
-        pdf_content = self.__gs.export_sheet_as_pdf(invoice_sheet_id, "Invoice")
+        pdf_path = self.__get_pdf_path(invoice_name)
+        pdf_size = self.__gs.download_sheet_as_pdf(invoice_sheet_id, "Invoice", pdf_path)
+
+        logger.info(f'Invoice PDF saved as: {pdf_path} ({pdf_size} bytes)')
+
+    def __get_pdf_path(self, invoice_name: str) -> str:
         invoice_path = self.__file_util.get_path(self.__invoices_dir)
-        pdf_path = os.path.join(invoice_path, f"{invoice_name}.pdf")
+        return os.path.join(invoice_path, f"{invoice_name}.pdf")
+
+
+def get_job_data_columns(invoice_name: str, job_data: Iterable[JobData]) -> tuple[list[list], list[list], list[list]]:
+    """
+    Consume job data into the item ID, address and quantity column blocks written to an invoice, using 2 rows for
+    each item. The empty rows leave the other row of each item untouched.
+
+    :param invoice_name: The name of the invoice, for the error message.
+    :param job_data: The job items to bill on the invoice.
+    :raises ValueError: If there are more job items than fit in the invoice template.
+    """
+    item_ids, addresses, quantities = [], [], []
+    skipped_rows = [[]] * (ROWS_PER_JOB_ITEM - 1)
+    for index, data in enumerate(job_data):
+        if index >= MAX_JOB_ITEMS_PER_INVOICE:
+            raise ValueError(f"Invoice {invoice_name} has more than {MAX_JOB_ITEMS_PER_INVOICE} job items, "
+                             f"use create_chunked_invoices to split them across invoices")
+        item_ids.extend([[data.item_id], *skipped_rows])
+        addresses.extend([[data.address], *skipped_rows])
+        quantities.extend([[data.quantity], *skipped_rows])
+    return item_ids, addresses, quantities
+
+
+def get_invoice_chunk(invoice_data: InvoiceData, index: int, job_data: list[JobData]) -> InvoiceData:
+    """
+    Get one of the invoices job data is split across when it does not fit in the invoice template, numbered in
+    sequence.
+    e.g. (invoice 00069 "Name", 2) -> invoice 00071 "Name (3)"
+
+    :param invoice_data: The invoice being split.
+    :param index: The position of the invoice among those the job data is split across, from 0.
+    :param job_data: The job items billed on the invoice.
+    """
+    return invoice_data.model_copy(update={
+        'name': f"{invoice_data.name} ({index + 1})",
+        'invoice_number': get_next_invoice_number(invoice_data.invoice_number, index),
+        'job_data': job_data
+    })
+
 
-        with open(pdf_path, 'wb') as f:
-            f.write(pdf_content)
+def get_next_invoice_number(invoice_number: str, offset: int) -> str:
+    """
+    Get the invoice number offset places after the given one, keeping any zero padding.
+    e.g. ('00069', 2) -> '00071'
 
-        logger.info(f'Invoice PDF saved as: {pdf_path}')
+    :param invoice_number: The starting invoice number.
+    :param offset: How many invoice numbers to move forward.
+    """
+    if offset == 0:
+        return invoice_number
+    if not invoice_number.isdigit():
+        return f"{invoice_number}-{offset + 1}"
+    return str(int(invoice_number) + offset).zfill(len(invoice_number))
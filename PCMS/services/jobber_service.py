@@ -1,44 +1,183 @@
 import logging
-from pypdf import PdfReader
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Iterator
+from pypdf import PageObject, PdfReader
 
+from PCMS.exceptions.jobber_exceptions import JobberPdfProcessingError
 from PCMS.models.invoice_data import JobData
-from PCMS.util.jobber_util import ITEM_MAP, valid_job_item
+from PCMS.util.jobber_util import parse_job_item
 from PCMS.util.file_util import FileUtil
+from PCMS.util.job_data_cache import JobDataCache
 
 logger = logging.getLogger("pcms")
 
+PRODUCT_SERVICE_HEADER = "Product/Service Description Qty."
+
 
 class JobberService:
-    def __init__(self, file_util: FileUtil, unprocessed_job_dir_name: str, processed_job_dir_name: str):
+    def __init__(
+            self,
+            file_util: FileUtil,
+            unprocessed_job_dir_name: str,
+            processed_job_dir_name: str,
+            max_workers: int = 1,
+            job_data_cache: JobDataCache or None = None,
+            lazy_extraction: bool = False
+    ):
+        """
+        :param max_workers: The number of processes used to parse Jobber PDFs. 1 parses them one at a time in this
+                            process and 0 uses one process per CPU.
+        :param job_data_cache: The cache used to skip re-parsing unchanged Jobber PDFs, or None to always parse them.
+        :param lazy_extraction: Only extract the text of each PDF up to the end of its Product/Service block.
+                                Experimental: it has only been checked against synthetic PDFs, and finds no address
+                                if the address comes after the item block in the page's content stream.
+        """
         self.__file_util = file_util
         self.__unprocessed_job_dir_name = unprocessed_job_dir_name
         self.__processed_job_dir_name = processed_job_dir_name
+        self.__max_workers = max_workers if max_workers > 0 else os.cpu_count() or 1
+        self.__job_data_cache = job_data_cache
+        self.__lazy_extraction = lazy_extraction
 
     def process_jobber_pdfs(self) -> list or None:
         results = []
 
-        jobber_pdf_paths = self.__file_util.get_file_paths(self.__unprocessed_job_dir_name)
-        if len(jobber_pdf_paths) == 0:
+        if not self.has_jobs_to_process():
             logger.warning(f"NO JOBS FOUND TO BE PROCESSED")
             return None
 
-        for jobber_pdf_path in jobber_pdf_paths:
-            results.extend(get_job_data_from_pdf(jobber_pdf_path))
+        for job_data in self.iter_job_data():
+            results.extend(job_data)
 
         return results
 
+    def has_jobs_to_process(self) -> bool:
+        return len(self.__file_util.get_file_paths(self.__unprocessed_job_dir_name)) > 0
+
+    def iter_job_data(self, stop_on_failure: bool = False) -> Iterator[list[JobData]]:
+        """
+        Yield the job data of each Jobber PDF waiting to be processed, one PDF at a time and in folder listing order.
+
+        Only a small window of PDFs is parsed ahead of the consumer, so memory use does not grow with the number of
+        PDFs and the consumer can start working on the first PDF while the rest are still being parsed. Every PDF is
+        attempted even if others fail.
+
+        :param stop_on_failure: Stop yielding job data once a PDF could not be parsed, so the consumer does not start
+                                work on job data that will not be billed. The remaining PDFs are still parsed so the
+                                error lists every PDF that failed.
+        :raises JobberPdfProcessingError: After the last PDF, if any of the PDFs could not be parsed.
+        """
+        jobber_pdf_paths = self.__file_util.get_file_paths(self.__unprocessed_job_dir_name)
+        if len(jobber_pdf_paths) == 0:
+            return
+
+        worker_count = min(self.__max_workers, len(jobber_pdf_paths))
+        executor = None
+        parse_ahead_count = 1
+        if worker_count > 1:
+            logger.info(f"Processing {len(jobber_pdf_paths)} Jobber PDFs with {worker_count} worker processes")
+            executor = ProcessPoolExecutor(max_workers=worker_count)
+            parse_ahead_count = worker_count * 2
+
+        failures = {}
+        pending = deque()
+        try:
+            for jobber_pdf_path in jobber_pdf_paths:
+                pending.append(self.__start_parsing(jobber_pdf_path, executor))
+                if len(pending) >= parse_ahead_count:
+                    job_data = self.__finish_parsing(*pending.popleft(), failures)
+                    if job_data is not None and (len(failures) == 0 or not stop_on_failure):
+                        yield job_data
+
+            while len(pending) > 0:
+                job_data = self.__finish_parsing(*pending.popleft(), failures)
+                if job_data is not None and (len(failures) == 0 or not stop_on_failure):
+                    yield job_data
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            # Keep whatever was parsed so a failed run does not have to parse those PDFs again
+            if self.__job_data_cache is not None:
+                self.__job_data_cache.save()
+
+        if len(failures) > 0:
+            raise JobberPdfProcessingError(failures)
+
+    def __start_parsing(self, jobber_pdf_path: str, executor: ProcessPoolExecutor or None) -> tuple:
+        """
+        Start getting the job data of a Jobber PDF, from the cache if possible.
+
+        :param jobber_pdf_path: The path of the Jobber PDF.
+        :param executor: The process pool to parse in, or None to parse in this process.
+        :return: The path, cache key and either the job data or the future that will produce it.
+        """
+        cache_key = None
+        if self.__job_data_cache is not None:
+            cache_key = self.__job_data_cache.get_key(jobber_pdf_path, self.__lazy_extraction)
+            cached_job_data = self.__job_data_cache.get(cache_key)
+            if cached_job_data is not None:
+                logger.debug(f"Loaded job data for {jobber_pdf_path} from the cache")
+                return jobber_pdf_path, cache_key, cached_job_data
+
+        if executor is not None:
+            return jobber_pdf_path, cache_key, executor.submit(get_job_data_from_pdf, jobber_pdf_path,
+                                                               self.__lazy_extraction)
+
+        try:
+            return jobber_pdf_path, cache_key, get_job_data_from_pdf(jobber_pdf_path, self.__lazy_extraction)
+        except Exception as e:
+            return jobber_pdf_path, cache_key, e
+
+    def __finish_parsing(
+            self,
+            jobber_pdf_path: str,
+            cache_key: str or None,
+            result: list[JobData] or Future or Exception,
+            failures: dict[str, Exception]
+    ) -> list[JobData] or None:
+        """
+        Wait for the job data started by __start_parsing and cache it.
+
+        :return: The job data of the PDF, or None if it could not be parsed, in which case the error is added to
+                 failures.
+        """
+        try:
+            job_data = result.result() if isinstance(result, Future) else result
+            if isinstance(job_data, Exception):
+                raise job_data
+        except Exception as e:
+            logger.error(f"Error getting job data from pdf {jobber_pdf_path}: {str(e)}")
+            failures[jobber_pdf_path] = e
+            return None
+
+        if cache_key is not None:
+            self.__job_data_cache.put(cache_key, job_data)
+        return job_data
+
     def move_processed_jobs(self) -> None:
         jobber_pdf_paths = self.__file_util.get_file_paths(self.__unprocessed_job_dir_name)
         for jobber_pdf_path in jobber_pdf_paths:
             self.__file_util.move_file(jobber_pdf_path, self.__processed_job_dir_name)
 
 
-def get_job_data_from_pdf(jobber_pdf_path: str) -> list[JobData]:
+def get_job_data_from_pdf(jobber_pdf_path: str, lazy_extraction: bool = False) -> list[JobData]:
+    """
+    Get the job data from the first page of a Jobber work order PDF.
+
+    :param jobber_pdf_path: The path of the Jobber PDF.
+    :param lazy_extraction: Stop extracting text from the page as soon as the Product/Service block has ended instead
+                            of extracting the whole page.
+    """
     try:
         reader = PdfReader(jobber_pdf_path)
         page = reader.get_page(0)
-        text = page.extract_text()
-        lines = text.split("\n")
+        if lazy_extraction:
+            lines = extract_lines_until_end_of_items(page)
+        else:
+            text = page.extract_text()
+            lines = text.split("\n")
 
         address = get_service_address(lines)
         items_and_quantities = get_item_numbers_and_quantities(lines)
@@ -65,6 +204,65 @@ def get_job_data_from_pdf(jobber_pdf_path: str) -> list[JobData]:
         logger.error(f"Error getting job data from pdf {jobber_pdf_path}: {str(e)}")
         raise e
 
+class _ItemBlockEnded(Exception):
+    pass
+
+
+class _ItemBlockLineCollector:
+    """
+    Text visitor for PageObject.extract_text that collects the page's lines and stops the extraction by raising
+    _ItemBlockEnded at the first line after the Product/Service block that is not a job item.
+    """
+    def __init__(self):
+        self.lines = []
+        self.__partial_line = ""
+        self.__in_item_block = False
+
+    def visit_text(self, text: str, *_) -> None:
+        self.__partial_line += text
+        if "\n" not in self.__partial_line:
+            return
+
+        *complete_lines, self.__partial_line = self.__partial_line.split("\n")
+        for line in complete_lines:
+            self.lines.append(line)
+            if self.__in_item_block and not is_job_item(line):
+                raise _ItemBlockEnded()
+            if PRODUCT_SERVICE_HEADER in line:
+                self.__in_item_block = True
+
+    def finish(self) -> list[str]:
+        if self.__partial_line != "":
+            self.lines.append(self.__partial_line)
+            self.__partial_line = ""
+        return self.lines
+
+
+def extract_lines_until_end_of_items(page: PageObject) -> list[str]:
+    """
+    Extract the lines of a page up to and including the first line after the Product/Service block.
+
+    The rest of the page's content stream is not turned into text, which skips the notes, totals and signature
+    sections that follow the items on a work order.
+
+    :param page: The page of the Jobber PDF to extract.
+    """
+    collector = _ItemBlockLineCollector()
+    try:
+        page.extract_text(visitor_text=collector.visit_text)
+    except _ItemBlockEnded:
+        pass
+    return collector.finish()
+
+
+def is_job_item(line: str) -> bool:
+    try:
+        return parse_job_item(line) is not None
+    except Exception:
+        # Unknown items are reported by get_item_numbers_and_quantities
+        return True
+
+
 def get_service_address(page_lines: list[str]):
     start_index = get_address_starting_index(page_lines)
     if start_index is None:
@@ -93,33 +291,14 @@ def get_address_starting_index(page_lines: list[str]) -> int or None:
 
 def get_item_numbers_and_quantities(lines: list[str]) -> list[tuple[str, int]]:
     results = []
-    start_index = get_index_of_text(lines, "Product/Service Description Qty.")
+    start_index = get_index_of_text(lines, PRODUCT_SERVICE_HEADER)
     assert (start_index is not None)
 
     for line in lines[start_index + 1:]:
-        if not valid_job_item(line):
+        item_number_and_quantity = parse_job_item(line)
+        if item_number_and_quantity is None:
             break
-
-        parts = line.split()  # Normalize spaces (removes multiple spaces, ensures single space between parts)
-        # Handle cases like "3 ft" by joining the ft value with the number
-        if parts[1] == "ft":
-            parts[1] = parts[0] + parts[1]  # Join the number and "ft"
-            parts.pop(0)  # Remove the number part (as it's now joined)
-
-        # Rebuild the description from the normalized parts
-        if "ft" in parts[1]:
-            description = " ".join(parts[1:-1]).lower()
-        else:
-            description = " ".join(parts[:-1]).lower()
-        if "support" in description:
-            description = description.replace("support", "straight")
-        quantity = int(parts[-1])
-        item_number = ITEM_MAP.get(description)
-
-        if item_number:
-            results.append((item_number, quantity))
-        else:
-            raise Exception(f"Could not find item number for item with description: {description}")
+        results.append(item_number_and_quantity)
 
     return results
 
@@ -0,0 +1,256 @@
+import csv
+import datetime
+import logging
+import os
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator
+
+from PCMS.models.cc_data import Transaction, TransactionBatch
+from PCMS.util.file_util import FileUtil
+
+logger = logging.getLogger("pcms")
+
+LEDGER_FILE_NAME = "transactions.db"
+MONTHS = {month: index for index, month in
+          enumerate(["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"], start=1)}
+# The year of transactions whose statement period is unknown
+UNKNOWN_YEAR = 0
+
+CREATE_TABLES = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    statement TEXT NOT NULL,
+    date TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    amount_cents INTEGER NOT NULL,
+    occurrence INTEGER NOT NULL,
+    category TEXT,
+    cost_code TEXT,
+    UNIQUE (year, date, description, amount_cents, occurrence)
+);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions (year, month, day);
+CREATE INDEX IF NOT EXISTS transactions_description ON transactions (description);
+CREATE INDEX IF NOT EXISTS transactions_amount ON transactions (amount_cents);
+"""
+
+
+class LedgerService:
+    """
+    SQLite ledger of every credit card transaction processed, so reports can be answered without re-opening the
+    statements or their CSVs.
+
+    A transaction is identified by its year, date, description, amount and how many identical transactions come
+    before it on the same statement. The same purchase showing up on two overlapping statements is stored once, while
+    identical purchases on the same day are all kept. Statement dates have no year, so it is worked out from the
+    closing date of the statement period.
+    """
+    def __init__(self, file_util: FileUtil):
+        self.__ledger_path = os.path.join(file_util.get_root(), LEDGER_FILE_NAME)
+        with self.__connect() as connection:
+            connection.executescript(CREATE_TABLES)
+
+    def add_transactions(self, statement_name: str, transactions: TransactionBatch) -> int:
+        """
+        Add the transactions of a statement to the ledger, skipping any already in it.
+
+        :param statement_name: The name of the statement the transactions are from.
+        :param transactions: The transactions of the statement.
+        :return: The number of transactions added.
+        """
+        closing_date = transactions.closing_date
+        if closing_date is None:
+            logger.warning(f"Could not find the statement period of {statement_name}, its transactions are added to "
+                           f"the ledger without a year")
+
+        occurrences = Counter()
+        rows = []
+        for date, description, amount_cents, category, cost_code in transactions.rows():
+            occurrences[(date, description, amount_cents)] += 1
+            month, day = parse_statement_date(date)
+            rows.append((statement_name, date, get_transaction_year(month, closing_date), month, day, description,
+                         amount_cents, occurrences[(date, description, amount_cents)], category, cost_code))
+
+        try:
+            with self.__connect() as connection:
+                before = connection.total_changes
+                connection.executemany(
+                    "INSERT OR IGNORE INTO transactions "
+                    "(statement, date, year, month, day, description, amount_cents, occurrence, category, cost_code) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                added = connection.total_changes - before
+            logger.info(f"Added {added} of {len(rows)} transactions from {statement_name} to the ledger")
+            return added
+        except Exception as e:
+            logger.error(f"Error adding transactions from {statement_name} to the ledger: {str(e)}")
+            raise e
+
+    def find_transactions(
+            self,
+            description: str or None = None,
+            min_amount: float or None = None,
+            max_amount: float or None = None,
+            month: int or None = None,
+            year: int or None = None,
+            start_date: datetime.date or None = None,
+            end_date: datetime.date or None = None
+    ) -> list[Transaction]:
+        """
+        Find the transactions matching all the given filters, in date order.
+
+        :param description: Text the description must contain, ignoring case.
+        :param min_amount: The smallest amount to include.
+        :param max_amount: The largest amount to include.
+        :param month: The month number (1-12) to include.
+        :param year: The year to include.
+        :param start_date: The first day to include.
+        :param end_date: The last day to include.
+        """
+        where, parameters = build_filters(description, min_amount, max_amount, month, year, start_date, end_date)
+        with self.__connect() as connection:
+            rows = connection.execute(
+                f"SELECT date, description, amount_cents, category, cost_code FROM transactions {where} "
+                f"ORDER BY year, month, day, id",
+                parameters
+            ).fetchall()
+        return [Transaction(date=date, description=desc, amount=cents / 100, category=category, cost_code=cost_code)
+                for date, desc, cents, category, cost_code in rows]
+
+    def get_total_spent(
+            self,
+            description: str or None = None,
+            month: int or None = None,
+            year: int or None = None,
+            start_date: datetime.date or None = None,
+            end_date: datetime.date or None = None
+    ) -> float:
+        """
+        Get the total amount spent, optionally only at merchants whose description contains the given text.
+        e.g. get_total_spent("HOME DEPOT", year=2025) is the total spent at Home Depot in 2025
+
+        :param description: Text the description must contain, ignoring case.
+        :param month: The month number (1-12) to include.
+        :param year: The year to include.
+        :param start_date: The first day to include.
+        :param end_date: The last day to include.
+        """
+        where, parameters = build_filters(description, None, None, month, year, start_date, end_date)
+        with self.__connect() as connection:
+            total_cents = connection.execute(
+                f"SELECT COALESCE(SUM(amount_cents), 0) FROM transactions {where}", parameters
+            ).fetchone()[0]
+        return total_cents / 100
+
+    def get_spending_rows(self) -> list[tuple[str, int, int, str, int]]:
+        """
+        Get every transaction in date order for aggregating, without building a model per transaction.
+
+        :return: The statement, year, month, description and amount in cents of each transaction.
+        """
+        with self.__connect() as connection:
+            return connection.execute(
+                "SELECT statement, year, month, description, amount_cents FROM transactions "
+                "ORDER BY year, month, day, id"
+            ).fetchall()
+
+    def export_to_csv(self, csv_file_path: str, **filters) -> int:
+        """
+        Export the transactions matching the filters of find_transactions to an unpadded CSV.
+
+        :param csv_file_path: The path of the CSV to write.
+        :return: The number of transactions exported.
+        """
+        transactions = self.find_transactions(**filters)
+        with open(csv_file_path, mode='w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["Date", "Transaction", "Amount", "Category", "Cost Code"])
+            for transaction in transactions:
+                writer.writerow([transaction.date, transaction.description, f"{transaction.amount:.2f}",
+                                 transaction.category or "", transaction.cost_code or ""])
+
+        logger.info(f"Exported {len(transactions)} ledger transactions to {csv_file_path}")
+        return len(transactions)
+
+    @contextmanager
+    def __connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Open a connection to the ledger that commits on success, rolls back on error and is always closed.
+        """
+        connection = sqlite3.connect(self.__ledger_path)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+
+def build_filters(
+        description: str or None,
+        min_amount: float or None,
+        max_amount: float or None,
+        month: int or None,
+        year: int or None = None,
+        start_date: datetime.date or None = None,
+        end_date: datetime.date or None = None
+) -> tuple[str, list]:
+    conditions, parameters = [], []
+    if description is not None:
+        conditions.append("description LIKE ?")
+        parameters.append(f"%{description}%")
+    if min_amount is not None:
+        conditions.append("amount_cents >= ?")
+        parameters.append(to_cents(min_amount))
+    if max_amount is not None:
+        conditions.append("amount_cents <= ?")
+        parameters.append(to_cents(max_amount))
+    if month is not None:
+        conditions.append("month = ?")
+        parameters.append(month)
+    if year is not None:
+        conditions.append("year = ?")
+        parameters.append(year)
+    if start_date is not None:
+        conditions.append("(year, month, day) >= (?, ?, ?)")
+        parameters.extend([start_date.year, start_date.month, start_date.day])
+    if end_date is not None:
+        conditions.append("(year, month, day) <= (?, ?, ?)")
+        parameters.extend([end_date.year, end_date.month, end_date.day])
+
+    where = f"WHERE {' AND '.join(conditions)}" if len(conditions) > 0 else ""
+    return where, parameters
+
+
+def to_cents(amount: float) -> int:
+    return round(amount * 100)
+
+
+def get_transaction_year(month: int, closing_date: datetime.date or None) -> int:
+    """
+    Get the year of a transaction from its month and the closing date of its statement. A statement period ends
+    after all its transactions, so a month after the closing month is in the year before.
+    e.g. (12, date(2024, 1, 14)) -> 2023
+
+    :param month: The month number of the transaction, 0 if unknown.
+    :param closing_date: The last day of the statement period, or None if it is unknown.
+    :return: The year, or UNKNOWN_YEAR if the closing date is unknown.
+    """
+    if closing_date is None:
+        return UNKNOWN_YEAR
+    return closing_date.year - 1 if month > closing_date.month else closing_date.year
+
+
+def parse_statement_date(date: str) -> tuple[int, int]:
+    """
+    Parse a statement date into its month and day numbers.
+    e.g. 'Jan 03' -> (1, 3)
+
+    :param date: The date as it appears on the statement.
+    """
+    month, day = date.split()
+    return MONTHS.get(month[:3].upper(), 0), int(day)
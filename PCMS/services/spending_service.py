@@ -0,0 +1,117 @@
+import calendar
+import csv
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from PCMS.services.cc_service import DEFAULT_TRANSACTION_RULES, get_transaction_batch
+from PCMS.services.ledger_service import LedgerService
+from PCMS.util.file_util import FileUtil
+from PCMS.util.folder_names import FolderNames
+from PCMS.util.spending_aggregator import (TransactionColumns, GroupTotal, top_merchants, total_by_month,
+                                           total_by_statement)
+from PCMS.util.transaction_rules import TransactionRules
+
+logger = logging.getLogger("pcms")
+
+SPENDING_REPORT_FILE_NAME = "Spending Report.csv"
+
+
+class SpendingService:
+    def __init__(
+            self,
+            file_util: FileUtil,
+            max_workers: int = 1,
+            ledger_service: LedgerService or None = None,
+            rules: TransactionRules = DEFAULT_TRANSACTION_RULES,
+            top_merchant_count: int = 10
+    ):
+        """
+        :param max_workers: The number of processes used to parse statements when there is no ledger. 1 parses them
+                            one at a time in this process and 0 uses one process per CPU.
+        :param ledger_service: The ledger the report is read from, or None to parse the processed statements.
+        :param rules: The rules excluding transactions from the totals when parsing the processed statements.
+        :param top_merchant_count: The number of merchants listed in the report.
+        """
+        self.__file_util = file_util
+        self.__ledger_service = ledger_service
+        self.__max_workers = max_workers if max_workers > 0 else os.cpu_count() or 1
+        self.__rules = rules
+        self.__top_merchant_count = top_merchant_count
+
+    def load_processed_transactions(self) -> TransactionColumns:
+        """
+        Load every processed credit card transaction into one set of transaction columns, from the ledger if there is
+        one. Otherwise every processed statement is parsed, skipping the transactions repeated by statements with
+        overlapping dates as the ledger does.
+        """
+        columns = TransactionColumns()
+        if self.__ledger_service is not None:
+            columns.add_rows(self.__ledger_service.get_spending_rows())
+            logger.info(f"Loaded {len(columns)} transactions from the ledger")
+            return columns
+
+        statement_paths = self.__file_util.get_file_paths(FolderNames.PROCESSED_CC_STATEMENTS_FOLDER_NAME)
+        worker_count = min(self.__max_workers, len(statement_paths))
+        if worker_count > 1:
+            with ProcessPoolExecutor(max_workers=worker_count) as executor:
+                statement_transactions = executor.map(
+                    get_transaction_batch, statement_paths, [self.__rules] * len(statement_paths)
+                )
+                for statement_path, transactions in zip(statement_paths, statement_transactions):
+                    columns.add_statement(self.__file_util.get_file_name(statement_path), transactions)
+        else:
+            for statement_path in statement_paths:
+                columns.add_statement(self.__file_util.get_file_name(statement_path),
+                                      get_transaction_batch(statement_path, self.__rules))
+
+        logger.info(f"Loaded {len(columns)} transactions from {len(statement_paths)} processed credit card statements")
+        return columns
+
+    def create_spending_report(self) -> int:
+        """
+        Write the totals of every processed credit card transaction by merchant, month and statement to the spending
+        report in the generated CSVs folder. Each statement is for a single card, so the statement totals are the
+        totals per card and billing period. A transaction on two overlapping statements counts towards the first one
+        processed.
+
+        :return: The number of transactions in the report.
+        """
+        try:
+            columns = self.load_processed_transactions()
+            sections: list[tuple[str, list[GroupTotal]]] = [
+                ("Top Merchants", top_merchants(columns, self.__top_merchant_count)),
+                ("Month", [GroupTotal(get_month_name(*group.key), group.count, group.total)
+                           for group in total_by_month(columns)]),
+                ("Statement", total_by_statement(columns))
+            ]
+
+            self.__file_util.create_folder(FolderNames.GENERATED_CSV_FOLDER_NAME)
+            report_path = os.path.join(self.__file_util.get_path(FolderNames.GENERATED_CSV_FOLDER_NAME),
+                                       SPENDING_REPORT_FILE_NAME)
+            temp_file_path = f"{report_path}.tmp"
+            with open(temp_file_path, mode='w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(["Group", "Name", "Transactions", "Total"])
+                for group_name, group_totals in sections:
+                    for group in group_totals:
+                        writer.writerow([group_name, group.key, group.count, f"{group.total:.2f}"])
+            os.replace(temp_file_path, report_path)
+
+            logger.info(f"Wrote the spending report of {len(columns)} transactions to {report_path}")
+            return len(columns)
+        except Exception as e:
+            logger.error(f"Error creating the spending report: {str(e)}")
+            raise e
+
+
+def get_month_name(year: int, month: int) -> str:
+    """
+    Get the name of a month in the report.
+    e.g. (2024, 1) -> 'Jan 2024'
+
+    :param year: The year, 0 if unknown.
+    :param month: The month number, 0 if unknown.
+    """
+    month_name = calendar.month_abbr[month] if month > 0 else "Unknown"
+    return f"{month_name} {year}" if year > 0 else month_name
@@ -0,0 +1,149 @@
+import logging
+import threading
+from collections import deque
+
+from PCMS.services.google_service import GoogleService
+
+logger = logging.getLogger("pcms")
+
+# Drive app property tagging the copies waiting in a pool with the template they were copied from, so copies left
+# behind by a session that ended without closing its pool can be found and deleted
+TEMPLATE_POOL_PROPERTY = 'pcmsTemplatePool'
+POOL_COPY_NAME = "PCMS Template Copy"
+
+
+class TemplateCopyPool:
+    """
+    Keeps copies of the invoice template made ahead of time, so an invoice can start from a ready copy rather than
+    waiting on Drive to copy the template. A background thread makes a new copy whenever one is claimed.
+
+    A copy is only handed out if the template has not been modified since it was copied, and copies of an older
+    version of the template are deleted. Copies still waiting when the pool is closed are deleted, as are any left
+    behind by an earlier session when it starts, so only one PCMS should run against a template at a time.
+    """
+    def __init__(self, google_service: GoogleService, template_id: str, size: int, retry_seconds: float = 30):
+        """
+        :param google_service: The GoogleService the copies are made and claimed through.
+        :param template_id: The ID of the template spreadsheet.
+        :param size: The number of copies kept ready.
+        :param retry_seconds: How long to wait before making a copy again after failing to make one.
+        """
+        self.__gs = google_service
+        self.__template_id = template_id
+        self.__size = size
+        self.__retry_seconds = retry_seconds
+        # (Copy ID, template modified time when copied), oldest first
+        self.__copies: deque[tuple[str, str]] = deque()
+        self.__condition = threading.Condition()
+        self.__closed = threading.Event()
+        self.__thread: threading.Thread or None = None
+
+    def start(self) -> None:
+        """
+        Delete the copies left behind by an earlier session and start filling the pool in the background.
+        """
+        if self.__thread is not None:
+            return
+        self.__thread = threading.Thread(target=self.__run, name="template-copy-pool", daemon=True)
+        self.__thread.start()
+
+    def get_ready_count(self) -> int:
+        with self.__condition:
+            return len(self.__copies)
+
+    def claim(self, new_name: str) -> str or None:
+        """
+        Take a ready copy of the template and rename it.
+
+        :param new_name: The name of the claimed copy.
+        :return: The ID of the copy, or None if no copy of the current template is ready and one has to be made.
+        """
+        with self.__condition:
+            if len(self.__copies) == 0:
+                return None
+            copy_id, copied_modified_time = self.__copies.popleft()
+            self.__condition.notify_all()
+
+        try:
+            modified_time = self.__gs.get_file_modified_time(self.__template_id)
+            if modified_time != copied_modified_time:
+                logger.info(f"The template {self.__template_id} was modified, discarding its older copies")
+                self.__delete_copies([copy_id] + self.__remove_stale_copies(modified_time))
+                return None
+
+            # Untagged, so the copy is no longer cleaned up with the pool
+            self.__gs.rename_file(copy_id, new_name, {TEMPLATE_POOL_PROPERTY: None})
+            logger.info(f"Claimed template copy {copy_id} for {new_name}")
+            return copy_id
+        except Exception as e:
+            logger.warning(f"Could not claim template copy {copy_id} for {new_name}: {str(e)}")
+            self.__delete_copies([copy_id])
+            return None
+
+    def close(self) -> None:
+        """
+        Stop filling the pool and delete the copies that were not claimed.
+        """
+        self.__closed.set()
+        with self.__condition:
+            self.__condition.notify_all()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+        with self.__condition:
+            copy_ids = [copy_id for copy_id, _ in self.__copies]
+            self.__copies.clear()
+        self.__delete_copies(copy_ids)
+
+    def __run(self) -> None:
+        try:
+            self.__delete_copies(self.__gs.find_files_with_app_property(TEMPLATE_POOL_PROPERTY, self.__template_id))
+        except Exception as e:
+            logger.warning(f"Could not clean up the template copies of an earlier session: {str(e)}")
+
+        while True:
+            with self.__condition:
+                while len(self.__copies) >= self.__size and not self.__closed.is_set():
+                    self.__condition.wait()
+            if self.__closed.is_set():
+                return
+
+            try:
+                # Fetched before copying, so a template modified during the copy makes the copy stale rather than
+                # passing off an old copy as current
+                modified_time = self.__gs.get_file_modified_time(self.__template_id)
+                self.__delete_copies(self.__remove_stale_copies(modified_time))
+                copy_id = self.__gs.make_copy_of_sheet(self.__template_id, POOL_COPY_NAME,
+                                                       {TEMPLATE_POOL_PROPERTY: self.__template_id})
+            except Exception as e:
+                logger.warning(f"Could not add a copy of the template {self.__template_id} to the pool, retrying in "
+                               f"{self.__retry_seconds}s: {str(e)}")
+                self.__closed.wait(self.__retry_seconds)
+                continue
+
+            with self.__condition:
+                if not self.__closed.is_set():
+                    self.__copies.append((copy_id, modified_time))
+                    continue
+            self.__delete_copies([copy_id])
+            return
+
+    def __remove_stale_copies(self, modified_time: str) -> list[str]:
+        """
+        Remove the copies of a template older than its current modified time from the pool.
+
+        :return: The IDs of the removed copies.
+        """
+        with self.__condition:
+            stale_copy_ids = [copy_id for copy_id, copied_modified_time in self.__copies
+                              if copied_modified_time != modified_time]
+            self.__copies = deque(copy for copy in self.__copies if copy[1] == modified_time)
+        return stale_copy_ids
+
+    def __delete_copies(self, copy_ids: list[str]) -> None:
+        for copy_id in copy_ids:
+            try:
+                self.__gs.delete_file(copy_id)
+            except Exception:
+                logger.warning(f"Could not delete the template copy {copy_id}")
@@ -15,6 +15,21 @@ class ConfigKeys:
     BILLED_COMPANY_POSTAL_CODE = 'billed_company_postal_code'
     BILLED_COMPANY_ATTENTION = 'billed_company_attention'
     DEBUG_LOGGING = 'debug_logging'
+    JOBBER_PDF_WORKERS = 'jobber_pdf_workers'
+    JOB_DATA_CACHE_SIZE = 'job_data_cache_size'
+    JOBBER_LAZY_EXTRACTION = 'jobber_lazy_extraction'
+    INVOICE_WORKERS = 'invoice_workers'
+    CC_STATEMENT_WORKERS = 'cc_statement_workers'
+    TRANSACTION_LEDGER = 'transaction_ledger'
+    CC_OUTPUT_FORMAT = 'cc_output_format'
+    SPENDING_REPORT_TOP_MERCHANTS = 'spending_report_top_merchants'
+    SHEET_METADATA_CACHE_SECONDS = 'sheet_metadata_cache_seconds'
+    HTTP_POOL_SIZE = 'http_pool_size'
+    HTTP_TIMEOUT_SECONDS = 'http_timeout_seconds'
+    SHEETS_REQUESTS_PER_MINUTE = 'sheets_requests_per_minute'
+    GOOGLE_MAX_RETRIES = 'google_max_retries'
+    GOOGLE_MAX_IN_FLIGHT_REQUESTS = 'google_max_in_flight_requests'
+    TEMPLATE_POOL_SIZE = 'template_pool_size'
 
 
 DEFAULT_SECTION = 'Default'
@@ -28,7 +43,22 @@ DEFAULT_CONFIG = {
     ConfigKeys.BILLED_COMPANY_PROVINCE: '',
     ConfigKeys.BILLED_COMPANY_POSTAL_CODE: '',
     ConfigKeys.BILLED_COMPANY_ATTENTION: '',
-    ConfigKeys.DEBUG_LOGGING: False
+    ConfigKeys.DEBUG_LOGGING: False,
+    ConfigKeys.JOBBER_PDF_WORKERS: 1,
+    ConfigKeys.JOB_DATA_CACHE_SIZE: 1000,
+    ConfigKeys.JOBBER_LAZY_EXTRACTION: False,
+    ConfigKeys.INVOICE_WORKERS: 4,
+    ConfigKeys.CC_STATEMENT_WORKERS: 1,
+    ConfigKeys.TRANSACTION_LEDGER: True,
+    ConfigKeys.CC_OUTPUT_FORMAT: 'padded_csv',
+    ConfigKeys.SPENDING_REPORT_TOP_MERCHANTS: 10,
+    ConfigKeys.SHEET_METADATA_CACHE_SECONDS: 300,
+    ConfigKeys.HTTP_POOL_SIZE: 10,
+    ConfigKeys.HTTP_TIMEOUT_SECONDS: 60,
+    ConfigKeys.SHEETS_REQUESTS_PER_MINUTE: 60,
+    ConfigKeys.GOOGLE_MAX_RETRIES: 5,
+    ConfigKeys.GOOGLE_MAX_IN_FLIGHT_REQUESTS: 8,
+    ConfigKeys.TEMPLATE_POOL_SIZE: 0
 }
 
 logger = logging.getLogger("pcms")
@@ -80,3 +110,10 @@ class Config:
         except ValueError:
             # If it can't be interpreted as a boolean, return as a string
             return self.config.get(DEFAULT_SECTION, value)
+
+    def get_int_value(self, value: str) -> int:
+        try:
+            return self.config.getint(DEFAULT_SECTION, value)
+        except ValueError:
+            logger.warning(f"Config option {value} is not a whole number, using default {DEFAULT_CONFIG[value]}")
+            return int(DEFAULT_CONFIG[value])
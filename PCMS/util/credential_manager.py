@@ -0,0 +1,198 @@
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+import requests
+from google.auth.exceptions import RefreshError
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+
+from PCMS.exceptions.google_exceptions import GoogleAuthenticationError
+from PCMS.util.file_util import FileUtil
+
+logger = logging.getLogger("pcms")
+
+SCOPES = ['https://www.googleapis.com/auth/drive', 'https://www.googleapis.com/auth/spreadsheets']
+# Stores the user's access and refresh tokens, created when the authorization flow completes for the first time
+TOKEN_FILE_NAME = "token.json"
+
+
+class CredentialManager:
+    """
+    Holds the OAuth credentials Google API requests are authorized with, and refreshes them on a background thread
+    before they expire so requests never wait on a refresh.
+
+    Every refreshed token is saved to token.json, replacing it atomically so a crash never leaves a corrupt token
+    behind. A failed background refresh is logged and retried. If the credentials expire before a refresh
+    succeeds, get_credentials refreshes them itself and raises a GoogleAuthenticationError if it cannot.
+
+    If Google revokes the refresh token, the credentials can never be refreshed again, so they are dropped along
+    with token.json and the background refresh stops. The next get_credentials call authorizes PCMS again through
+    the browser flow.
+    """
+    def __init__(
+            self,
+            file_util: FileUtil,
+            credentials_file_name: str,
+            refresh_margin_seconds: float = 300,
+            retry_seconds: float = 30,
+            transport: requests.Session or None = None
+    ):
+        """
+        :param credentials_file_name: The OAuth client secrets file the browser flow authorizes PCMS with when there
+                                      is no saved token.
+        :param refresh_margin_seconds: How long before the access token expires it is refreshed.
+        :param retry_seconds: How long to wait before retrying a failed background refresh.
+        :param transport: The session token refreshes are sent with, by default a new one.
+        """
+        self.__file_util = file_util
+        self.__credentials_file_name = credentials_file_name
+        self.__refresh_margin_seconds = refresh_margin_seconds
+        self.__retry_seconds = retry_seconds
+        self.__request = Request(transport or requests.Session())
+        self.__credentials: Credentials or None = None
+        self.__refresh_error: Exception or None = None
+        self.__lock = threading.Lock()
+        self.__closed = threading.Event()
+        self.__thread: threading.Thread or None = None
+
+    def get_credentials(self) -> Credentials:
+        """
+        Get credentials with an access token that has not expired, loading them the first time they are needed.
+
+        Loading uses the token saved in token.json, refreshing it if it has expired, and falls back to the browser
+        flow if there is no saved token or it has been revoked.
+
+        :raises GoogleAuthenticationError: If there are no valid credentials and they could not be loaded or
+                                           refreshed.
+        """
+        credentials = self.__credentials
+        if credentials is not None and credentials.valid:
+            return credentials
+
+        with self.__lock:
+            if self.__credentials is None:
+                self.__credentials = self.__load_credentials()
+                self.__thread = threading.Thread(target=self.__run, args=(self.__credentials,),
+                                                 name="oauth-token-refresh", daemon=True)
+                self.__thread.start()
+            elif not self.__credentials.valid:
+                # The background refresh fell behind, e.g. the computer was asleep, or has been failing
+                logger.warning("The OAuth access token expired before it was refreshed in the background")
+                self.__refresh_credentials()
+            return self.__credentials
+
+    def close(self) -> None:
+        """
+        Stop refreshing the credentials in the background.
+        """
+        self.__closed.set()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def __run(self, credentials: Credentials) -> None:
+        """
+        Refresh the credentials in the background until they are closed or dropped after their refresh token was
+        revoked.
+        """
+        while self.__credentials is credentials and not self.__closed.wait(
+                self.__get_seconds_until_refresh(credentials)):
+            with self.__lock:
+                if self.__credentials is not credentials:
+                    break
+                try:
+                    self.__refresh_credentials()
+                except GoogleAuthenticationError:
+                    # Already logged, and retried after retry_seconds unless the refresh token was revoked
+                    pass
+
+    def __get_seconds_until_refresh(self, credentials: Credentials) -> float or None:
+        """
+        Get how long to wait before the next background refresh, or None if the credentials never expire.
+        """
+        expiry = credentials.expiry
+        if expiry is None:
+            return None
+        if self.__refresh_error is not None:
+            return self.__retry_seconds
+        # google-auth keeps the expiry as a naive UTC datetime
+        seconds_until_expiry = (expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+        return max(0.0, seconds_until_expiry - self.__refresh_margin_seconds)
+
+    def __refresh_credentials(self) -> None:
+        """
+        Refresh the access token and save it. Must be called holding the lock.
+        """
+        try:
+            self.__credentials.refresh(self.__request)
+            self.__save_credentials(self.__credentials)
+            self.__refresh_error = None
+            logger.info(f"Refreshed the OAuth access token, which now expires at {self.__credentials.expiry} UTC")
+        except Exception as e:
+            if is_refresh_token_revoked(e):
+                logger.error(f"The OAuth refresh token was revoked, PCMS must be authorized with Google again. "
+                             f"The browser will open to sign in the next time Google is used: {str(e)}")
+                self.__credentials = None
+                self.__refresh_error = None
+                self.__delete_saved_credentials()
+                raise GoogleAuthenticationError(
+                    f"Google access was revoked, try again to authorize PCMS with Google: {str(e)}") from e
+            self.__refresh_error = e
+            logger.error(f"Error while refreshing the OAuth access token: {str(e)}")
+            raise GoogleAuthenticationError(f"Could not refresh the OAuth access token: {str(e)}") from e
+
+    def __load_credentials(self) -> Credentials:
+        try:
+            credentials = None
+            if self.__file_util.file_exists(TOKEN_FILE_NAME):
+                token_file_path = self.__file_util.get_path(TOKEN_FILE_NAME)
+                credentials = Credentials.from_authorized_user_file(token_file_path, SCOPES)
+            if credentials is not None and credentials.valid:
+                return credentials
+
+            if credentials is not None and credentials.refresh_token:
+                try:
+                    credentials.refresh(self.__request)
+                except RefreshError as e:
+                    logger.warning(f"Could not refresh the saved OAuth token, authorizing again: {str(e)}")
+                    credentials = self.__run_authorization_flow()
+            else:
+                credentials = self.__run_authorization_flow()
+            self.__save_credentials(credentials)
+            return credentials
+        except Exception as e:
+            logger.error(f"Error while authenticating with OAuth: {str(e)}")
+            raise GoogleAuthenticationError(f"Could not authenticate with Google: {str(e)}") from e
+
+    def __run_authorization_flow(self) -> Credentials:
+        # Imported here as the browser flow is rarely needed once a token has been saved
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        creds_file_path = self.__file_util.get_path(self.__credentials_file_name)
+        flow = InstalledAppFlow.from_client_secrets_file(creds_file_path, SCOPES)
+        return flow.run_local_server(port=0)
+
+    def __save_credentials(self, credentials: Credentials) -> None:
+        token_file_path = os.path.join(self.__file_util.get_root(), TOKEN_FILE_NAME)
+        temp_file_path = f"{token_file_path}.tmp"
+        with open(temp_file_path, 'w') as token:
+            token.write(credentials.to_json())
+        os.replace(temp_file_path, token_file_path)
+
+    def __delete_saved_credentials(self) -> None:
+        token_file_path = os.path.join(self.__file_util.get_root(), TOKEN_FILE_NAME)
+        try:
+            os.remove(token_file_path)
+        except FileNotFoundError:
+            pass
+
+
+def is_refresh_token_revoked(error: Exception) -> bool:
+    """
+    Check whether a refresh failed because Google no longer accepts the refresh token, e.g. it expired or access
+    was removed from the Google account, rather than for a reason a retry could fix.
+    """
+    # google-auth puts the OAuth error code, e.g. "invalid_grant: Token has been expired or revoked.", in the message
+    return isinstance(error, RefreshError) and 'invalid_grant' in str(error)
@@ -0,0 +1,55 @@
+import httplib2
+import requests
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+
+# Requests without a timeout can hang an invoice thread forever
+CONNECT_TIMEOUT_SECONDS = 10
+DEFAULT_READ_TIMEOUT_SECONDS = 60
+# Headers describing the encoded body, which requests has already decoded by the time it is handed back
+DECODED_BODY_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+
+def create_authorized_session(credentials, pool_size: int = 10) -> AuthorizedSession:
+    """
+    Create a session that authorizes every request with the credentials and keeps up to pool_size connections per
+    host alive, so requests reuse open TLS connections instead of each making a new one.
+
+    :param credentials: The Google credentials authorizing the requests.
+    :param pool_size: The number of connections kept open to each host, at least the number of threads sharing the
+                      session so none of them have to wait for a connection.
+    """
+    session = AuthorizedSession(credentials)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class SessionHttp:
+    """
+    Adapts a requests session to the httplib2.Http interface googleapiclient sends its requests through, so the
+    Google API services share the session's connection pool. Unlike httplib2.Http, it is safe to use from several
+    threads at once.
+    """
+    def __init__(self, session: requests.Session, timeout=(CONNECT_TIMEOUT_SECONDS, DEFAULT_READ_TIMEOUT_SECONDS)):
+        """
+        :param session: The session requests are sent with.
+        :param timeout: The timeout of each request in seconds, or a (connect, read) tuple.
+        """
+        self.session = session
+        self.timeout = timeout
+
+    def request(self, uri: str, method: str = "GET", body=None, headers: dict or None = None, redirections: int = 5,
+                connection_type=None) -> tuple[httplib2.Response, bytes]:
+        response = self.session.request(method, uri, data=body, headers=headers, timeout=self.timeout,
+                                        allow_redirects=redirections > 0)
+        response_headers = {key.lower(): value for key, value in response.headers.items()
+                            if key.lower() not in DECODED_BODY_HEADERS}
+        response_headers['status'] = str(response.status_code)
+        http_response = httplib2.Response(response_headers)
+        http_response.reason = response.reason
+        return http_response, response.content
+
+    def close(self) -> None:
+        self.session.close()
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+
+from PCMS.models.invoice_data import JobData
+from PCMS.util.file_util import FileUtil
+from PCMS.util.jobber_util import ITEM_MAP, JOBBER_PARSER_VERSION
+
+logger = logging.getLogger("pcms")
+
+JOB_DATA_CACHE_FILE_NAME = "job_data_cache.json"
+
+
+class JobDataCache:
+    """
+    Persistent cache of the job data parsed out of Jobber PDFs, keyed by the PDF's content hash, parser version and
+    text extraction mode.
+
+    Entries are evicted least recently used first once the cache holds more than max_entries PDFs. The whole cache is
+    discarded when it was written by a different parser version or with a different ITEM_MAP.
+    """
+    def __init__(self, file_util: FileUtil, max_entries: int):
+        self.__cache_path = os.path.join(file_util.get_root(), JOB_DATA_CACHE_FILE_NAME)
+        self.__max_entries = max_entries
+        self.__item_map_hash = get_item_map_hash()
+        self.__entries: OrderedDict[str, list[dict]] = OrderedDict()
+        self.__load()
+
+    @staticmethod
+    def get_key(jobber_pdf_path: str, lazy_extraction: bool) -> str:
+        """
+        Get the cache key of a Jobber PDF from its content, the current parser version and the text extraction mode,
+        as the two modes can produce different job data from the same PDF.
+
+        :param jobber_pdf_path: The path of the Jobber PDF.
+        :param lazy_extraction: If the PDF's text is extracted only up to the end of its Product/Service block.
+        """
+        with open(jobber_pdf_path, 'rb') as f:
+            content_hash = hashlib.file_digest(f, "sha256").hexdigest()
+        extraction_mode = "lazy" if lazy_extraction else "full"
+        return f"{JOBBER_PARSER_VERSION}:{extraction_mode}:{content_hash}"
+
+    def get(self, key: str) -> list[JobData] or None:
+        """
+        Get the cached job data for a key, marking it as recently used.
+
+        :param key: The cache key returned by get_key.
+        :return: The cached job data or None if the key is not cached.
+        """
+        job_data = self.__entries.get(key)
+        if job_data is None:
+            return None
+
+        self.__entries.move_to_end(key)
+        return [JobData(**data) for data in job_data]
+
+    def put(self, key: str, job_data: list[JobData]) -> None:
+        """
+        Cache the job data of a key, evicting the least recently used entries if the cache is full.
+
+        :param key: The cache key returned by get_key.
+        :param job_data: The job data parsed from the PDF.
+        """
+        self.__entries[key] = [data.model_dump() for data in job_data]
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.__max_entries:
+            self.__entries.popitem(last=False)
+
+    def clear(self) -> None:
+        logger.info("Clearing the job data cache")
+        self.__entries.clear()
+
+    def save(self) -> None:
+        """
+        Write the cache to disk, replacing the previous cache file atomically.
+        """
+        cache = {
+            'parser_version': JOBBER_PARSER_VERSION,
+            'item_map_hash': self.__item_map_hash,
+            'entries': list(self.__entries.items())
+        }
+        temp_path = f"{self.__cache_path}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(cache, f)
+            os.replace(temp_path, self.__cache_path)
+            logger.debug(f"Saved {len(self.__entries)} entries to the job data cache")
+        except Exception as e:
+            logger.error(f"Error while saving the job data cache to {self.__cache_path}: {str(e)}")
+
+    def __load(self) -> None:
+        if not os.path.exists(self.__cache_path):
+            return
+
+        try:
+            with open(self.__cache_path, 'r') as f:
+                cache = json.load(f)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable job data cache {self.__cache_path}: {str(e)}")
+            return
+
+        if cache.get('parser_version') != JOBBER_PARSER_VERSION or cache.get('item_map_hash') != self.__item_map_hash:
+            logger.info("Parser version or item map changed, invalidating the job data cache")
+            return
+
+        for key, job_data in cache.get('entries', [])[-self.__max_entries:]:
+            self.__entries[key] = job_data
+        logger.debug(f"Loaded {len(self.__entries)} entries from the job data cache")
+
+
+def get_item_map_hash() -> str:
+    return hashlib.sha256(json.dumps(ITEM_MAP, sort_keys=True).encode()).hexdigest()
@@ -1,3 +1,9 @@
+import re
+from functools import lru_cache
+
+# Bump whenever a change to the Jobber PDF parsing would change the job data it produces
+JOBBER_PARSER_VERSION = 2
+
 ITEM_MAP = {
     "1ft straight bracket": "1S",
     "2ft straight bracket": "2S",
@@ -32,9 +38,59 @@ ITEM_MAP = {
 }
 
 
-def valid_job_item(line: str) -> bool:
-    ft_list = ["1ft", "2ft", "3ft", "3.5ft", "4ft", "4.5ft", "5ft", "6ft", "7ft", "8ft", "9ft", "10ft"]
-    if not any(ft in line.replace(" ", "") for ft in ft_list):
-        return False
-    else:
-        return True
+def _get_item_size(description: str) -> str:
+    return description.split("ft", 1)[0]
+
+
+def _get_item_pattern(description: str) -> str:
+    """
+    Build the pattern matching an ITEM_MAP description as it appears on a Jobber PDF.
+    e.g. '3ft straight bracket' also matches '3 ft  Support Bracket'
+
+    The description is matched ignoring case except for 'ft', which must be lower case as it was when lines were
+    checked with valid_job_item, so e.g. '3FT STRAIGHT BRACKET 1' is not a job item and ends the item block.
+    """
+    words = description.split("ft", 1)[1].split()
+    word_patterns = ["(?:straight|support)" if word == "straight" else re.escape(word) for word in words]
+    return re.escape(_get_item_size(description)) + r"\s*(?-i:ft)\s+" + r"\s+".join(word_patterns)
+
+
+def _compile_job_item_pattern() -> re.Pattern:
+    descriptions = sorted(ITEM_MAP, key=len, reverse=True)
+    sizes = sorted({_get_item_size(description) for description in ITEM_MAP}, key=len, reverse=True)
+    return re.compile(
+        r"^\s*(?:"
+        # A known item, optionally preceded by one token, followed by its quantity
+        rf"(?:\S+\s+)?(?P<description>{'|'.join(_get_item_pattern(d) for d in descriptions)})\s+(?P<quantity>\d+)\s*$"
+        # Anything else mentioning an item size is an item we do not know how to bill
+        rf"|(?P<unknown>.*(?:{'|'.join(re.escape(size) for size in sizes)})\s*(?-i:ft)))",
+        re.IGNORECASE
+    )
+
+
+JOB_ITEM_PATTERN = _compile_job_item_pattern()
+
+
+@lru_cache(maxsize=1024)
+def _get_item_number(description: str) -> str:
+    normalized_description = " ".join(description.lower().split()).replace(" ft", "ft", 1)
+    return ITEM_MAP[normalized_description.replace("support", "straight")]
+
+
+def parse_job_item(line: str) -> tuple[str, int] or None:
+    """
+    Parse a line from the Product/Service block of a Jobber PDF in a single pass.
+
+    :param line: The line of text to parse.
+    :return: The item number and quantity, or None if the line is not a job item.
+    :raises Exception: If the line looks like a job item but does not match any item in ITEM_MAP.
+    """
+    match = JOB_ITEM_PATTERN.match(line)
+    if match is None:
+        return None
+
+    description = match.group("description")
+    if description is None:
+        raise Exception(f"Could not find item number for item with description: {line.strip()}")
+
+    return _get_item_number(description), int(match.group("quantity"))
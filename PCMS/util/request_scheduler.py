@@ -0,0 +1,171 @@
+import logging
+import random
+import threading
+import time
+from typing import Callable, TypeVar
+
+import requests
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger("pcms")
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+# Status codes of requests that were rejected without being applied, so even non-idempotent requests can be retried
+REJECTED_STATUS_CODES = (429,)
+# Reasons Google gives for rate limiting with a 403 rather than a 429
+RATE_LIMIT_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
+
+
+class RequestQuotas:
+    SHEETS_READ = 'sheets_read'
+    SHEETS_WRITE = 'sheets_write'
+    DRIVE = 'drive'
+
+
+class TokenBucket:
+    """
+    Rate limiter allowing rate_per_minute requests a minute on average, in bursts of up to a minute's worth.
+    """
+    def __init__(self, rate_per_minute: float):
+        self.__rate_per_second = rate_per_minute / 60
+        self.__capacity = max(rate_per_minute, 1)
+        self.__tokens = self.__capacity
+        self.__refilled_at = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take a token, waiting for one to be refilled if there are none left.
+
+        :return: How long was spent waiting in seconds.
+        """
+        waited_seconds = 0.0
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                self.__tokens = min(self.__capacity,
+                                    self.__tokens + (now - self.__refilled_at) * self.__rate_per_second)
+                self.__refilled_at = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return waited_seconds
+                wait_seconds = (1 - self.__tokens) / self.__rate_per_second
+            time.sleep(wait_seconds)
+            waited_seconds += wait_seconds
+
+
+class RequestScheduler:
+    """
+    Sends Google API requests within per-minute quotas and retries the ones that fail with a rate limit, server or
+    connection error, backing off exponentially with full jitter between attempts.
+
+    Shared by every thread sending requests, so raising the number of invoices generated at once queues requests
+    rather than exceeding the quotas or the cap on requests in flight.
+    """
+    def __init__(
+            self,
+            requests_per_minute: dict[str, float],
+            max_retries: int = 5,
+            initial_backoff_seconds: float = 1,
+            max_backoff_seconds: float = 32,
+            max_in_flight: int = 0
+    ):
+        """
+        :param requests_per_minute: The quota of each RequestQuotas kind of request. Kinds left out are not limited.
+        :param max_retries: How many times a failed request is retried before its error is raised.
+        :param initial_backoff_seconds: The longest wait before the first retry, doubling with every retry after it.
+        :param max_backoff_seconds: The longest wait before any retry.
+        :param max_in_flight: The most requests sent at the same time across all threads, or 0 for no limit.
+        """
+        self.__buckets = {quota: TokenBucket(rate) for quota, rate in requests_per_minute.items() if rate > 0}
+        self.__in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight > 0 else None
+        self.__max_retries = max_retries
+        self.__initial_backoff_seconds = initial_backoff_seconds
+        self.__max_backoff_seconds = max_backoff_seconds
+
+    def execute(self, send: Callable[[], T], quota: str or None, description: str, idempotent: bool = True) -> T:
+        """
+        Send a request, retrying it if it fails with a retryable error.
+
+        :param send: Sends the request and returns its result. Called again for every retry.
+        :param quota: The RequestQuotas kind of the request, or None if it is not limited.
+        :param description: What the request does, for the logs.
+        :param idempotent: If sending the request twice has the same effect as sending it once. Requests that are not
+                           are only retried when rate limited, as any other error may come after they were applied.
+        """
+        bucket = self.__buckets.get(quota)
+        attempt = 0
+        while True:
+            if bucket is not None:
+                waited_seconds = bucket.acquire()
+                if waited_seconds > 0:
+                    logger.debug(f"Waited {waited_seconds:.2f}s for {quota} quota to {description}")
+            try:
+                if self.__in_flight is None:
+                    return send()
+                with self.__in_flight:
+                    return send()
+            except Exception as e:
+                if attempt >= self.__max_retries or not is_retryable(e, idempotent):
+                    raise e
+                backoff_seconds = get_retry_after_seconds(e)
+                if backoff_seconds is None:
+                    backoff_seconds = random.uniform(
+                        0, min(self.__max_backoff_seconds, self.__initial_backoff_seconds * 2 ** attempt)
+                    )
+                attempt += 1
+                logger.warning(f"Retrying request to {description} in {backoff_seconds:.2f}s "
+                               f"(attempt {attempt} of {self.__max_retries}): {str(e)}")
+                time.sleep(backoff_seconds)
+
+
+def get_status_code(error: Exception) -> int or None:
+    if isinstance(error, HttpError):
+        return error.resp.status
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code
+    return None
+
+
+def is_retryable(error: Exception, idempotent: bool = True) -> bool:
+    """
+    Check if a request that failed with an error may succeed when sent again.
+
+    :param error: The error the request failed with.
+    :param idempotent: If the request can safely be applied more than once.
+    """
+    status_code = get_status_code(error)
+    if status_code in REJECTED_STATUS_CODES:
+        return True
+    if status_code == 403 and isinstance(error, HttpError):
+        return any(reason in str(error.content) for reason in RATE_LIMIT_REASONS)
+    if not idempotent:
+        return False
+
+    # A ChunkedEncodingError is a connection dropped part way through a streamed response
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                          ConnectionError, TimeoutError)):
+        return True
+    return status_code in RETRYABLE_STATUS_CODES
+
+
+def get_retry_after_seconds(error: Exception) -> float or None:
+    """
+    Get how long the server asked to wait before retrying, from the Retry-After header of the failed response.
+
+    :param error: The error the request failed with.
+    """
+    if isinstance(error, HttpError):
+        retry_after = error.resp.get('retry-after')
+    elif isinstance(error, requests.HTTPError) and error.response is not None:
+        retry_after = error.response.headers.get('Retry-After')
+    else:
+        return None
+
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except ValueError:
+        # Retry-After can also be an HTTP date, which falls back to the exponential backoff
+        return None
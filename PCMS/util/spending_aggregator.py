@@ -0,0 +1,175 @@
+import heapq
+import re
+from array import array
+from collections import Counter
+from typing import Iterable, Iterator
+
+from PCMS.models.cc_data import TransactionBatch
+from PCMS.services.ledger_service import get_transaction_year, parse_statement_date
+
+# (statement name, year, month, description, amount in cents) of a transaction being aggregated
+SpendingRow = tuple[str, int, int, str, int]
+
+# Store numbers, locations and reference codes following a merchant's name, e.g. '#7012' or 'C12345'
+MERCHANT_SUFFIX_PATTERN = re.compile(r'\s+(?:#|\S*\d).*$')
+# The city and province ending a description, e.g. 'CALGARY AB'
+MERCHANT_LOCATION_PATTERN = re.compile(r'\s+\S+\s+(?:AB|BC|SK|MB|ON|QC|NS|NB|NL|PE|YT|NT|NU)$')
+
+
+class TransactionColumns:
+    """
+    Transactions stored as parallel typed arrays, one value per transaction in each column, so aggregating them is a
+    pass over packed integers rather than over model objects.
+
+    Months, merchants and statements are stored as integer codes into their name lists, so grouping by them is
+    indexing an array of totals by code. Months are (year, month) pairs, so the same month of different years is
+    kept apart.
+    """
+    def __init__(self):
+        self.amount_cents = array('q')
+        self.month = array('L')
+        self.merchant = array('L')
+        self.statement = array('L')
+        self.month_names: list[tuple[int, int]] = []
+        self.merchant_names: list[str] = []
+        self.statement_names: list[str] = []
+        self.__month_codes: dict[tuple[int, int], int] = {}
+        self.__merchant_codes: dict[str, int] = {}
+        self.__statement_codes: dict[str, int] = {}
+        # Ledger keys of the transactions added with add_statement
+        self.__transaction_keys: set[tuple] = set()
+
+    def __len__(self) -> int:
+        return len(self.amount_cents)
+
+    def add_rows(self, rows: Iterable[SpendingRow]) -> None:
+        """
+        Append transactions to the columns, such as those from LedgerService.get_spending_rows.
+
+        The merchant is worked out once per distinct description rather than once per transaction.
+
+        :param rows: The transactions to add.
+        """
+        merchants: dict[str, int] = {}
+        for statement_name, year, month, description, amount_cents in rows:
+            merchant_code = merchants.get(description)
+            if merchant_code is None:
+                merchant_code = merchants[description] = get_code(self.__merchant_codes, self.merchant_names,
+                                                                  get_merchant_name(description))
+            self.amount_cents.append(amount_cents)
+            self.month.append(get_code(self.__month_codes, self.month_names, (year, month)))
+            self.merchant.append(merchant_code)
+            self.statement.append(get_code(self.__statement_codes, self.statement_names, statement_name))
+
+    def add_statement(self, statement_name: str, transactions: TransactionBatch) -> None:
+        """
+        Append the transactions of a parsed statement to the columns, skipping those already added from another
+        statement with overlapping dates. Transactions are identified the way the ledger identifies them.
+
+        :param statement_name: The name of the statement the transactions are from.
+        :param transactions: The transactions of the statement.
+        """
+        self.add_rows(get_unique_rows(statement_name, transactions, self.__transaction_keys))
+
+
+class GroupTotal:
+    __slots__ = ('key', 'count', 'total')
+
+    def __init__(self, key, count: int, total: float):
+        self.key = key
+        self.count = count
+        self.total = total
+
+
+def get_unique_rows(
+        statement_name: str,
+        transactions: TransactionBatch,
+        transaction_keys: set[tuple]
+) -> Iterator[SpendingRow]:
+    """
+    Yield the transactions of a statement whose ledger key is not in transaction_keys, adding their keys to it.
+
+    :param statement_name: The name of the statement the transactions are from.
+    :param transactions: The transactions of the statement.
+    :param transaction_keys: The ledger keys of the transactions already yielded.
+    """
+    occurrences = Counter()
+    for date, description, amount_cents, _, _ in transactions.rows():
+        occurrences[(date, description, amount_cents)] += 1
+        month = parse_statement_date(date)[0]
+        year = get_transaction_year(month, transactions.closing_date)
+        key = (year, date, description, amount_cents, occurrences[(date, description, amount_cents)])
+        if key not in transaction_keys:
+            transaction_keys.add(key)
+            yield statement_name, year, month, description, amount_cents
+
+
+def get_code(codes: dict, names: list, name) -> int:
+    code = codes.get(name)
+    if code is None:
+        code = codes[name] = len(names)
+        names.append(name)
+    return code
+
+
+def get_merchant_name(description: str) -> str:
+    """
+    Get the merchant of a transaction by dropping the store number and location from its description.
+    e.g. 'HOME DEPOT #7012 CALGARY AB' -> 'HOME DEPOT'
+
+    :param description: The description of the transaction.
+    """
+    merchant_name = MERCHANT_LOCATION_PATTERN.sub('', MERCHANT_SUFFIX_PATTERN.sub('', description.strip().upper()))
+    return merchant_name if merchant_name != '' else description.strip().upper()
+
+
+def group_totals(codes: array, amount_cents: array, group_count: int) -> tuple[array, array]:
+    """
+    Sum the amounts and count the transactions of each group in one pass over the columns.
+
+    :param codes: The group code of each transaction.
+    :param amount_cents: The amount of each transaction in cents.
+    :param group_count: The number of groups, one more than the largest code.
+    :return: The total cents and transaction count of each group, indexed by code.
+    """
+    totals = array('q', bytes(8 * group_count))
+    counts = array('q', bytes(8 * group_count))
+    for code, cents in zip(codes, amount_cents):
+        totals[code] += cents
+        counts[code] += 1
+    return totals, counts
+
+
+def to_group_totals(names: list, totals: array, counts: array) -> list[GroupTotal]:
+    return [GroupTotal(name, counts[code], totals[code] / 100) for code, name in enumerate(names) if counts[code] > 0]
+
+
+def total_by_merchant(columns: TransactionColumns) -> list[GroupTotal]:
+    totals, counts = group_totals(columns.merchant, columns.amount_cents, len(columns.merchant_names))
+    return to_group_totals(columns.merchant_names, totals, counts)
+
+
+def total_by_statement(columns: TransactionColumns) -> list[GroupTotal]:
+    totals, counts = group_totals(columns.statement, columns.amount_cents, len(columns.statement_names))
+    return to_group_totals(columns.statement_names, totals, counts)
+
+
+def total_by_month(columns: TransactionColumns) -> list[GroupTotal]:
+    """
+    Get the totals of each month in calendar order, keyed by (year, month). Transactions with an unknown year or
+    month have 0 in its place.
+    """
+    totals, counts = group_totals(columns.month, columns.amount_cents, len(columns.month_names))
+    return sorted(to_group_totals(columns.month_names, totals, counts), key=lambda group: group.key)
+
+
+def top_merchants(columns: TransactionColumns, count: int) -> list[GroupTotal]:
+    """
+    Get the merchants with the most spent, largest first.
+
+    :param columns: The transactions to aggregate.
+    :param count: The number of merchants to return.
+    """
+    totals, counts = group_totals(columns.merchant, columns.amount_cents, len(columns.merchant_names))
+    top_codes = heapq.nlargest(count, range(len(columns.merchant_names)), key=totals.__getitem__)
+    return [GroupTotal(columns.merchant_names[code], counts[code], totals[code] / 100) for code in top_codes]
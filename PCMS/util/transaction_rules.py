@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import re
+
+from PCMS.util.file_util import FileUtil
+
+logger = logging.getLogger("pcms")
+
+RULES_FILE_NAME = "cc_rules.json"
+DEFAULT_RULES = {
+    'exclude': ['PAYMENT', 'CREDIT', 'REFUND', 'RETURN', 'INTEREST'],
+    'categories': {},
+    'cost_codes': {}
+}
+
+
+class RuleKinds:
+    EXCLUDE = 'exclude'
+    CATEGORY = 'category'
+    COST_CODE = 'cost_code'
+
+
+class TransactionRules:
+    """
+    Exclusion, category and job cost code rules for credit card transactions, each a list of keywords that tag a
+    transaction when its description contains one of them. Keywords match case-sensitively, as statement descriptions
+    are upper case, e.g. 'PAYMENT' excludes 'PAYMENT - THANK YOU' but not 'Payment Processing Inc.'.
+
+    All the keywords are compiled into a single trie shaped regex, so tagging a description is one pass whose cost
+    depends on the description rather than the number of rules. When several category or cost code rules match, the
+    keyword found first in the description wins.
+    """
+    def __init__(self, rules: dict):
+        """
+        :param rules: {'exclude': [keyword], 'categories': {category: [keyword]}, 'cost_codes': {code: [keyword]}}
+        """
+        keyword_tags: dict[str, list[tuple[str, str or None]]] = {}
+        for keyword in rules.get('exclude', []):
+            keyword_tags.setdefault(keyword, []).append((RuleKinds.EXCLUDE, None))
+        for category, keywords in rules.get('categories', {}).items():
+            for keyword in keywords:
+                keyword_tags.setdefault(keyword, []).append((RuleKinds.CATEGORY, category))
+        for cost_code, keywords in rules.get('cost_codes', {}).items():
+            for keyword in keywords:
+                keyword_tags.setdefault(keyword, []).append((RuleKinds.COST_CODE, cost_code))
+        keyword_tags.pop("", None)
+
+        # Only the longest keyword starting at each position is matched, so it also carries the tags of every
+        # keyword it contains
+        self.__keyword_tags = {
+            keyword: [tag for other, tags in keyword_tags.items() if other in keyword for tag in tags]
+            for keyword in keyword_tags
+        }
+        self.__pattern = compile_keyword_pattern(list(keyword_tags)) if len(keyword_tags) > 0 else None
+        self.has_tag_rules = len(rules.get('categories', {})) > 0 or len(rules.get('cost_codes', {})) > 0
+
+    @classmethod
+    def load(cls, file_util: FileUtil) -> 'TransactionRules':
+        """
+        Load the rules from the rules file in the app root, creating it with the default rules if it is missing.
+        """
+        rules_path = os.path.join(file_util.get_root(), RULES_FILE_NAME)
+        try:
+            if not os.path.exists(rules_path):
+                logger.info(f"Creating {RULES_FILE_NAME} with the default transaction rules")
+                with open(rules_path, 'w') as f:
+                    json.dump(DEFAULT_RULES, f, indent=4)
+                return cls(DEFAULT_RULES)
+
+            with open(rules_path, 'r') as f:
+                return cls(json.load(f))
+        except Exception as e:
+            logger.error(f"Error while loading transaction rules from {rules_path}: {str(e)}")
+            raise e
+
+    def classify(self, description: str) -> tuple[bool, str or None, str or None]:
+        """
+        Tag a transaction description with every rule it matches.
+
+        :param description: The description of the transaction.
+        :return: Whether the transaction is excluded, its category and its cost code.
+        """
+        excluded, category, cost_code = False, None, None
+        if self.__pattern is None:
+            return excluded, category, cost_code
+
+        for match in self.__pattern.finditer(description):
+            for kind, value in self.__keyword_tags[match.group(1)]:
+                if kind == RuleKinds.EXCLUDE:
+                    excluded = True
+                elif kind == RuleKinds.CATEGORY and category is None:
+                    category = value
+                elif kind == RuleKinds.COST_CODE and cost_code is None:
+                    cost_code = value
+
+        return excluded, category, cost_code
+
+
+def compile_keyword_pattern(keywords: list[str]) -> re.Pattern:
+    """
+    Compile keywords into a regex that finds the longest keyword starting at every position of a string.
+    e.g. ['HOME DEPOT', 'HOME HARDWARE'] -> (?=(HOME\\ (?:DEPOT|HARDWARE)))
+
+    :param keywords: The keywords to find.
+    """
+    trie: dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    # The lookahead lets matches overlap, so a keyword inside another keyword's match is still found
+    return re.compile(f"(?=({_trie_to_pattern(trie)}))")
+
+
+def _trie_to_pattern(node: dict) -> str:
+    branches = [re.escape(char) + _trie_to_pattern(child) for char, child in sorted(node.items()) if char != ""]
+    if len(branches) == 0:
+        return ""
+
+    pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    # A keyword ending here makes the longer keywords optional, greedily preferring them
+    return f"(?:{pattern})?" if "" in node else pattern
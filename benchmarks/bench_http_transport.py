@@ -0,0 +1,145 @@
+"""
+Benchmark of the per-invoice latency of the Google API requests with and without a pooled keep-alive transport.
+
+Starts a local stub server answering the four requests an invoice makes (Drive copy, Sheets metadata lookup, Sheets
+batch update and PDF export) and sends them through googleapiclient as InvoiceService does. Without pooling every
+request opens a new connection, with pooling the requests share one create_authorized_session connection pool. A
+local connection costs next to nothing, so the stub delays every new connection by --handshake-ms to stand in for
+the TCP and TLS handshakes with Google's servers.
+
+Usage: python -m benchmarks.bench_http_transport [--invoices 20] [--threads 1] [--handshake-ms 40] [--response-ms 5]
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+from PCMS.util.http_transport import SessionHttp, create_authorized_session
+
+EXPORT_PDF_BYTES = b"%PDF-1.4\n" + b"0" * 50_000
+
+
+class StubGoogleHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, which Nagle's algorithm would hold back on a kept alive connection
+    disable_nagle_algorithm = True
+    handshake_seconds = 0.0
+    response_seconds = 0.0
+    connection_count = 0
+    connection_lock = threading.Lock()
+
+    def setup(self):
+        # Runs once per connection, standing in for the handshakes of a new connection to Google
+        with StubGoogleHandler.connection_lock:
+            StubGoogleHandler.connection_count += 1
+        time.sleep(self.handshake_seconds)
+        super().setup()
+
+    def do_GET(self):
+        if "/export" in self.path:
+            self.respond(EXPORT_PDF_BYTES, "application/pdf")
+        else:
+            self.respond(json.dumps({'sheets': [{'properties': {
+                'sheetId': 0, 'title': 'Invoice', 'gridProperties': {'rowCount': 130, 'columnCount': 10}
+            }}]}).encode(), "application/json")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        body = {'id': 'invoice-copy'} if "/copy" in self.path else {}
+        self.respond(json.dumps(body).encode(), "application/json")
+
+    def respond(self, body: bytes, content_type: str):
+        time.sleep(self.response_seconds)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnpooledHttp:
+    """
+    Sends every request on a new connection, as the bare requests.get export did.
+    """
+    def __init__(self, credentials):
+        self.credentials = credentials
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=5, connection_type=None):
+        with create_authorized_session(self.credentials, 1) as session:
+            return SessionHttp(session).request(uri, method, body, headers, redirections, connection_type)
+
+
+def generate_invoice(drive_service, sheet_service, export, base_url: str) -> float:
+    start = time.perf_counter()
+    spreadsheet_id = drive_service.files().copy(fileId="template", body={'name': "Invoice"}).execute()['id']
+    sheet_service.spreadsheets().get(spreadsheetId=spreadsheet_id, fields="sheets.properties").execute()
+    sheet_service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body={'requests': []}).execute()
+    export(f"{base_url}/spreadsheets/d/{spreadsheet_id}/export?format=pdf&gid=0")
+    return time.perf_counter() - start
+
+
+def measure(http, export, base_url: str, invoices: int, threads: int) -> tuple[list[float], float]:
+    client_options = {'api_endpoint': base_url}
+    drive_service = build('drive', 'v3', http=http, client_options=client_options)
+    sheet_service = build('sheets', 'v4', http=http, client_options=client_options)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(lambda _: generate_invoice(drive_service, sheet_service, export, base_url),
+                                      range(invoices)))
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoices", type=int, default=20)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--handshake-ms", type=float, default=40)
+    parser.add_argument("--response-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    StubGoogleHandler.handshake_seconds = args.handshake_ms / 1000
+    StubGoogleHandler.response_seconds = args.response_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGoogleHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    credentials = Credentials(token="benchmark-token")
+
+    def unpooled_export(url: str):
+        with create_authorized_session(credentials, 1) as session:
+            session.get(url, timeout=60).raise_for_status()
+
+    pooled_session = create_authorized_session(credentials, max(args.threads, 1))
+    pooled_http = SessionHttp(pooled_session)
+
+    results = {}
+    for name, http, export in (
+            ("unpooled", UnpooledHttp(credentials), unpooled_export),
+            ("pooled", pooled_http, lambda url: pooled_session.get(url, timeout=60).raise_for_status())
+    ):
+        StubGoogleHandler.connection_count = 0
+        latencies, total_seconds = measure(http, export, base_url, args.invoices, args.threads)
+        results[name] = (latencies, total_seconds, StubGoogleHandler.connection_count)
+
+    server.shutdown()
+    pooled_session.close()
+
+    print(f"{args.invoices} invoices of 4 requests on {args.threads} thread(s), {args.handshake_ms:g} ms per new "
+          f"connection, {args.response_ms:g} ms per response")
+    for name, (latencies, total_seconds, connection_count) in results.items():
+        print(f"  {name:<9} per invoice median {statistics.median(latencies) * 1000:7.1f} ms  "
+              f"max {max(latencies) * 1000:7.1f} ms  {args.invoices / total_seconds:6.1f} invoices/sec  "
+              f"{connection_count} connections")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark of invoice generation through the real GoogleService and InvoiceService code against the in-process
+GoogleEmulator, measuring the Google API requests each invoice costs, its latency and the throughput of generating
+several invoices at once.
+
+Every emulated request takes --latency-ms plus up to --jitter-ms, standing in for the round trip to Google. With
+--error-rate a share of the requests fail with --error-status, to measure the cost of the retries. Drive copies are
+slower than other requests, taking --copy-latency-ms. With --template-pool the invoices start from copies made ahead
+of time by a TemplateCopyPool, which is filled before the invoices are timed.
+
+Usage: python -m benchmarks.bench_invoice_emulator [--invoices 20] [--items 25] [--workers 4] [--latency-ms 80]
+                                                   [--jitter-ms 40] [--error-rate 0] [--error-status 503]
+                                                   [--copy-latency-ms 400] [--max-in-flight 8] [--sheets-rpm 0]
+                                                   [--template-pool 0]
+"""
+import argparse
+import logging
+import tempfile
+import time
+
+from benchmarks.corpus import STREETS
+from benchmarks.google_emulator import EmulatedOperations, GoogleEmulator, create_emulated_google_service
+from PCMS.models.invoice_data import CustomerInfo, InvoiceData, JobData
+from PCMS.services.invoice_service import InvoiceService
+from PCMS.services.template_copy_pool import TemplateCopyPool
+from PCMS.util.file_util import FileUtil
+
+
+def create_invoices(invoice_count: int, item_count: int) -> list[InvoiceData]:
+    customer_info = CustomerInfo(company_name="Benchmark Property Management", address="100 Benchmark Way",
+                                 city="Calgary", province="AB", postal_code="T2P 0A1", attention="Accounts Payable")
+    return [
+        InvoiceData(
+            name=f"Benchmark Invoice {index + 1}",
+            invoice_number=str(index + 1).zfill(5),
+            invoice_date="January 1, 2025",
+            invoice_due_date="January 31, 2025",
+            customer_info=customer_info,
+            job_data=[JobData(item_id=f"Item {item % 7}", address=f"{item + 1} {STREETS[item % len(STREETS)]}",
+                              quantity=str(item % 3 + 1))
+                      for item in range(item_count)]
+        )
+        for index in range(invoice_count)
+    ]
+
+
+def get_percentile(values: list[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(percentile / 100 * len(ordered)) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoices", type=int, default=20)
+    parser.add_argument("--items", type=int, default=25)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=80)
+    parser.add_argument("--jitter-ms", type=float, default=40)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--copy-latency-ms", type=float, default=400)
+    parser.add_argument("--max-in-flight", type=int, default=8)
+    parser.add_argument("--sheets-rpm", type=int, default=0)
+    parser.add_argument("--template-pool", type=int, default=0)
+    args = parser.parse_args()
+
+    # The retries are expected when injecting errors, so only the failures are logged
+    logging.basicConfig(level=logging.CRITICAL)
+
+    emulator = GoogleEmulator(args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate, args.error_status,
+                              operation_latency_seconds={EmulatedOperations.COPY: args.copy_latency_ms / 1000})
+    template_id = emulator.add_invoice_template()
+    google_service = create_emulated_google_service(FileUtil(), emulator,
+                                                    sheets_requests_per_minute=args.sheets_rpm,
+                                                    max_in_flight_requests=args.max_in_flight)
+    invoices = create_invoices(args.invoices, args.items)
+
+    template_pool = None
+    if args.template_pool > 0:
+        template_pool = TemplateCopyPool(google_service, template_id, args.template_pool)
+        template_pool.start()
+        while template_pool.get_ready_count() < args.template_pool:
+            time.sleep(0.01)
+    # Only the requests made generating the invoices are counted
+    warm_up_counts = emulator.get_request_counts()
+
+    with tempfile.TemporaryDirectory() as invoices_dir:
+        # An absolute folder is used as is, keeping the PDFs out of the PCMS root folder
+        invoice_service = InvoiceService(FileUtil(), google_service, template_id, invoices_dir, args.workers,
+                                         template_pool)
+        start = time.perf_counter()
+        results = invoice_service.create_new_invoices(invoices)
+        total_seconds = time.perf_counter() - start
+
+    if template_pool is not None:
+        # Requests made refilling the pool in the background are counted, as they are made for the invoices
+        template_pool.close()
+
+    request_counts = {operation: count - warm_up_counts.get(operation, 0)
+                      for operation, count in emulator.get_request_counts().items()}
+    request_count = sum(request_counts.values())
+    generated = [result for result in results if result.generated]
+    latencies = [result.seconds for result in generated]
+
+    print(f"{args.invoices} invoices of {args.items} job items on {args.workers} thread(s), "
+          f"{args.latency_ms:g} ms + up to {args.jitter_ms:g} ms per request ({args.copy_latency_ms:g} ms per copy), "
+          f"{args.error_rate:.0%} errors, template pool of {args.template_pool}")
+    # Every spreadsheet besides the template and the generated invoices is a failed invoice's copy left behind
+    print(f"  generated {len(generated)} of {len(results)}, "
+          f"{emulator.get_file_count() - 1 - len(generated)} copies of failed invoices left in Drive")
+    print(f"  requests per invoice {request_count / max(len(results), 1):.2f}  "
+          f"({', '.join(f'{operation} {count}' for operation, count in sorted(request_counts.items()))})")
+    if latencies:
+        print(f"  latency p50 {get_percentile(latencies, 50) * 1000:7.1f} ms  "
+              f"p99 {get_percentile(latencies, 99) * 1000:7.1f} ms  "
+              f"throughput {len(generated) / total_seconds:6.2f} invoices/sec")
+
+
+if __name__ == "__main__":
+    main()
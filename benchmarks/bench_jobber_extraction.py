@@ -0,0 +1,55 @@
+"""
+Benchmark of full-page versus lazy text extraction in get_job_data_from_pdf.
+
+Builds multi-page synthetic work orders whose first page continues with totals, notes and terms after the
+Product/Service block, followed by pages of job photos, then times get_job_data_from_pdf in both modes.
+
+Usage: python -m benchmarks.bench_jobber_extraction [--pdfs 20] [--photo-pages 4] [--trailing-lines 40]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from os.path import join
+
+from benchmarks.corpus import generate_work_order
+from PCMS.services.jobber_service import get_job_data_from_pdf
+
+def measure_milliseconds(pdf_paths: list[str], lazy_extraction: bool, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        for pdf_path in pdf_paths:
+            start = time.perf_counter()
+            get_job_data_from_pdf(pdf_path, lazy_extraction)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=20)
+    parser.add_argument("--photo-pages", type=int, default=4)
+    parser.add_argument("--trailing-lines", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        pdf_paths = [join(temp_dir, f"work_order_{index}.pdf") for index in range(args.pdfs)]
+        for pdf_path in pdf_paths:
+            generate_work_order(pdf_path, photo_pages=args.photo_pages, trailing_lines=args.trailing_lines)
+
+        if get_job_data_from_pdf(pdf_paths[0], True) != get_job_data_from_pdf(pdf_paths[0], False):
+            raise SystemExit("Lazy and full extraction produced different job data")
+
+        full = measure_milliseconds(pdf_paths, False, args.repeat)
+        lazy = measure_milliseconds(pdf_paths, True, args.repeat)
+
+    print(f"{args.pdfs} work orders, {args.photo_pages + 1} pages each, {args.trailing_lines} lines after the items")
+    for name, timings in (("full page", full), ("lazy", lazy)):
+        print(f"  {name:<10} median {statistics.median(timings):7.2f} ms  "
+              f"p95 {statistics.quantiles(timings, n=20)[-1]:7.2f} ms")
+    print(f"  saving     {1 - statistics.median(lazy) / statistics.median(full):.0%} of the median latency")
+
+
+if __name__ == "__main__":
+    main()
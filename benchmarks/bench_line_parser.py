@@ -0,0 +1,99 @@
+"""
+Microbenchmark of the Jobber line item parser.
+
+Compares the original valid_job_item + ITEM_MAP scanning with the compiled parse_job_item matcher on a synthetic
+corpus of Product/Service lines.
+
+Usage: python -m benchmarks.bench_line_parser [--lines 100000] [--repeat 5]
+"""
+import argparse
+import random
+import time
+
+from PCMS.util.jobber_util import ITEM_MAP, parse_job_item
+
+
+def legacy_valid_job_item(line: str) -> bool:
+    ft_list = ["1ft", "2ft", "3ft", "3.5ft", "4ft", "4.5ft", "5ft", "6ft", "7ft", "8ft", "9ft", "10ft"]
+    if not any(ft in line.replace(" ", "") for ft in ft_list):
+        return False
+    else:
+        return True
+
+
+def legacy_parse_job_item(line: str) -> tuple[str, int] or None:
+    if not legacy_valid_job_item(line):
+        return None
+
+    parts = line.split()
+    if parts[1] == "ft":
+        parts[1] = parts[0] + parts[1]
+        parts.pop(0)
+
+    if "ft" in parts[1]:
+        description = " ".join(parts[1:-1]).lower()
+    else:
+        description = " ".join(parts[:-1]).lower()
+    if "support" in description:
+        description = description.replace("support", "straight")
+    quantity = int(parts[-1])
+    item_number = ITEM_MAP.get(description)
+
+    if item_number:
+        return item_number, quantity
+    else:
+        raise Exception(f"Could not find item number for item with description: {description}")
+
+
+def generate_lines(line_count: int, seed: int = 0) -> list[str]:
+    """
+    Generate job item lines using the spellings seen on Jobber PDFs: title case, split sizes ('3 ft'),
+    'Support' for straight brackets and an occasional leading token before a joined size. A few lines are upper case,
+    which neither parser treats as a job item.
+    """
+    rng = random.Random(seed)
+    descriptions = list(ITEM_MAP)
+    lines = []
+    for _ in range(line_count):
+        size, rest = rng.choice(descriptions).split("ft", 1)
+        if "straight" in rest and rng.random() < 0.3:
+            rest = rest.replace("straight", "support")
+        if rng.random() < 0.2:
+            size_text, prefix = f"{size} ft", ""
+        else:
+            size_text, prefix = f"{size}ft", "Item " if rng.random() < 0.1 else ""
+        line = f"{prefix}{size_text}{rest.title()} {rng.randint(1, 40)}"
+        lines.append(line.upper() if rng.random() < 0.02 else line)
+    return lines
+
+
+def measure_lines_per_second(parse, lines: list[str], repeat: int) -> float:
+    best_seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in lines:
+            parse(line)
+        best_seconds = min(best_seconds, time.perf_counter() - start)
+    return len(lines) / best_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    lines = generate_lines(args.lines)
+    mismatches = [line for line in lines if legacy_parse_job_item(line) != parse_job_item(line)]
+    if len(mismatches) > 0:
+        raise SystemExit(f"Parsers disagree on {len(mismatches)} lines, e.g. {mismatches[0]!r}")
+
+    before = measure_lines_per_second(legacy_parse_job_item, lines, args.repeat)
+    after = measure_lines_per_second(parse_job_item, lines, args.repeat)
+    print(f"Parsed {len(lines):,} lines (best of {args.repeat})")
+    print(f"  valid_job_item + ITEM_MAP: {before:>12,.0f} lines/sec")
+    print(f"  parse_job_item:            {after:>12,.0f} lines/sec ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
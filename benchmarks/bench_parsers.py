@@ -0,0 +1,130 @@
+"""
+Benchmark suite for the Jobber work order and credit card statement parsers.
+
+Generates a synthetic corpus with benchmarks.corpus and reports PDFs/sec, lines/sec and peak Python memory for
+get_job_data_from_pdf and the credit card statement parser. Results can be saved as a baseline, and later runs are
+compared against it so regressions show up.
+
+Usage: python -m benchmarks.bench_parsers [--save-baseline] [--baseline PATH] [--tolerance 0.15]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from os.path import dirname, exists, join
+
+from benchmarks.corpus import generate_corpus
+from PCMS.services.cc_service import get_transactions
+from PCMS.services.jobber_service import get_job_data_from_pdf
+
+DEFAULT_BASELINE_PATH = join(dirname(__file__), "results", "baseline.json")
+
+
+def measure(parse, pdf_paths: list[str], line_count: int, repeat: int) -> dict:
+    best_seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for pdf_path in pdf_paths:
+            parse(pdf_path)
+        best_seconds = min(best_seconds, time.perf_counter() - start)
+
+    # Peak memory of the largest single parse, collecting pypdf's reference cycles between PDFs
+    peak_bytes = 0
+    tracemalloc.start()
+    for pdf_path in pdf_paths:
+        gc.collect()
+        tracemalloc.reset_peak()
+        parse(pdf_path)
+        peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+
+    return {
+        'pdfs_per_sec': len(pdf_paths) / best_seconds,
+        'lines_per_sec': line_count / best_seconds,
+        'peak_memory_mb': peak_bytes / (1024 * 1024)
+    }
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Compare results against a baseline. A metric missing from the baseline counts as a regression, so a renamed
+    parser or metric cannot pass unchecked.
+    """
+    regressions = []
+    for parser_name, metrics in results.items():
+        baseline_metrics = baseline.get(parser_name, {})
+        for metric, value in metrics.items():
+            baseline_value = baseline_metrics.get(metric)
+            if baseline_value is None:
+                regressions.append(f"{parser_name} {metric}: missing from the baseline, re-record it with "
+                                   f"--save-baseline")
+                continue
+            # Throughput regresses when it drops, memory when it grows
+            if metric.endswith("_per_sec"):
+                regressed = value < baseline_value * (1 - tolerance)
+            else:
+                regressed = value > baseline_value * (1 + tolerance)
+            if regressed:
+                regressions.append(f"{parser_name} {metric}: {value:,.2f} vs baseline {baseline_value:,.2f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--work-orders", type=int, default=40)
+    parser.add_argument("--statements", type=int, default=12)
+    parser.add_argument("--items", type=int, default=8)
+    parser.add_argument("--transactions", type=int, default=80)
+    parser.add_argument("--photo-pages", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Allowed relative change from the baseline before a metric counts as a regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_orders, statements, work_order_lines, statement_lines = generate_corpus(
+            temp_dir, args.work_orders, args.statements, args.items, args.transactions, args.photo_pages
+        )
+        results = {
+            'get_job_data_from_pdf': measure(get_job_data_from_pdf, work_orders, work_order_lines, args.repeat),
+            # Named after the method the parser was before it moved to cc_service, so saved baselines still match
+            'CcService.__get_transactions': measure(get_transactions, statements, statement_lines, args.repeat)
+        }
+
+    for parser_name, metrics in results.items():
+        print(f"{parser_name}")
+        print(f"  {metrics['pdfs_per_sec']:10,.1f} PDFs/sec")
+        print(f"  {metrics['lines_per_sec']:10,.0f} lines/sec")
+        print(f"  {metrics['peak_memory_mb']:10,.2f} MB peak Python memory")
+
+    if args.save_baseline:
+        os.makedirs(dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(), 'results': results},
+                      f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not exists(args.baseline):
+        print("No baseline to compare against, run with --save-baseline to record one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = find_regressions(results, baseline['results'], args.tolerance)
+    if len(regressions) > 0:
+        print(f"Regressions against the baseline from {baseline['machine']}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        raise SystemExit(1)
+    print(f"No regressions against the baseline (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
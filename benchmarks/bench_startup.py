@@ -0,0 +1,94 @@
+"""
+Benchmark of the startup time of PCMS with the Google clients built when GoogleService is constructed (eager, as
+before) versus the first time a request is made (lazy).
+
+Each run is a new Python process, so imports are measured cold. It imports main_gui and wires the services as
+main_gui does up to the point the window is shown, then makes a first Drive request against the in-process
+GoogleEmulator. Reports the time to the first window, meaning everything before the main loop, and the time to the
+first Google request.
+
+The saved OAuth access token lasts an hour, so PCMS usually starts with an expired one it has to refresh. The
+emulator answers the refresh after --token-latency-ms, standing in for the round trip to Google's token endpoint.
+Running the browser flow when there is no saved token is not measured.
+
+Usage: python -m benchmarks.bench_startup [--runs 5] [--token-latency-ms 300]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+MODES = ("eager", "lazy")
+
+
+def run_child(mode: str, token_latency_seconds: float) -> dict:
+    start = time.perf_counter()
+
+    import main_gui
+    from google.auth.transport.requests import Request
+
+    from benchmarks.google_emulator import (EmulatedOperations, GoogleEmulator, create_emulated_credentials,
+                                            create_emulated_google_service, create_emulated_session,
+                                            create_emulated_transport)
+    from PCMS.services.cc_service import CcService
+    from PCMS.services.google_service import build_service
+    from PCMS.services.invoice_service import InvoiceService
+    from PCMS.services.jobber_service import JobberService
+    from PCMS.util.file_util import FileUtil
+    from PCMS.util.folder_names import FolderNames
+    from PCMS.util.http_transport import SessionHttp
+
+    emulator = GoogleEmulator(operation_latency_seconds={EmulatedOperations.TOKEN: token_latency_seconds})
+    template_id = emulator.add_invoice_template()
+    file_util = FileUtil()
+    credentials = create_emulated_credentials(expired=True)
+    google_service = create_emulated_google_service(file_util, emulator, credentials)
+    if mode == "eager":
+        # What the GoogleService constructor did before authenticating and building the clients lazily
+        credentials.refresh(Request(create_emulated_transport(emulator)))
+        http = SessionHttp(create_emulated_session(emulator, credentials))
+        build_service('drive', 'v3', http)
+        build_service('sheets', 'v4', http)
+    InvoiceService(file_util, google_service, template_id, FolderNames.INVOICE_FOLDER)
+    JobberService(file_util, FolderNames.UNPROCESSED_JOB_FOLDER, FolderNames.PROCESSED_JOB_FOLDER)
+    CcService(file_util)
+    window_seconds = time.perf_counter() - start
+
+    google_service.get_sheet_gid(template_id, "Invoice")
+    return {'window': window_seconds, 'first_request': time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--token-latency-ms", type=float, default=300)
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        print(json.dumps(run_child(args.child, args.token_latency_ms / 1000)))
+        return
+
+    results = {mode: [] for mode in MODES}
+    for _ in range(args.runs):
+        # Alternated so both modes see the same disk cache and machine load
+        for mode in MODES:
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, "-m", "benchmarks.bench_startup", "--child", mode,
+                                     "--token-latency-ms", str(args.token_latency_ms)],
+                                    capture_output=True, text=True, check=True).stdout
+            timings = json.loads(output.strip().splitlines()[-1])
+            timings['process'] = time.perf_counter() - start
+            results[mode].append(timings)
+
+    print(f"Median of {args.runs} runs, each in a new process, {args.token_latency_ms:g} ms to refresh the token")
+    for mode, runs in results.items():
+        print(f"  {mode:<6} first window {statistics.median(run['window'] for run in runs) * 1000:7.1f} ms  "
+              f"first Google request {statistics.median(run['first_request'] for run in runs) * 1000:7.1f} ms  "
+              f"whole process {statistics.median(run['process'] for run in runs) * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
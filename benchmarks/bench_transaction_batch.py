@@ -0,0 +1,97 @@
+"""
+Benchmark of holding parsed credit card transactions as Transaction models versus a columnar TransactionBatch.
+
+Generates statement transaction records like those assembled from a statement PDF, parses them with
+extract_transaction_rows and builds both representations from the same rows. Reports construction time, the memory
+retained by the result and its pickled size (what a worker process sends back), each per 100k transactions.
+
+The retained memory is measured while parsing the records into each representation, so both are charged for the
+strings they keep: one per transaction for the models, one per distinct value in the batch's string table.
+
+Usage: python -m benchmarks.bench_transaction_batch [--rows 100000] [--repeat 3]
+"""
+import argparse
+import gc
+import pickle
+import random
+import time
+import tracemalloc
+from typing import Iterable
+
+from benchmarks.corpus import EXCLUDED_MERCHANTS, MERCHANTS, MONTHS
+from PCMS.models.cc_data import TransactionBatch, TransactionRow, to_transaction
+from PCMS.services.cc_service import extract_transaction_rows
+
+PER_ROWS = 100_000
+
+
+def generate_records(row_count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    records = []
+    for _ in range(row_count):
+        month = rng.choice(MONTHS)
+        day = rng.randint(1, 28)
+        merchant = rng.choice(EXCLUDED_MERCHANTS) if rng.random() < 0.05 else rng.choice(MERCHANTS)
+        records.append(f"{month} {day:02d} {month} {min(day + 2, 28):02d} {merchant} CALGARY AB ||| "
+                       f"${rng.uniform(2, 2500):,.2f}")
+    return records
+
+
+def build_models(rows: Iterable[TransactionRow]) -> list:
+    return [to_transaction(row) for row in rows]
+
+
+def build_batch(rows: Iterable[TransactionRow]) -> TransactionBatch:
+    return TransactionBatch(rows)
+
+
+def measure(build, rows: list, records: list[str], repeat: int) -> dict:
+    best_seconds = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build(rows)
+        best_seconds = min(best_seconds, time.perf_counter() - start)
+
+    # Built from the records rather than the parsed rows, whose strings would otherwise be shared with the result
+    gc.collect()
+    tracemalloc.start()
+    result = build(extract_transaction_rows(records))
+    retained_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    scale = PER_ROWS / len(rows)
+    return {
+        'seconds': best_seconds * scale,
+        'memory_mb': retained_bytes * scale / (1024 * 1024),
+        'pickled_mb': len(pickle.dumps(result)) * scale / (1024 * 1024)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=PER_ROWS)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    records = generate_records(args.rows)
+    start = time.perf_counter()
+    rows = list(extract_transaction_rows(records))
+    parse_seconds = time.perf_counter() - start
+
+    if build_batch(rows).to_transactions() != build_models(rows):
+        raise SystemExit("TransactionBatch and the Transaction models hold different transactions")
+
+    results = {
+        'Transaction models': measure(build_models, rows, records, args.repeat),
+        'TransactionBatch': measure(build_batch, rows, records, args.repeat)
+    }
+
+    print(f"{len(rows)} transactions parsed from {args.rows} records in {parse_seconds:.2f}s, "
+          f"figures per {PER_ROWS:,} transactions")
+    for name, metrics in results.items():
+        print(f"  {name:<20} build {metrics['seconds'] * 1000:8.1f} ms  retained {metrics['memory_mb']:7.2f} MB  "
+              f"pickled {metrics['pickled_mb']:7.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
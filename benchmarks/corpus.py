@@ -0,0 +1,185 @@
+"""
+Generator of synthetic Jobber work orders and credit card statements.
+
+The documents follow the text layout the parsers in jobber_service.py and cc_service.py expect, without containing
+any real customer data, so they can be shared and used to measure the parsers.
+
+Usage: python -m benchmarks.corpus OUTPUT_DIR [--work-orders 20] [--statements 12] [--items 6] [--transactions 60]
+"""
+import argparse
+import os
+import random
+from os.path import join
+
+from benchmarks.pdf_builder import PdfPage, write_pdf
+from PCMS.util.jobber_util import ITEM_MAP
+
+WORK_ORDER_LAYOUTS = ("service_address", "recipient")
+STATEMENT_LAYOUTS = ("single_line", "foreign_currency", "mixed")
+
+STATEMENT_HEADER = "TRANSACTION POSTINGACTIVITY DESCRIPTION AMOUNT ($)DATE DATE"
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+STREETS = ("Maple Drive", "Bow Trail", "Crowchild Road", "Elbow Drive", "Heritage Gate", "Sunridge Way")
+CITIES = ("Calgary, Alberta", "Airdrie, Alberta", "Cochrane, Alberta", "Okotoks, Alberta")
+MERCHANTS = (
+    "HOME DEPOT #7012", "RONA CALGARY NORTH", "PETRO-CANADA 4411", "SHELL C12345", "COSTCO WHOLESALE #541",
+    "TIM HORTONS #2231", "LOWE'S #3321", "WINDSOR PLYWOOD", "AMAZON.CA", "CANADIAN TIRE #387",
+    "PRINCESS AUTO", "FASTENAL CANADA"
+)
+EXCLUDED_MERCHANTS = ("PAYMENT - THANK YOU", "INTEREST CHARGES", "RETURN HOME DEPOT #7012")
+
+
+def generate_work_order(
+        pdf_path: str,
+        item_count: int = 6,
+        photo_pages: int = 0,
+        trailing_lines: int = 10,
+        layout: str = "service_address",
+        seed: int = 0
+) -> int:
+    """
+    Write a Jobber work order PDF.
+
+    :param pdf_path: Where to write the PDF.
+    :param item_count: The number of Product/Service lines.
+    :param photo_pages: The number of pages of job photos after the first page.
+    :param trailing_lines: The number of note lines after the totals on the first page.
+    :param layout: 'service_address' or 'recipient', the two ways the job address is introduced.
+    :param seed: The seed making the generated content reproducible.
+    :return: The number of text lines in the PDF.
+    """
+    rng = random.Random(seed)
+    job_number = rng.randint(1000, 9999)
+    address_lines = [f"{rng.randint(1, 999)} {rng.choice(STREETS)}", f"{rng.choice(CITIES)} T2X 0A1 Job # {job_number}"]
+
+    if layout == "service_address":
+        header_lines = ["RECIPIENT:", "Builder Co.", "100 Builder Way", "SERVICE ADDRESS:", *address_lines]
+    elif layout == "recipient":
+        header_lines = ["RECIPIENT:", "Builder Co.", *address_lines]
+    else:
+        raise ValueError(f"Unknown work order layout {layout}")
+
+    descriptions = list(ITEM_MAP)
+    item_lines = []
+    for _ in range(item_count):
+        size, rest = rng.choice(descriptions).split("ft", 1)
+        if "straight" in rest and rng.random() < 0.3:
+            rest = rest.replace("straight", "support")
+        size_text = f"{size} ft" if rng.random() < 0.2 else f"{size}ft"
+        item_lines.append(f"{size_text}{rest.title()} {rng.randint(1, 40)}")
+
+    first_page_lines = [
+        "Pacheco Contracting", f"Work Order #{job_number}", *header_lines,
+        "Product/Service Description Qty.", *item_lines,
+        "Subtotal $1,234.00", "GST $61.70", "Total $1,295.70", "Notes:",
+        *[f"Note {index}: work is guaranteed for one year from the completion date shown above." for index in
+          range(trailing_lines)],
+        "Client signature: ______________________"
+    ]
+    pages = [PdfPage(first_page_lines, image_count=1 if photo_pages > 0 else 0)]
+    pages.extend(PdfPage([f"Job photos {index + 1}"], image_count=6) for index in range(photo_pages))
+    write_pdf(pdf_path, pages)
+    return sum(len(page.lines) for page in pages)
+
+
+def generate_cc_statement(
+        pdf_path: str,
+        transaction_count: int = 60,
+        page_count: int = 2,
+        layout: str = "mixed",
+        seed: int = 0
+) -> int:
+    """
+    Write a credit card statement PDF with its transactions spread evenly over its pages.
+
+    :param pdf_path: Where to write the PDF.
+    :param transaction_count: The number of transactions, including payments and returns that are excluded.
+    :param page_count: The number of pages with transactions.
+    :param layout: 'single_line' puts the amount on the line after the description, 'foreign_currency' adds an
+                   exchange rate line in between and 'mixed' does both.
+    :param seed: The seed making the generated content reproducible.
+    :return: The number of text lines in the PDF.
+    """
+    if layout not in STATEMENT_LAYOUTS:
+        raise ValueError(f"Unknown statement layout {layout}")
+
+    rng = random.Random(seed)
+    month = rng.randrange(len(MONTHS))
+    # Statements alternate between two years, so the same day shows up in both
+    year = 2024 + seed % 2
+    pages = []
+    per_page = -(-transaction_count // page_count) if page_count > 0 else 0
+    remaining = transaction_count
+    for page_number in range(1, page_count + 1):
+        lines = ["Business Platinum Card", f"Statement page {page_number} of {page_count}", STATEMENT_HEADER]
+        if page_number == 1:
+            lines.insert(1, f"STATEMENT FROM {MONTHS[month].upper()} 01 TO {MONTHS[month].upper()} 28, {year}")
+        for _ in range(min(per_page, remaining)):
+            day = rng.randint(1, 28)
+            merchant = rng.choice(EXCLUDED_MERCHANTS) if rng.random() < 0.05 else rng.choice(MERCHANTS)
+            lines.append(f"{MONTHS[month]} {day:02d} {MONTHS[month]} {min(day + 2, 28):02d} {merchant} CALGARY AB")
+            foreign_currency = layout == "foreign_currency" or (layout == "mixed" and rng.random() < 0.2)
+            if foreign_currency:
+                lines.append(f"USD {rng.uniform(5, 500):.2f} @ 1.3{rng.randint(10, 99)}")
+            lines.append(f"${rng.uniform(2, 2500):,.2f}")
+            remaining -= 1
+        lines.append(f"Page {page_number} of {page_count}")
+        pages.append(PdfPage(lines))
+
+    write_pdf(pdf_path, pages)
+    return sum(len(page.lines) for page in pages)
+
+
+def generate_corpus(
+        directory: str,
+        work_order_count: int,
+        statement_count: int,
+        item_count: int = 6,
+        transaction_count: int = 60,
+        photo_pages: int = 0,
+        statement_pages: int = 2
+) -> tuple[list[str], list[str], int, int]:
+    """
+    Write a corpus of work orders and statements, cycling through the layout variants.
+
+    :return: The work order paths, statement paths and the total text lines of each.
+    """
+    os.makedirs(directory, exist_ok=True)
+    work_order_paths, statement_paths = [], []
+    work_order_lines = statement_lines = 0
+
+    for index in range(work_order_count):
+        path = join(directory, f"work_order_{index:04d}.pdf")
+        layout = WORK_ORDER_LAYOUTS[index % len(WORK_ORDER_LAYOUTS)]
+        work_order_lines += generate_work_order(path, item_count, photo_pages, layout=layout, seed=index)
+        work_order_paths.append(path)
+
+    for index in range(statement_count):
+        path = join(directory, f"statement_{index:04d}.pdf")
+        layout = STATEMENT_LAYOUTS[index % len(STATEMENT_LAYOUTS)]
+        statement_lines += generate_cc_statement(path, transaction_count, statement_pages, layout, seed=index)
+        statement_paths.append(path)
+
+    return work_order_paths, statement_paths, work_order_lines, statement_lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output_dir")
+    parser.add_argument("--work-orders", type=int, default=20)
+    parser.add_argument("--statements", type=int, default=12)
+    parser.add_argument("--items", type=int, default=6)
+    parser.add_argument("--transactions", type=int, default=60)
+    parser.add_argument("--photo-pages", type=int, default=0)
+    parser.add_argument("--statement-pages", type=int, default=2)
+    args = parser.parse_args()
+
+    work_orders, statements, _, _ = generate_corpus(
+        args.output_dir, args.work_orders, args.statements, args.items, args.transactions, args.photo_pages,
+        args.statement_pages
+    )
+    print(f"Wrote {len(work_orders)} work orders and {len(statements)} statements to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
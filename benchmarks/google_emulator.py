@@ -0,0 +1,510 @@
+"""
+In-process stand-in for the subset of the Google Drive and Sheets APIs GoogleService uses, so invoice generation can
+be run and measured without a Google account or network access.
+
+GoogleEmulator is a requests transport adapter. Mounted on the session GoogleService sends its requests with, it
+answers them from spreadsheets held in memory:
+
+    Drive    files.copy, files.list (by appProperties), files.get (modifiedTime), files.update, files.delete
+    Sheets   spreadsheets.get, spreadsheets.values.get, spreadsheets.batchUpdate (updateCells and deleteDimension)
+    Docs     the spreadsheet PDF export URL
+    OAuth    access token refreshes
+
+Every request waits latency_seconds, or its operation's entry in operation_latency_seconds, plus up to
+jitter_seconds before being answered, and can fail with an injected
+error, either at random with error_rate or on demand with fail_next. Injected errors are answered without applying
+the request, as Google does when rate limiting, unless fail_next is told to apply it first, as when a response is
+lost after the request was applied.
+"""
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import requests
+from google.auth.transport.requests import AuthorizedSession, Request
+from google.oauth2.credentials import Credentials
+from requests.adapters import BaseAdapter
+
+from PCMS.services.google_service import GoogleService, parse_a1_range
+
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+TOKEN_LIFETIME_SECONDS = 3600
+INVOICE_SHEET_TITLE = "Invoice"
+INVOICE_TEMPLATE_ROWS = 130
+INVOICE_TEMPLATE_COLUMNS = 10
+DEFAULT_EXPORT_SIZE_BYTES = 50_000
+APP_PROPERTY_QUERY_PATTERN = re.compile(r"appProperties has \{ key='(?P<key>[^']*)' and value='(?P<value>[^']*)' }")
+
+
+class EmulatedOperations:
+    COPY = 'files.copy'
+    LIST = 'files.list'
+    GET_FILE = 'files.get'
+    UPDATE = 'files.update'
+    DELETE = 'files.delete'
+    GET = 'spreadsheets.get'
+    VALUES_GET = 'spreadsheets.values.get'
+    BATCH_UPDATE = 'spreadsheets.batchUpdate'
+    EXPORT = 'export'
+    TOKEN = 'oauth.token'
+
+
+class EmulatedSheet:
+    def __init__(self, sheet_id: int, title: str, row_count: int, column_count: int):
+        self.sheet_id = sheet_id
+        self.title = title
+        self.row_count = row_count
+        self.column_count = column_count
+        # Row index -> column index -> value
+        self.cells: dict[int, dict[int, str]] = {}
+
+    def copy(self) -> "EmulatedSheet":
+        sheet = EmulatedSheet(self.sheet_id, self.title, self.row_count, self.column_count)
+        sheet.cells = {row: dict(columns) for row, columns in self.cells.items()}
+        return sheet
+
+    def properties(self) -> dict:
+        return {
+            'sheetId': self.sheet_id,
+            'title': self.title,
+            'gridProperties': {'rowCount': self.row_count, 'columnCount': self.column_count}
+        }
+
+
+class EmulatedFile:
+    def __init__(self, name: str, sheets: list[EmulatedSheet], app_properties: dict or None = None):
+        self.name = name
+        self.sheets = sheets
+        self.app_properties = app_properties or {}
+        self.modified_time = get_timestamp()
+
+    def get_sheet(self, sheet_id: int or None = None, title: str or None = None) -> EmulatedSheet:
+        for sheet in self.sheets:
+            if (title is not None and sheet.title == title) or (title is None and sheet.sheet_id == (sheet_id or 0)):
+                return sheet
+        raise EmulatedError(400, f"No sheet with ID {sheet_id} or title {title}")
+
+
+class EmulatedError(Exception):
+    def __init__(self, status_code: int, message: str, body: dict or None = None):
+        """
+        :param body: The body of the error response, for endpoints that do not answer with the API error format.
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = body
+
+
+class GoogleEmulator(BaseAdapter):
+    def __init__(
+            self,
+            latency_seconds: float = 0.0,
+            jitter_seconds: float = 0.0,
+            error_rate: float = 0.0,
+            error_status: int = 503,
+            export_size_bytes: int = DEFAULT_EXPORT_SIZE_BYTES,
+            seed: int = 0,
+            operation_latency_seconds: dict[str, float] or None = None,
+            token_lifetime_seconds: int = TOKEN_LIFETIME_SECONDS
+    ):
+        """
+        :param latency_seconds: How long every request takes to be answered.
+        :param operation_latency_seconds: How long the requests of an EmulatedOperations operation take to be
+                                          answered, for operations slower or faster than latency_seconds.
+        :param token_lifetime_seconds: How long the access tokens handed out by the token endpoint last.
+        :param jitter_seconds: The most extra time added at random to each request's latency.
+        :param error_rate: The share of requests failed at random with error_status, from 0 to 1.
+        :param error_status: The status code of the errors injected at random.
+        :param export_size_bytes: The size of each exported PDF.
+        :param seed: The seed of the random jitter and errors, so runs can be repeated.
+        """
+        super().__init__()
+        self.latency_seconds = latency_seconds
+        self.jitter_seconds = jitter_seconds
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.export_size_bytes = export_size_bytes
+        self.operation_latency_seconds = operation_latency_seconds or {}
+        self.token_lifetime_seconds = token_lifetime_seconds
+        self.__random = random.Random(seed)
+        self.__files: dict[str, EmulatedFile] = {}
+        # Operation -> (status code, applied) of the errors its next requests fail with
+        self.__pending_errors: dict[str, list[tuple[int, bool]]] = {}
+        self.__request_counts: dict[str, int] = {}
+        self.__refresh_token_revoked = False
+        self.__lock = threading.Lock()
+
+    def add_invoice_template(self, file_id: str = "invoice-template", row_count: int = INVOICE_TEMPLATE_ROWS) -> str:
+        """
+        Add a spreadsheet laid out like the invoice template, with a single "Invoice" sheet.
+
+        :param file_id: The ID of the template.
+        :param row_count: The number of rows in the sheet.
+        :return: The ID of the template.
+        """
+        sheet = EmulatedSheet(0, INVOICE_SHEET_TITLE, row_count, INVOICE_TEMPLATE_COLUMNS)
+        with self.__lock:
+            self.__files[file_id] = EmulatedFile("Invoice Template", [sheet])
+        return file_id
+
+    def modify_file(self, file_id: str) -> None:
+        """
+        Mark a file as modified, as if it had been edited in Drive.
+
+        :param file_id: The ID of the file.
+        """
+        with self.__lock:
+            self.__files[file_id].modified_time = get_timestamp()
+
+    def fail_next(self, operation: str, status_code: int, count: int = 1, applied: bool = False) -> None:
+        """
+        Fail the next requests of an operation.
+
+        :param operation: The EmulatedOperations operation to fail.
+        :param status_code: The status code the requests fail with.
+        :param count: The number of requests to fail.
+        :param applied: Apply the requests before failing them, as when the response to a request is lost.
+        """
+        with self.__lock:
+            self.__pending_errors.setdefault(operation, []).extend([(status_code, applied)] * count)
+
+    def revoke_refresh_token(self) -> None:
+        """
+        Revoke the refresh token, so the token endpoint answers every refresh with an invalid_grant error, as Google
+        does once a refresh token expires or access is removed from the Google account.
+        """
+        with self.__lock:
+            self.__refresh_token_revoked = True
+
+    def get_request_counts(self) -> dict[str, int]:
+        """
+        Get the number of requests answered for each EmulatedOperations operation, including failed ones.
+        """
+        with self.__lock:
+            return dict(self.__request_counts)
+
+    def get_file(self, file_id: str) -> EmulatedFile or None:
+        with self.__lock:
+            return self.__files.get(file_id)
+
+    def get_file_count(self) -> int:
+        with self.__lock:
+            return len(self.__files)
+
+    def send(self, request: requests.PreparedRequest, stream=False, timeout=None, verify=True, cert=None,
+             proxies=None) -> requests.Response:
+        url = urlsplit(request.url)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        body = parse_body(request)
+
+        try:
+            operation, handler, args = self.__route(request.method, unquote(url.path))
+            with self.__lock:
+                self.__request_counts[operation] = self.__request_counts.get(operation, 0) + 1
+                pending_errors = self.__pending_errors.get(operation)
+                applied = False
+                if pending_errors:
+                    status_code, applied = pending_errors.pop(0)
+                elif self.error_rate > 0 and self.__random.random() < self.error_rate:
+                    status_code = self.error_status
+                else:
+                    status_code = None
+                delay_seconds = (self.operation_latency_seconds.get(operation, self.latency_seconds)
+                                 + self.__random.uniform(0, self.jitter_seconds))
+
+            time.sleep(delay_seconds)
+            if status_code is not None:
+                if applied:
+                    with self.__lock:
+                        handler(*args, query, body)
+                raise EmulatedError(status_code, f"Injected error in {operation}")
+            with self.__lock:
+                result = handler(*args, query, body)
+        except EmulatedError as e:
+            if e.body is not None:
+                return create_response(request, e.status_code, e.body)
+            return create_response(request, e.status_code,
+                                   {'error': {'code': e.status_code, 'message': str(e), 'errors': []}})
+
+        if isinstance(result, EmulatedPdf):
+            return create_response(request, 200, result, "application/pdf")
+        return create_response(request, 200, result)
+
+    def close(self) -> None:
+        pass
+
+    def __route(self, method: str, path: str) -> tuple:
+        routes = (
+            ('POST', r"/drive/v3/files/(?P<id>[^/]+)/copy", EmulatedOperations.COPY, self.__copy),
+            ('GET', r"/drive/v3/files", EmulatedOperations.LIST, self.__list),
+            ('GET', r"/drive/v3/files/(?P<id>[^/]+)", EmulatedOperations.GET_FILE, self.__get_file_metadata),
+            ('PATCH', r"/drive/v3/files/(?P<id>[^/]+)", EmulatedOperations.UPDATE, self.__update),
+            ('DELETE', r"/drive/v3/files/(?P<id>[^/]+)", EmulatedOperations.DELETE, self.__delete),
+            ('GET', r"/v4/spreadsheets/(?P<id>[^/]+)/values/(?P<range>.+)", EmulatedOperations.VALUES_GET,
+             self.__get_values),
+            ('GET', r"/v4/spreadsheets/(?P<id>[^/:]+)", EmulatedOperations.GET, self.__get_spreadsheet),
+            ('POST', r"/v4/spreadsheets/(?P<id>[^/]+):batchUpdate", EmulatedOperations.BATCH_UPDATE,
+             self.__batch_update),
+            ('GET', r"/spreadsheets/d/(?P<id>[^/]+)/export", EmulatedOperations.EXPORT, self.__export),
+            ('POST', r"/token", EmulatedOperations.TOKEN, self.__refresh_token)
+        )
+        for route_method, pattern, operation, handler in routes:
+            match = re.fullmatch(pattern, path)
+            if route_method == method and match is not None:
+                return operation, handler, match.groups()
+        raise EmulatedError(404, f"No emulated operation for {method} {path}")
+
+    def __get_file(self, file_id: str) -> EmulatedFile:
+        file = self.__files.get(file_id)
+        if file is None:
+            raise EmulatedError(404, f"File not found: {file_id}")
+        return file
+
+    def __copy(self, file_id: str, query: dict, body: dict) -> dict:
+        source = self.__get_file(file_id)
+        copy_id = uuid.uuid4().hex
+        self.__files[copy_id] = EmulatedFile(body.get('name', f"Copy of {source.name}"),
+                                             [sheet.copy() for sheet in source.sheets],
+                                             body.get('appProperties'))
+        return {'id': copy_id}
+
+    def __list(self, query: dict, body: dict) -> dict:
+        match = APP_PROPERTY_QUERY_PATTERN.search(query.get('q', ''))
+        if match is None:
+            raise EmulatedError(400, "Only files.list queries by appProperties are emulated")
+        return {'files': [{'id': file_id} for file_id, file in self.__files.items()
+                          if file.app_properties.get(match.group('key')) == match.group('value')]}
+
+    def __get_file_metadata(self, file_id: str, query: dict, body: dict) -> dict:
+        file = self.__get_file(file_id)
+        return {'id': file_id, 'name': file.name, 'modifiedTime': file.modified_time}
+
+    def __update(self, file_id: str, query: dict, body: dict) -> dict:
+        file = self.__get_file(file_id)
+        file.name = body.get('name', file.name)
+        for key, value in body.get('appProperties', {}).items():
+            if value is None:
+                file.app_properties.pop(key, None)
+            else:
+                file.app_properties[key] = value
+        file.modified_time = get_timestamp()
+        return {'id': file_id}
+
+    def __delete(self, file_id: str, query: dict, body: dict) -> dict:
+        self.__get_file(file_id)
+        del self.__files[file_id]
+        return {}
+
+    def __get_spreadsheet(self, file_id: str, query: dict, body: dict) -> dict:
+        file = self.__get_file(file_id)
+        return {'spreadsheetId': file_id, 'sheets': [{'properties': sheet.properties()} for sheet in file.sheets]}
+
+    def __get_values(self, file_id: str, range_name: str, query: dict, body: dict) -> dict:
+        file = self.__get_file(file_id)
+        sheet_name, grid_range = parse_a1_range(range_name)
+        sheet = file.get_sheet(title=sheet_name) if sheet_name is not None else file.sheets[0]
+        start_row, end_row = grid_range.get('startRowIndex', 0), grid_range.get('endRowIndex', sheet.row_count)
+        start_col = grid_range.get('startColumnIndex', 0)
+        end_col = grid_range.get('endColumnIndex', sheet.column_count)
+
+        values = []
+        for row_index in range(start_row, min(end_row, sheet.row_count)):
+            columns = sheet.cells.get(row_index, {})
+            row = [columns.get(col_index, "") for col_index in range(start_col, end_col)]
+            while row and row[-1] == "":
+                row.pop()
+            values.append(row)
+        # Trailing empty rows are left out, as Sheets does
+        while values and not values[-1]:
+            values.pop()
+        return {'range': range_name, 'majorDimension': 'ROWS', 'values': values} if values else {'range': range_name}
+
+    def __batch_update(self, file_id: str, query: dict, body: dict) -> dict:
+        file = self.__get_file(file_id)
+        # Every request is checked before any is applied, as a batch update is applied all or nothing
+        updated_sheets = [sheet.copy() for sheet in file.sheets]
+        updated_file = EmulatedFile(file.name, updated_sheets)
+        replies = []
+        for request in body.get('requests', []):
+            if 'updateCells' in request:
+                apply_update_cells(updated_file, request['updateCells'])
+            elif 'deleteDimension' in request:
+                apply_delete_dimension(updated_file, request['deleteDimension']['range'])
+            else:
+                raise EmulatedError(400, f"Batch update request {next(iter(request), None)} is not emulated")
+            replies.append({})
+        file.sheets = updated_sheets
+        file.modified_time = get_timestamp()
+        return {'spreadsheetId': file_id, 'replies': replies}
+
+    def __refresh_token(self, query: dict, body: dict) -> dict:
+        if body.get('grant_type') != 'refresh_token' or not body.get('refresh_token'):
+            raise EmulatedError(400, "Only refresh token grants are emulated")
+        if self.__refresh_token_revoked:
+            raise EmulatedError(400, "Refresh token revoked",
+                                {'error': 'invalid_grant', 'error_description': "Token has been expired or revoked."})
+        return {'access_token': f"emulator-token-{uuid.uuid4().hex}", 'expires_in': self.token_lifetime_seconds,
+                'token_type': 'Bearer'}
+
+    def __export(self, file_id: str, query: dict, body: dict) -> "EmulatedPdf":
+        file = self.__get_file(file_id)
+        sheet = file.get_sheet(sheet_id=int(query.get('gid', 0)))
+        text = "\n".join(" ".join(sheet.cells[row_index][col_index] for col_index in sorted(sheet.cells[row_index]))
+                         for row_index in sorted(sheet.cells))
+        return EmulatedPdf(text, self.export_size_bytes)
+
+
+class EmulatedPdf(io.RawIOBase):
+    """
+    Stream of a PDF export's bytes, the sheet's text padded to the export size. The padding is generated as it is
+    read, so large exports never sit in memory whole.
+    """
+    def __init__(self, text: str, size: int):
+        self.__head = b"%PDF-1.4\n%" + text.encode() + b"\n"
+        self.__tail = b"%%EOF\n"
+        self.size = max(size, len(self.__head) + len(self.__tail))
+        self.__position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        start = self.__position
+        end = min(start + len(buffer), self.size)
+        tail_start = self.size - len(self.__tail)
+        head = self.__head[start:end]
+        padding = b"0" * max(0, min(end, tail_start) - max(start, len(self.__head)))
+        tail = self.__tail[max(0, start - tail_start):max(0, end - tail_start)]
+        chunk = head + padding + tail
+        buffer[:len(chunk)] = chunk
+        self.__position = end
+        return len(chunk)
+
+
+def get_timestamp() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec='microseconds').replace('+00:00', 'Z')
+
+
+def apply_update_cells(file: EmulatedFile, update_cells: dict) -> None:
+    if 'start' in update_cells:
+        start = update_cells['start']
+        sheet_id, start_row, start_col = start.get('sheetId'), start.get('rowIndex', 0), start.get('columnIndex', 0)
+    else:
+        grid_range = update_cells['range']
+        sheet_id = grid_range.get('sheetId')
+        start_row, start_col = grid_range.get('startRowIndex', 0), grid_range.get('startColumnIndex', 0)
+    sheet = file.get_sheet(sheet_id=sheet_id)
+
+    for row_offset, row in enumerate(update_cells.get('rows', [])):
+        row_index = start_row + row_offset
+        values = row.get('values', [])
+        if row_index >= sheet.row_count or start_col + len(values) > sheet.column_count:
+            raise EmulatedError(400, f"Update of row {row_index + 1} is outside the grid of sheet {sheet.title}")
+        for col_offset, value in enumerate(values):
+            sheet.cells.setdefault(row_index, {})[start_col + col_offset] = \
+                value.get('userEnteredValue', {}).get('stringValue', "")
+
+
+def apply_delete_dimension(file: EmulatedFile, dimension_range: dict) -> None:
+    sheet = file.get_sheet(sheet_id=dimension_range.get('sheetId'))
+    if dimension_range['dimension'] != 'ROWS':
+        raise EmulatedError(400, "Only row deletions are emulated")
+    start_index, end_index = dimension_range['startIndex'], dimension_range['endIndex']
+    if not 0 <= start_index < end_index <= sheet.row_count:
+        raise EmulatedError(400, f"Rows {start_index} to {end_index} are outside the grid of sheet {sheet.title}")
+
+    deleted_count = end_index - start_index
+    sheet.cells = {row_index if row_index < start_index else row_index - deleted_count: columns
+                   for row_index, columns in sheet.cells.items()
+                   if not start_index <= row_index < end_index}
+    sheet.row_count -= deleted_count
+
+
+def parse_body(request: requests.PreparedRequest) -> dict:
+    if not request.body:
+        return {}
+    body = request.body.decode() if isinstance(request.body, bytes) else request.body
+    if request.headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+        return {key: values[0] for key, values in parse_qs(body).items()}
+    return json.loads(body)
+
+
+def create_response(request: requests.PreparedRequest, status_code: int, body: dict or EmulatedPdf,
+                    content_type: str = "application/json") -> requests.Response:
+    response = requests.Response()
+    response.request = request
+    response.url = request.url
+    response.status_code = status_code
+    response.reason = HTTPStatus(status_code).phrase
+    response.headers['Content-Type'] = content_type
+    if isinstance(body, EmulatedPdf):
+        response.headers['Content-Length'] = str(body.size)
+        response.raw = io.BufferedReader(body)
+    else:
+        content = json.dumps(body).encode()
+        response.headers['Content-Length'] = str(len(content))
+        # Read from a stream rather than set as the content, so streamed responses are read in chunks
+        response.raw = io.BytesIO(content)
+    return response
+
+
+def create_emulated_credentials(expired: bool = False) -> Credentials:
+    """
+    Create credentials refreshed through the emulator's token endpoint.
+
+    :param expired: If the access token has expired, so the credentials are refreshed before their first request.
+    """
+    return Credentials(
+        token=None if expired else "emulator-token",
+        refresh_token="emulator-refresh-token",
+        token_uri=TOKEN_URI,
+        client_id="emulator-client",
+        client_secret="emulator-secret"
+    )
+
+
+def create_emulated_transport(emulator: GoogleEmulator) -> requests.Session:
+    """
+    Create an unauthorized session whose requests are all answered by the emulator, e.g. to refresh credentials with
+    google.auth.transport.requests.Request(create_emulated_transport(emulator)).
+
+    :param emulator: The emulator answering the requests.
+    """
+    session = requests.Session()
+    session.mount("https://", emulator)
+    return session
+
+
+def create_emulated_session(emulator: GoogleEmulator, credentials: Credentials or None = None) -> AuthorizedSession:
+    """
+    Create an authorized session whose requests, including refreshing its credentials, are all answered by the
+    emulator.
+
+    :param emulator: The emulator answering the requests.
+    :param credentials: The credentials authorizing the requests, by default ones that have not expired.
+    """
+    session = AuthorizedSession(credentials or create_emulated_credentials(),
+                                auth_request=Request(create_emulated_transport(emulator)))
+    session.mount("https://", emulator)
+    return session
+
+
+def create_emulated_google_service(file_util, emulator: GoogleEmulator, credentials: Credentials or None = None,
+                                   **google_service_options) -> GoogleService:
+    """
+    Create a GoogleService whose requests are all answered by the emulator.
+
+    :param file_util: The FileUtil of the PCMS root folder.
+    :param emulator: The emulator answering the requests.
+    :param credentials: The credentials authorizing the requests, by default ones that have not expired.
+    :param google_service_options: Other GoogleService parameters, e.g. sheets_requests_per_minute=0.
+    """
+    return GoogleService(file_util, "", session=create_emulated_session(emulator, credentials),
+                         **google_service_options)
@@ -0,0 +1,84 @@
+"""
+Minimal PDF writer used by the benchmarks to build synthetic documents without real customer data.
+
+Each page is a list of text lines drawn top to bottom in Helvetica, optionally followed by images standing in for
+job photos.
+"""
+import os
+import zlib
+
+from pypdf import PdfWriter
+from pypdf.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject, NumberObject, StreamObject
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+LINE_HEIGHT = 12
+
+
+class PdfPage:
+    def __init__(self, lines: list[str], image_count: int = 0, image_size: tuple[int, int] = (640, 480)):
+        """
+        :param lines: The lines of text on the page.
+        :param image_count: The number of photo-like images drawn on the page.
+        :param image_size: The width and height in pixels of each image.
+        """
+        self.lines = lines
+        self.image_count = image_count
+        self.image_size = image_size
+
+
+def write_pdf(pdf_path: str, pages: list[PdfPage]) -> None:
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+        NameObject("/Encoding"): NameObject("/WinAnsiEncoding")
+    }))
+
+    for pdf_page in pages:
+        page = writer.add_blank_page(PAGE_WIDTH, PAGE_HEIGHT)
+        images = DictionaryObject()
+        operations = []
+
+        for index in range(pdf_page.image_count):
+            image_name = f"/Im{index}"
+            images[NameObject(image_name)] = writer._add_object(_create_image(*pdf_page.image_size))
+            operations.append(f"q 160 0 0 120 {40 + (index % 3) * 180} {40 + (index // 3) * 130} cm {image_name} Do Q")
+
+        operations.extend(["BT", "/F1 9 Tf", f"{LINE_HEIGHT} TL", f"40 {PAGE_HEIGHT - 40} Td"])
+        for line in pdf_page.lines:
+            operations.append(f"({_escape(line)}) Tj T*")
+        operations.append("ET")
+
+        contents = DecodedStreamObject()
+        contents.set_data("\n".join(operations).encode("cp1252"))
+        page[NameObject("/Contents")] = writer._add_object(contents)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+            NameObject("/XObject"): images,
+            NameObject("/ProcSet"): ArrayObject([NameObject("/PDF"), NameObject("/Text"), NameObject("/ImageC")])
+        })
+
+    with open(pdf_path, "wb") as f:
+        writer.write(f)
+
+
+def _create_image(width: int, height: int) -> StreamObject:
+    # Random pixels barely compress, which gives the image the weight of a real photo
+    image = StreamObject()
+    image.set_data(zlib.compress(os.urandom(width * height * 3), 1))
+    image.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Image"),
+        NameObject("/Width"): NumberObject(width),
+        NameObject("/Height"): NumberObject(height),
+        NameObject("/ColorSpace"): NameObject("/DeviceRGB"),
+        NameObject("/BitsPerComponent"): NumberObject(8),
+        NameObject("/Filter"): NameObject("/FlateDecode")
+    })
+    return image
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
@@ -1,18 +1,40 @@
+import itertools
+import logging
+import multiprocessing
+
 from PCMS.services import GoogleService
 from PCMS.services import InvoiceService
-from PCMS.models.invoice_data import InvoiceData, CustomerInfo, JobData
+from PCMS.services.template_copy_pool import TemplateCopyPool
+from PCMS.models.invoice_data import InvoiceData, CustomerInfo
 from PCMS.services.jobber_service import JobberService
 from PCMS.util.logger import configure_logger
 from PCMS.util.file_util import FileUtil
+from PCMS.util.job_data_cache import JobDataCache
 from PCMS.util.folder_names import FolderNames
 from PCMS.util.config import Config, ConfigKeys
 
+logger = logging.getLogger("pcms")
+
 
 def create_default_folders(file_util: FileUtil):
     file_util.create_folder(FolderNames.INVOICE_FOLDER)
     file_util.create_folder(FolderNames.PROCESSED_JOB_FOLDER)
     file_util.create_folder(FolderNames.UNPROCESSED_JOB_FOLDER)
 
+def create_job_data_cache(file_util: FileUtil, config: Config) -> JobDataCache or None:
+    cache_size = config.get_int_value(ConfigKeys.JOB_DATA_CACHE_SIZE)
+    if cache_size <= 0:
+        return None
+    return JobDataCache(file_util, cache_size)
+
+def create_template_pool(google_service: GoogleService, config: Config) -> TemplateCopyPool or None:
+    pool_size = config.get_int_value(ConfigKeys.TEMPLATE_POOL_SIZE)
+    if pool_size <= 0:
+        return None
+    template_pool = TemplateCopyPool(google_service, config.get_value(ConfigKeys.TEMPLATE_SPREADSHEET_ID), pool_size)
+    template_pool.start()
+    return template_pool
+
 def main():
     file_util = FileUtil()
     config = Config(file_util)
@@ -22,53 +44,73 @@ def main():
 
     google_service = GoogleService(
         file_util,
-        config.get_value(ConfigKeys.AUTH_CRED_FILE_NAME)
+        config.get_value(ConfigKeys.AUTH_CRED_FILE_NAME),
+        config.get_int_value(ConfigKeys.SHEET_METADATA_CACHE_SECONDS),
+        config.get_int_value(ConfigKeys.HTTP_POOL_SIZE),
+        config.get_int_value(ConfigKeys.HTTP_TIMEOUT_SECONDS),
+        config.get_int_value(ConfigKeys.SHEETS_REQUESTS_PER_MINUTE),
+        config.get_int_value(ConfigKeys.GOOGLE_MAX_RETRIES),
+        config.get_int_value(ConfigKeys.GOOGLE_MAX_IN_FLIGHT_REQUESTS)
     )
+    template_pool = create_template_pool(google_service, config)
     invoice_service = InvoiceService(
         file_util,
         google_service,
         config.get_value(ConfigKeys.TEMPLATE_SPREADSHEET_ID),
-        FolderNames.INVOICE_FOLDER
-    )
-    jobber_service = JobberService(
-        file_util,
-        FolderNames.UNPROCESSED_JOB_FOLDER,
-        FolderNames.PROCESSED_JOB_FOLDER
+        FolderNames.INVOICE_FOLDER,
+        config.get_int_value(ConfigKeys.INVOICE_WORKERS),
+        template_pool
     )
-    job_data = jobber_service.process_jobber_pdfs()
-    if job_data is None:
-        return
-
-    if config.get_value(ConfigKeys.BILLED_COMPANY_ATTENTION) == '':
-        customer_info = CustomerInfo(
-            company_name = config.get_value(ConfigKeys.BILLED_COMPANY_NAME),
-            address = config.get_value(ConfigKeys.BILLED_COMPANY_ADDRESS),
-            city = config.get_value(ConfigKeys.BILLED_COMPANY_CITY),
-            province = config.get_value(ConfigKeys.BILLED_COMPANY_PROVINCE),
-            postal_code = config.get_value(ConfigKeys.BILLED_COMPANY_POSTAL_CODE)
-        )
-    else:
-        customer_info = CustomerInfo(
-            company_name=config.get_value(ConfigKeys.BILLED_COMPANY_NAME),
-            address=config.get_value(ConfigKeys.BILLED_COMPANY_ADDRESS),
-            city=config.get_value(ConfigKeys.BILLED_COMPANY_CITY),
-            province=config.get_value(ConfigKeys.BILLED_COMPANY_PROVINCE),
-            postal_code=config.get_value(ConfigKeys.BILLED_COMPANY_POSTAL_CODE),
-            attention=config.get_value(ConfigKeys.BILLED_COMPANY_ATTENTION)
+    try:
+        jobber_service = JobberService(
+            file_util,
+            FolderNames.UNPROCESSED_JOB_FOLDER,
+            FolderNames.PROCESSED_JOB_FOLDER,
+            config.get_int_value(ConfigKeys.JOBBER_PDF_WORKERS),
+            create_job_data_cache(file_util, config),
+            config.get_value(ConfigKeys.JOBBER_LAZY_EXTRACTION)
         )
+        if not jobber_service.has_jobs_to_process():
+            logger.warning("NO JOBS FOUND TO BE PROCESSED")
+            return
 
-    invoice_data = InvoiceData(
-        name = "Test Invoice 26",
-        invoice_number = "00069",
-        invoice_date = "10/14/2024",
-        invoice_due_date = "10/20/2024",
-        customer_info = customer_info,
-        job_data = job_data
-    )
-    invoice_service.create_new_invoice(invoice_data)
-    jobber_service.move_processed_jobs()
+        if config.get_value(ConfigKeys.BILLED_COMPANY_ATTENTION) == '':
+            customer_info = CustomerInfo(
+                company_name = config.get_value(ConfigKeys.BILLED_COMPANY_NAME),
+                address = config.get_value(ConfigKeys.BILLED_COMPANY_ADDRESS),
+                city = config.get_value(ConfigKeys.BILLED_COMPANY_CITY),
+                province = config.get_value(ConfigKeys.BILLED_COMPANY_PROVINCE),
+                postal_code = config.get_value(ConfigKeys.BILLED_COMPANY_POSTAL_CODE)
+            )
+        else:
+            customer_info = CustomerInfo(
+                company_name=config.get_value(ConfigKeys.BILLED_COMPANY_NAME),
+                address=config.get_value(ConfigKeys.BILLED_COMPANY_ADDRESS),
+                city=config.get_value(ConfigKeys.BILLED_COMPANY_CITY),
+                province=config.get_value(ConfigKeys.BILLED_COMPANY_PROVINCE),
+                postal_code=config.get_value(ConfigKeys.BILLED_COMPANY_POSTAL_CODE),
+                attention=config.get_value(ConfigKeys.BILLED_COMPANY_ATTENTION)
+            )
+
+        invoice_data = InvoiceData(
+            name = "Test Invoice 26",
+            invoice_number = "00069",
+            invoice_date = "10/14/2024",
+            invoice_due_date = "10/20/2024",
+            customer_info = customer_info
+        )
+        # Invoices are generated while the Jobber PDFs are parsed, and none are started once a PDF fails to parse
+        job_data = itertools.chain.from_iterable(jobber_service.iter_job_data(stop_on_failure=True))
+        invoice_service.create_chunked_invoices_from_stream(invoice_data, job_data)
+        jobber_service.move_processed_jobs()
+    finally:
+        if template_pool is not None:
+            # Delete the copies that were made ahead of time but not used
+            template_pool.close()
 
 if __name__ == '__main__':
+    # Required for the PDF parsing process pools when running as a frozen executable
+    multiprocessing.freeze_support()
     try:
         main()
     except Exception as e:
@@ -1,12 +1,19 @@
+import multiprocessing
+
 import customtkinter as ctk
 
 from PCMS.services.cc_service import CcService
+from PCMS.services.ledger_service import LedgerService
+from PCMS.services.spending_service import SpendingService
 from PCMS.services import GoogleService
 from PCMS.services import InvoiceService
+from PCMS.services.template_copy_pool import TemplateCopyPool
 from PCMS.services.jobber_service import JobberService
 from PCMS.util.logger import configure_logger
 from PCMS.util.file_util import FileUtil
+from PCMS.util.job_data_cache import JobDataCache
 from PCMS.util.folder_names import FolderNames
+from PCMS.util.transaction_rules import TransactionRules
 from PCMS.util.config import Config, ConfigKeys
 from PCMS.GUI.pcms_gui import PcmsGUI
 from PCMS.util.version_manager import VersionManager
@@ -25,11 +32,26 @@ def run_gui(
         jobber_servie: JobberService,
         invoice_service: InvoiceService,
         version_manager: VersionManager,
-        cc_service: CcService):
-    gui = PcmsGUI(jobber_servie, invoice_service, version_manager, cc_service)
+        cc_service: CcService,
+        spending_service: SpendingService):
+    gui = PcmsGUI(jobber_servie, invoice_service, version_manager, cc_service, spending_service)
     ctk.set_appearance_mode("dark")
     gui.mainloop()
 
+def create_job_data_cache(file_util: FileUtil, config: Config) -> JobDataCache or None:
+    cache_size = config.get_int_value(ConfigKeys.JOB_DATA_CACHE_SIZE)
+    if cache_size <= 0:
+        return None
+    return JobDataCache(file_util, cache_size)
+
+def create_template_pool(google_service: GoogleService, config: Config) -> TemplateCopyPool or None:
+    pool_size = config.get_int_value(ConfigKeys.TEMPLATE_POOL_SIZE)
+    if pool_size <= 0:
+        return None
+    template_pool = TemplateCopyPool(google_service, config.get_value(ConfigKeys.TEMPLATE_SPREADSHEET_ID), pool_size)
+    template_pool.start()
+    return template_pool
+
 def main():
     file_util = FileUtil()
     config = Config(file_util)
@@ -40,23 +62,57 @@ def main():
 
     google_service = GoogleService(
         file_util,
-        config.get_value(ConfigKeys.AUTH_CRED_FILE_NAME)
+        config.get_value(ConfigKeys.AUTH_CRED_FILE_NAME),
+        config.get_int_value(ConfigKeys.SHEET_METADATA_CACHE_SECONDS),
+        config.get_int_value(ConfigKeys.HTTP_POOL_SIZE),
+        config.get_int_value(ConfigKeys.HTTP_TIMEOUT_SECONDS),
+        config.get_int_value(ConfigKeys.SHEETS_REQUESTS_PER_MINUTE),
+        config.get_int_value(ConfigKeys.GOOGLE_MAX_RETRIES),
+        config.get_int_value(ConfigKeys.GOOGLE_MAX_IN_FLIGHT_REQUESTS)
     )
+    template_pool = create_template_pool(google_service, config)
     invoice_service = InvoiceService(
         file_util,
         google_service,
         config.get_value(ConfigKeys.TEMPLATE_SPREADSHEET_ID),
-        FolderNames.INVOICE_FOLDER
+        FolderNames.INVOICE_FOLDER,
+        config.get_int_value(ConfigKeys.INVOICE_WORKERS),
+        template_pool
     )
     jobber_service = JobberService(
         file_util,
         FolderNames.UNPROCESSED_JOB_FOLDER,
-        FolderNames.PROCESSED_JOB_FOLDER
+        FolderNames.PROCESSED_JOB_FOLDER,
+        config.get_int_value(ConfigKeys.JOBBER_PDF_WORKERS),
+        create_job_data_cache(file_util, config),
+        config.get_value(ConfigKeys.JOBBER_LAZY_EXTRACTION)
+    )
+    ledger_service = LedgerService(file_util) if config.get_value(ConfigKeys.TRANSACTION_LEDGER) else None
+    transaction_rules = TransactionRules.load(file_util)
+    cc_service = CcService(
+        file_util,
+        config.get_int_value(ConfigKeys.CC_STATEMENT_WORKERS),
+        ledger_service,
+        config.get_value(ConfigKeys.CC_OUTPUT_FORMAT),
+        transaction_rules
+    )
+    spending_service = SpendingService(
+        file_util,
+        config.get_int_value(ConfigKeys.CC_STATEMENT_WORKERS),
+        ledger_service,
+        transaction_rules,
+        config.get_int_value(ConfigKeys.SPENDING_REPORT_TOP_MERCHANTS)
     )
-    cc_service = CcService(file_util)
-    run_gui(jobber_service, invoice_service, version_manager, cc_service)
+    try:
+        run_gui(jobber_service, invoice_service, version_manager, cc_service, spending_service)
+    finally:
+        if template_pool is not None:
+            # Delete the copies that were made ahead of time but not used
+            template_pool.close()
 
 if __name__ == '__main__':
+    # Required for the PDF parsing process pools when running as a frozen executable
+    multiprocessing.freeze_support()
     try:
         main()
     except Exception as e: